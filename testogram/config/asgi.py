@@ -13,4 +13,15 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Импорт после get_asgi_application(), когда Django уже настроен.
+from general.websocket import websocket_application  # noqa: E402
+
+
+async def application(scope, receive, send):
+    # HTTP обрабатывает Django, WebSocket-соединения - приложение из general.websocket.
+    if scope["type"] == "websocket":
+        await websocket_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -111,6 +112,37 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+# По умолчанию кэш в памяти процесса. Если задан REDIS_URL, используется Redis,
+# тогда кэш общий для всех процессов.
+
+if os.environ.get("REDIS_URL"):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ["REDIS_URL"],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Кэш представлений постов (см. general/api/cache.py): имя кэша из CACHES или None, если кэш
+# постов выключен. Версии постов должны быть общими для всех процессов и не вытесняться раньше
+# представлений, поэтому кэш включается только вместе с Redis, а не с кэшем в памяти процесса.
+POST_CACHE_ALIAS = "default" if os.environ.get("REDIS_URL") else None
+# Время жизни закэшированных представлений постов (секунды).
+POST_CACHE_TIMEOUT = 300
+# Время жизни ключей версий постов и списка (секунды). Должно быть больше POST_CACHE_TIMEOUT:
+# версия, вытесненная раньше представлений, заставит перечитать еще живые записи. Версия,
+# созданная заново, не совпадает со старой, поэтому истечение ключа безопасно.
+POST_CACHE_VERSION_TIMEOUT = 3600
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/4.0/topics/i18n/
 
@@ -137,7 +169,8 @@ AUTH_USER_MODEL = 'general.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # JWT без загрузки пользователя из БД на каждый запрос, см. general/authentication.py.
+        'general.authentication.CachedTokenUserAuthentication',
     ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
@@ -146,6 +179,60 @@ REST_FRAMEWORK = {
 }
 
 
+# Сколько секунд кэшируются признаки пользователя (is_active, is_staff), по которым
+# CachedTokenUserAuthentication пропускает запросы без обращения к таблице пользователей.
+AUTH_USER_CACHE_TIMEOUT = 60
+
+SIMPLE_JWT = {
+    # Refresh-токены, выданные до revoke_tokens(), не обновляются (см. general/authentication.py).
+    'TOKEN_REFRESH_SERIALIZER': 'general.authentication.RevocableTokenRefreshSerializer',
+}
+
+
+# Брокер, через который новые сообщения доставляются по WebSocket (см. general/realtime.py).
+# InProcessBroker работает в пределах одного процесса; для нескольких процессов его заменяют
+# брокером поверх Redis с тем же интерфейсом.
+REALTIME_BROKER = "general.realtime.InProcessBroker"
+
+# Максимальное количество записей каждого вида (чаты, сообщения, удаления) в одном ответе /api/sync/.
+SYNC_BATCH_SIZE = 100
+# Позиция синхронизации не проходит записи моложе SYNC_SAFETY_WINDOW секунд: строки, которые
+# закоммитились позже строк с большим id, не пропускаются, если транзакции короче этого окна.
+SYNC_SAFETY_WINDOW = 30
+# Записи об удаленных сообщениях хранятся SYNC_DELETED_MESSAGES_RETENTION дней
+# (см. команду prune_deleted_messages). Токены синхронизации старше этого срока не принимаются:
+# клиент с таким токеном мог пропустить уже удаленные записи и синхронизируется заново.
+SYNC_DELETED_MESSAGES_RETENTION = 30
+
+# Максимальное количество сообщений в одном запросе /api/messages/batch/.
+MESSAGE_BATCH_LIMIT = 100
+
+# Лента друзей (см. general/feed.py): посты авторов, у которых друзей больше FEED_FANOUT_LIMIT,
+# не рассылаются по лентам при публикации, а подмешиваются при чтении.
+FEED_FANOUT_LIMIT = 1000
+FEED_PAGE_SIZE = 20
+
+# Кэш множеств id друзей (см. general/friends.py): LRU в памяти процесса на FRIEND_CACHE_MAX_SIZE
+# пользователей, записи живут FRIEND_CACHE_TIMEOUT секунд. Если задать FRIEND_CACHE_ALIAS
+# (имя кэша из CACHES, например Redis), множества будут общими для всех процессов.
+FRIEND_CACHE_ALIAS = None
+FRIEND_CACHE_TIMEOUT = 60
+FRIEND_CACHE_MAX_SIZE = 10000
+
+# Максимальное количество id в одном запросе /api/users/add_friends/ и /api/users/remove_friends/.
+BULK_FRIENDS_LIMIT = 1000
+
+# Размер страницы полнотекстового поиска /api/search/ (см. general/search.py).
+SEARCH_PAGE_SIZE = 20
+
+# Сколько последних публикаций отдается в профиле пользователя.
+# Полный список доступен по /api/users/<id>/posts/.
+PROFILE_RECENT_POSTS_LIMIT = 5
+
+# Сколько строк читается из БД за раз при выгрузке данных пользователя (см. general/export.py).
+EXPORT_CHUNK_SIZE = 2000
+
+
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Batashev API',
     'DESCRIPTION': 'This is my API',
@@ -4,7 +4,12 @@ from django.contrib.auth.models import Group
 from rangefilter.filters import DateRangeFilter
 from django_admin_listfilter_dropdown.filters import ChoiceDropdownFilter
 
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
 from general.filters import AuthorFilter, PostFilter
+from general.search import SEARCH_INDEXES
 from general.models import (
     Post,
     User,
@@ -17,6 +22,14 @@ from general.models import (
 admin.site.unregister(Group)
 
 
+def full_text_condition(index, search_term, field="pk"):
+    # Условие "field среди id, найденных полнотекстовым индексом" (general/search.py).
+    matching_ids = index.matching_ids_sql(search_term)
+    if matching_ids is None:
+        return Q(pk__in=[])
+    return Q(**{f"{field}__in": RawSQL(*matching_ids)})
+
+
 
 @admin.register(User)
 class UserModelAdmin(admin.ModelAdmin):
@@ -112,6 +125,7 @@ class PostModelAdmin(admin.ModelAdmin):
         "author", 
         "title", 
         "get_body",
+        "get_comment_count",
         "created_at")
     
     fields = (
@@ -133,13 +147,8 @@ class PostModelAdmin(admin.ModelAdmin):
         ("created_at", DateRangeFilter),
     )
 
-    def get_queryset(self, request):
-        """ 
-        под капотом выполнится два запроса: 1) получение всех постов 2) получение всех комментариев к этим постам 
-        Метод prefetch_related используется, когда мы для объектов хотим получать набор связанных данных.
-
-        """
-        return super().get_queryset(request).prefetch_related("comments")
+    # Количество комментариев хранится в самом посте (comment_count),
+    # поэтому подгружать комментарии через prefetch_related больше не нужно.
 
 
     # Теперь пользователи и посты не будут подгружаться сразу все, а порциями
@@ -147,6 +156,16 @@ class PostModelAdmin(admin.ModelAdmin):
     # autocomplete_fields = ("author","post",)
 
 
+    def get_search_results(self, request, queryset, search_term):
+        # Заголовок и текст ищутся по полнотекстовому индексу, а не через icontains,
+        # который просматривает всю таблицу. Поиск по id остается точным.
+        if not search_term:
+            return queryset, False
+        condition = full_text_condition(SEARCH_INDEXES["post"], search_term)
+        if search_term.isdigit():
+            condition |= Q(pk=int(search_term))
+        return queryset.filter(condition), False
+
     def get_body(self, obj): # obj - это пост
         max_length = 64
         if len(obj.body) > max_length:
@@ -154,9 +173,10 @@ class PostModelAdmin(admin.ModelAdmin):
         else:
             return obj.body
     def get_comment_count(self, obj):
-        return obj.comments.count()
+        return obj.comment_count
     
     get_body.short_description = "body"
+    get_comment_count.short_description = "comments"
 
 
 
@@ -195,6 +215,29 @@ class CommentModelAdmin(admin.ModelAdmin):
         AuthorFilter,
     )
 
+    def get_search_results(self, request, queryset, search_term):
+        # Текст комментария и заголовок поста ищутся по полнотекстовым индексам (см. PostModelAdmin),
+        # имя автора - точным совпадением по уникальному индексу username.
+        if not search_term:
+            return queryset, False
+        condition = (
+            full_text_condition(SEARCH_INDEXES["comment"], search_term)
+            | full_text_condition(SEARCH_INDEXES["post"], search_term, field="post")
+            | Q(author__username=search_term)
+        )
+        return queryset.filter(condition), False
+
+    # Удаление из админки идет через delete(), поэтому счетчик комментариев поста меняем здесь.
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            super().delete_model(request, obj)
+            Post.change_comment_count(obj.post_id, -1)
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            Post.subtract_comments(queryset)
+            super().delete_queryset(request, queryset)
+
 # После перезапуска админки мы увидим, что поле автора стало числовым, а рядом появился значок поиска.
 # Этот способ тоже избавляет нас от предварительной загрузки всех пользователей, поэтому страница откроется быстро. 
     raw_id_fields = (
@@ -214,3 +257,14 @@ class ReactionModelAdmin(admin.ModelAdmin):
     AuthorFilter,
     ("value", ChoiceDropdownFilter), # Теперь фильтр будет занимать немного пространства, а значения будут "спрятаны" в выпадающем списке.
 )
+
+    # Как и в CommentModelAdmin, счетчики реакций поста меняем при удалении из админки.
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            super().delete_model(request, obj)
+            Post.change_reaction_counts(obj.post_id, obj.value, None)
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            Post.subtract_reactions(queryset)
+            super().delete_queryset(request, queryset)
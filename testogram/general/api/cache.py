@@ -0,0 +1,163 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+class PostCache:
+    """
+    Кэш представлений постов (PostListSerializer / PostRetrieveSerializer) без полей,
+    которые зависят от смотрящего пользователя или меняются при каждой реакции и каждом
+    комментарии (LIVE_FIELDS). Эти поля дочитываются одним запросом на каждый ответ.
+
+    Инвалидация через версии: у каждого поста есть номер версии, который входит в ключ
+    закэшированного представления. При изменении поста версия увеличивается, и старые записи
+    просто перестают читаться (и со временем вытесняются по таймауту). Ключи версий тоже живут
+    ограниченное время (POST_CACHE_VERSION_TIMEOUT) и не копятся для постов, которые давно не читались.
+    Страницы списка хранят только id постов и зависят от версии списка, которая меняется
+    при создании и удалении постов.
+
+    Кэш включен, только если задан POST_CACHE_ALIAS. Версии должны видеть все процессы,
+    поэтому это общий кэш (Redis): в LocMemCache каждый процесс сбрасывал бы только свои версии,
+    а ключи версий вытеснялись бы вместе с остальными записями.
+    """
+    LIVE_FIELDS = ("my_reaction", "reaction_counts", "comment_count")
+
+    def __init__(self, prefix="posts"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0}
+
+    @property
+    def enabled(self):
+        return settings.POST_CACHE_ALIAS is not None
+
+    @property
+    def cache(self):
+        return caches[settings.POST_CACHE_ALIAS]
+
+    @property
+    def timeout(self):
+        return settings.POST_CACHE_TIMEOUT
+
+    @property
+    def version_timeout(self):
+        return settings.POST_CACHE_VERSION_TIMEOUT
+
+    def _version_key(self, post_id):
+        return f"{self.prefix}:version:{post_id}"
+
+    def _list_version_key(self):
+        return f"{self.prefix}:version:list"
+
+    def _new_version(self):
+        # Версия, созданная заново (например, после вытеснения ключа), не должна совпасть
+        # со старой, поэтому начинаем с текущего времени.
+        return time.time_ns()
+
+    def _count(self, hits, misses):
+        with self._lock:
+            self._stats["hits"] += hits
+            self._stats["misses"] += misses
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = {"hits": 0, "misses": 0}
+
+    # Версии
+
+    def get_versions(self, keys):
+        versions = self.cache.get_many(keys)
+        missing = {key: self._new_version() for key in keys if key not in versions}
+        if missing:
+            for key, version in missing.items():
+                # add не перезапишет версию, если ее успел создать другой процесс.
+                if not self.cache.add(key, version, timeout=self.version_timeout):
+                    missing[key] = self.cache.get(key, version)
+            versions.update(missing)
+        return versions
+
+    def _bump(self, key):
+        # incr сохраняет время жизни ключа, поэтому версии часто меняющихся постов тоже истекают.
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            self.cache.set(key, self._new_version(), timeout=self.version_timeout)
+
+    def _bump_now_and_on_commit(self, key):
+        # Повторное увеличение после коммита не дает запросу, прочитавшему старые данные
+        # до коммита, оставить их в кэше под новой версией.
+        self._bump(key)
+        transaction.on_commit(lambda: self._bump(key))
+
+    def invalidate(self, post_id):
+        if self.enabled:
+            self._bump_now_and_on_commit(self._version_key(post_id))
+
+    def invalidate_list(self):
+        if self.enabled:
+            self._bump_now_and_on_commit(self._list_version_key())
+
+    # Представления постов
+
+    def _representation_keys(self, kind, post_ids):
+        version_keys = [self._version_key(post_id) for post_id in post_ids]
+        versions = self.get_versions(version_keys)
+        return {
+            post_id: f"{self.prefix}:{kind}:{post_id}:{versions[version_key]}"
+            for post_id, version_key in zip(post_ids, version_keys)
+        }
+
+    def get_many(self, kind, post_ids):
+        """Возвращает словарь {id поста: представление} для найденных в кэше постов."""
+        keys = self._representation_keys(kind, post_ids)
+        cached = self.cache.get_many(keys.values())
+        found = {
+            post_id: cached[key]
+            for post_id, key in keys.items()
+            if key in cached
+        }
+        self._count(hits=len(found), misses=len(post_ids) - len(found))
+        return found
+
+    def set_many(self, kind, representations):
+        keys = self._representation_keys(kind, list(representations))
+        self.cache.set_many(
+            {
+                keys[post_id]: self.strip_live_fields(data)
+                for post_id, data in representations.items()
+            },
+            timeout=self.timeout,
+        )
+
+    def strip_live_fields(self, data):
+        # Ключи остаются, чтобы поля в ответе шли в том же порядке, что и у сериализатора.
+        return {key: None if key in self.LIVE_FIELDS else value for key, value in data.items()}
+
+    # Страницы списка
+
+    def _page_key(self, page_key):
+        # page_key - пара (номер страницы, размер страницы).
+        page_number, page_size = page_key
+        version = self.get_versions([self._list_version_key()])[self._list_version_key()]
+        return f"{self.prefix}:page:{version}:{page_number}:{page_size}"
+
+    def get_page(self, page_key):
+        return self.cache.get(self._page_key(page_key))
+
+    def set_page(self, page_key, page, posts):
+        """
+        Сохраняет страницу списка (page: id постов и данные пагинации без ссылок, которые
+        зависят от адреса запроса), представления постов кладутся отдельно.
+        """
+        self.cache.set(self._page_key(page_key), page, timeout=self.timeout)
+        self.set_many("list", {post["id"]: post for post in posts})
+
+
+post_cache = PostCache()
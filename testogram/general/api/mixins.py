@@ -0,0 +1,66 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework import status
+from rest_framework.exceptions import NotFound, PermissionDenied
+from rest_framework.response import Response
+
+
+class AuthorScopedMixin:
+    """
+    Изменять и удалять объект может только его автор.
+
+    Права проверяются не сравнением instance.author с request.user (для этого нужно загрузить
+    объект и его автора), а условием author_id в самом запросе UPDATE/DELETE, см. AuthoredQuerySet.
+    Если запрос не затронул ни одной строки, отдельным запросом выясняется, чего не хватает:
+    объекта (404) или прав (403).
+
+    Модель viewset-а должна использовать AuthoredQuerySet.
+    """
+    not_author_message = "Вы не являетесь автором этого объекта."
+
+    def get_lookup_filter(self):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        return {self.lookup_field: self.kwargs[lookup_url_kwarg]}
+
+    def get_author_scoped_queryset(self):
+        model = self.get_queryset().model
+        try:
+            return model.objects.of_author(self.request.user).filter(**self.get_lookup_filter())
+        except (TypeError, ValueError, DjangoValidationError):
+            raise NotFound()
+
+    def raise_not_author(self):
+        if self.get_queryset().filter(**self.get_lookup_filter()).exists():
+            raise PermissionDenied(self.not_author_message)
+        raise NotFound()
+
+    def update(self, request, *args, **kwargs):
+        partial = kwargs.pop("partial", False)
+        serializer = self.get_serializer(data=request.data, partial=partial)
+        serializer.is_valid(raise_exception=True)
+        self.perform_update(serializer)
+        return Response(serializer.data)
+
+    def perform_update(self, serializer):
+        # Автор не меняется, а остальные поля записываются одним UPDATE ... RETURNING.
+        values = {
+            field: value
+            for field, value in serializer.validated_data.items()
+            if field != "author"
+        }
+        queryset = self.get_author_scoped_queryset()
+        if values:
+            instances = queryset.update_returning(**values)
+        else:
+            instances = list(queryset)
+        if not instances:
+            self.raise_not_author()
+        serializer.instance = instances[0]
+
+    def destroy(self, request, *args, **kwargs):
+        if not self.perform_author_destroy(self.get_author_scoped_queryset()):
+            self.raise_not_author()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    def perform_author_destroy(self, queryset):
+        """Удаляет объекты автора и возвращает удаленные объекты (пустой список, если удалять нечего)."""
+        return queryset.delete_returning()
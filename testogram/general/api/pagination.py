@@ -0,0 +1,241 @@
+import base64
+import json
+
+from django.db import DatabaseError, connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Постраничная выдача по ключу (keyset/cursor pagination).
+
+    Вместо OFFSET страница ограничивается условием по значениям полей сортировки
+    последнего (или первого) элемента предыдущей страницы. Поэтому стоимость запроса
+    не зависит от того, насколько глубоко в историю мы ушли, если для полей
+    сортировки есть подходящий индекс.
+
+    Параметр "before" возвращает элементы, идущие после курсора в порядке сортировки (более старые),
+    параметр "after" - элементы перед курсором (более новые).
+    """
+    page_size = 50
+    # Все поля сортируются по убыванию. Последнее поле должно быть уникальным (обычно id).
+    ordering = ("-created_at", "-id")
+    before_query_param = "before"
+    after_query_param = "after"
+    invalid_cursor_message = "Некорректный курсор."
+
+    def get_page_queryset(self, queryset, request):
+        """Выборка страницы: условие по курсору и сортировка, без ограничения количества."""
+        self.fields = [field.lstrip("-") for field in self.ordering]
+        before = request.query_params.get(self.before_query_param)
+        after = request.query_params.get(self.after_query_param)
+
+        if after is not None:
+            # Берем элементы "новее" курсора в обратном порядке и затем разворачиваем.
+            queryset = queryset.filter(self._keyset_filter(queryset, after, "gt"))
+            return queryset.order_by(*self.fields)
+        if before is not None:
+            queryset = queryset.filter(self._keyset_filter(queryset, before, "lt"))
+        return queryset.order_by(*self.ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        before = request.query_params.get(self.before_query_param)
+        after = request.query_params.get(self.after_query_param)
+
+        # Лишний элемент нужен только для того, чтобы узнать, есть ли еще страница.
+        page = list(self.get_page_queryset(queryset, request)[:self.page_size + 1])
+        has_more = len(page) > self.page_size
+        page = page[:self.page_size]
+
+        if after is not None:
+            page.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = before is not None
+
+        self.page = page
+        return page
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        })
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        url = remove_query_param(self.base_url, self.after_query_param)
+        return replace_query_param(url, self.before_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        url = remove_query_param(self.base_url, self.before_query_param)
+        return replace_query_param(url, self.after_query_param, self.encode_cursor(self.page[0]))
+
+    def encode_cursor(self, obj):
+        values = [str(getattr(obj, field)) for field in self.fields]
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    def decode_cursor(self, queryset, cursor):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if len(values) != len(self.fields):
+                raise ValueError
+            return [
+                queryset.model._meta.get_field(field).to_python(value)
+                for field, value in zip(self.fields, values)
+            ]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def _keyset_filter(self, queryset, cursor, lookup):
+        """
+        Строит условие (a, b) < (va, vb) в виде
+        a <= va AND (a < va OR (a = va AND b < vb)).
+
+        Условие a <= va избыточно, но без него БД не использует курсор как границу диапазона
+        индекса: OR проверяется для каждой строки, и индекс просматривается от самых новых
+        строк до курсора, т.е. глубокие страницы становятся медленнее.
+        """
+        values = self.decode_cursor(queryset, cursor)
+        condition = Q()
+        for index, field in enumerate(self.fields):
+            equal = {name: value for name, value in zip(self.fields[:index], values[:index])}
+            condition |= Q(**equal, **{f"{field}__{lookup}": values[index]})
+        return Q(**{f"{self.fields[0]}__{lookup}e": values[0]}) & condition
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.before_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Курсор: элементы после указанного (более старые).",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.after_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Курсор: элементы перед указанным (более новые).",
+                "schema": {"type": "string"},
+            },
+        ]
+
+
+class MessageKeysetPagination(KeysetPagination):
+    # Для истории сообщений чата. Индекс Message(chat, created_at, id).
+    ordering = ("-created_at", "-id")
+
+
+class CommentKeysetPagination(KeysetPagination):
+    # Для ветки комментариев поста. Индекс Comment(post, created_at, id).
+    ordering = ("-created_at", "-id")
+
+
+def get_approximate_count(queryset):
+    """
+    Количество строк таблицы по статистике БД, без COUNT(*): sqlite_stat1 (заполняется командой
+    ANALYZE) на SQLite, pg_class.reltuples на PostgreSQL. Возвращает None, если статистики нет
+    или у выборки есть условия: статистика описывает всю таблицу, а не ее часть.
+    """
+    if queryset.query.where:
+        return None
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == "sqlite":
+                # Первое число в stat - количество строк, проиндексированных индексом, т.е. строк таблицы.
+                cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s", [table])
+                counts = [int(stat.split()[0]) for stat, in cursor.fetchall()]
+                return max(counts) if counts else None
+            if connection.vendor == "postgresql":
+                cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)", [table])
+                row = cursor.fetchone()
+                # -1 - таблица еще ни разу не анализировалась.
+                return row[0] if row and row[0] >= 0 else None
+    except DatabaseError:
+        # Например, на SQLite таблицы sqlite_stat1 нет, пока не выполнен ANALYZE.
+        return None
+    return None
+
+
+class CountFreePagination(PageNumberPagination):
+    """
+    Постраничная выдача по номеру страницы (?page=) без COUNT(*).
+
+    PageNumberPagination на каждый запрос считает все строки выборки. Здесь выбирается
+    page_size + 1 строк: лишняя строка только показывает, есть ли следующая страница.
+    Поле count в ответе равно null, а у наследника с approximate_count = True содержит
+    приблизительное количество строк из статистики БД (см. get_approximate_count).
+
+    Viewset выбирает класс через pagination_class.
+    """
+    approximate_count = False
+    invalid_page_message = "Некорректный номер страницы."
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        self.request = request
+        try:
+            self.page_number = int(request.query_params.get(self.page_query_param, 1))
+        except ValueError:
+            raise NotFound(self.invalid_page_message)
+        if self.page_number < 1:
+            raise NotFound(self.invalid_page_message)
+
+        offset = (self.page_number - 1) * page_size
+        page = list(queryset[offset:offset + page_size + 1])
+        if not page and self.page_number > 1:
+            raise NotFound(self.invalid_page_message)
+        self.has_next = len(page) > page_size
+        self.page = page[:page_size]
+        self.count = get_approximate_count(queryset) if self.approximate_count else None
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response({
+            "count": self.count,
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        schema = super().get_paginated_response_schema(schema)
+        schema["properties"]["count"]["nullable"] = True
+        return schema
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.page_query_param, self.page_number + 1)
+
+    def get_previous_link(self):
+        if self.page_number == 1:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.page_number == 2:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, self.page_number - 1)
+
+
+class ApproximateCountPagination(CountFreePagination):
+    # Для больших списков без фильтров (все посты, все пользователи).
+    approximate_count = True
@@ -1,7 +1,12 @@
 from rest_framework.serializers import (Serializer, ModelSerializer, SerializerMethodField,
-                                        CurrentUserDefault, HiddenField, CharField, DateTimeField
+                                        CurrentUserDefault, HiddenField, CharField, DateTimeField,
+                                        ListField, IntegerField, BooleanField
                                         )
+from drf_spectacular.utils import extend_schema_serializer
 from general.models import User, Post, Comment, Reaction, Chat, Message
+from general.friends import are_friends
+from django.conf import settings
+from django.db import transaction
 from django.db.models import Q
 from rest_framework.exceptions import ValidationError
 
@@ -12,20 +17,19 @@ class CommentSerializer(ModelSerializer):
         default=CurrentUserDefault(),
     )
 
-    def get_fields(self):
-        fields =  super().get_fields()
-        if self.context["request"].method == "GET":
-            fields['author'] = UserShortSerializer(read_only=True)
-        return fields
-    
+    # Комментарии читаются через CommentReadSerializer, этот сериализатор - для создания.
+
     class Meta:
         model = Comment
         fields = (
             "id", "author", "post", "body", "created_at",
         )
 
-
-
+    def create(self, validated_data):
+        with transaction.atomic():
+            comment = super().create(validated_data)
+            Post.change_comment_count(comment.post_id, 1)
+        return comment
 
 
 class UserShortSerializer(ModelSerializer):
@@ -35,27 +39,64 @@ class UserShortSerializer(ModelSerializer):
         fields = ("id", "first_name", "last_name",
         )
 
+
+class CommentReadSerializer(Serializer):
+    """
+    Сериализатор для чтения комментариев (ветка комментариев поста, общий список, поиск).
+
+    Комментариев в ответе много, а поля у них простые, поэтому представление собирается
+    в to_representation напрямую, без обхода полей сериализатора для каждого комментария
+    и вложенного UserShortSerializer для каждого автора. Автор должен быть выбран
+    через select_related("author"). Объявленные поля описывают ответ для схемы API.
+    """
+    id = IntegerField(read_only=True)
+    author = UserShortSerializer(read_only=True)
+    post = IntegerField(source="post_id", read_only=True)
+    body = CharField(read_only=True)
+    created_at = DateTimeField(read_only=True)
+
+    def to_representation(self, instance):
+        author = instance.author
+        return {
+            "id": instance.pk,
+            "author": {
+                "id": author.pk,
+                "first_name": author.first_name,
+                "last_name": author.last_name,
+            },
+            "post": instance.post_id,
+            "body": instance.body,
+            "created_at": instance.created_at.strftime(settings.REST_FRAMEWORK["DATETIME_FORMAT"]),
+        }
+
+
 class PostListSerializer(ModelSerializer):
     # сериализатор для списка постов и для поля author используем UserShortSerializer
     author = UserShortSerializer()
-    body = SerializerMethodField()
+    # Текст обрезается в базе данных, см. PostQuerySet.with_body_preview.
+    body = CharField(source="body_preview", read_only=True)
+    my_reaction = SerializerMethodField()
+    reaction_counts = SerializerMethodField()
 
     class Meta:
         model = Post
         fields = ( "id", "author", "title", "body",
-                   "created_at",
+                   "my_reaction", "reaction_counts", "comment_count", "created_at",
         )
 
-    def get_body(self, obj) -> str:
-        if len(obj.body) > 128:
-            return obj.body[:125] + "..."
-        return obj.body
+    def get_reaction_counts(self, obj) -> dict:
+        return obj.reaction_counts
+
+    def get_my_reaction(self, obj) -> str:
+        # значение аннотируется в PostQuerySet.with_my_reaction
+        return obj.my_reaction or ""
 
 
 class PostRetrieveSerializer(ModelSerializer):
     # сериализатор для получения полной информации о публикации по ID.
     author = UserShortSerializer()
     my_reaction = SerializerMethodField()
+    reaction_counts = SerializerMethodField()
 
     class Meta:
         model = Post
@@ -65,12 +106,17 @@ class PostRetrieveSerializer(ModelSerializer):
             "title",
             "body",
             "my_reaction",
+            "reaction_counts",
+            "comment_count",
             "created_at",
         )
+
+    def get_reaction_counts(self, obj) -> dict:
+        return obj.reaction_counts
     
     def get_my_reaction(self, obj) -> str:
-        reaction = self.context["request"].user.reactions.filter(post=obj).last()
-        return reaction.value if reaction else ""
+        # значение аннотируется в PostQuerySet.with_my_reaction
+        return obj.my_reaction or ""
 
 
 class PostCreateUpdateSerializer(ModelSerializer):
@@ -123,17 +169,28 @@ class UserRegistrationSerializer(ModelSerializer):
     
 
 class UserListSerializer(ModelSerializer):
-    is_friend = SerializerMethodField()
+    is_friend = SerializerMethodField() # по закэшированному множеству друзей, см. general/friends.py
     class Meta:
         model = User
         fields = ("id", "first_name", "last_name", "is_friend")
-    
+
     def get_is_friend(self, obj) -> bool:
-        current_user = self.context["request"].user
-        return current_user in obj.friends.all()
+        return are_friends(self.context["request"].user.pk, obj.pk)
+
+
+class FriendIdsSerializer(Serializer):
+    # Список id для массового добавления/удаления друзей.
+    ids = ListField(
+        child=IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_FRIENDS_LIMIT,
+    )
 
 
 class NestedPostListSerializer(ModelSerializer):
+    # Текст обрезается в базе данных, см. PostQuerySet.with_body_preview.
+    body = CharField(source="body_preview", read_only=True)
+
     class Meta:
         model = Post
         # Поле "author" не добавляем намеренно, потому что сам сериализатор будет использоваться, как вложенный в сериализатор 
@@ -147,20 +204,25 @@ class NestedPostListSerializer(ModelSerializer):
 
 
 class UserRetrieveSerializer(ModelSerializer):
-    is_friend = SerializerMethodField()
-    friend_count = SerializerMethodField()
-    posts = NestedPostListSerializer(many=True)
+    is_friend = SerializerMethodField() # по закэшированному множеству друзей, см. general/friends.py
+    posts = SerializerMethodField()
 
     class Meta:
         model = User
+        # friend_count - кэшированное поле модели, дополнительный COUNT не нужен.
         fields = ("id", "first_name", "last_name", "email",
-                  "is_friend", "friend_count", "posts" ) # сериализатор сам обратится по имени posts и достанет все публикации пользователя.
-        
+                  "is_friend", "friend_count", "posts" )
+
     def get_is_friend(self, obj) -> bool:
-        return obj in self.context["request"].user.friends.all()
-    
-    def get_friend_count(self, obj) -> int:
-        return obj.friends.count()
+        return are_friends(self.context["request"].user.pk, obj.pk)
+
+    def get_posts(self, obj) -> list:
+        # В профиль попадают только последние публикации, чтобы размер ответа не зависел
+        # от того, сколько всего написал пользователь.
+        posts = Post.objects.filter(
+            author=obj,
+        ).with_body_preview().order_by("-id")[:settings.PROFILE_RECENT_POSTS_LIMIT]
+        return NestedPostListSerializer(posts, many=True, context=self.context).data
 
 
 
@@ -175,18 +237,12 @@ class ReactionSerializer(ModelSerializer):
         )
 
     def create(self, validated_data):
-        reaction = Reaction.objects.filter(
+        # Реакция ставится или снимается одним атомарным запросом, см. ReactionQuerySet.toggle.
+        reaction = Reaction.objects.toggle(
             author=validated_data["author"],
             post=validated_data["post"],
-        ).last()
-        
-        if not reaction:
-            return Reaction.objects.create(**validated_data)
-        if reaction.value == validated_data["value"]:
-            reaction.value = None
-        else:
-            reaction.value = validated_data["value"]
-        reaction.save()
+            value=validated_data.get("value"),
+        )
         return reaction
     
 
@@ -200,20 +256,12 @@ class ChatSerializer(ModelSerializer):
         fields = ("id", "user_1", "user_2")
     
     def create(self, validated_data):
-        request_user = validated_data["user_1"]
-        second_user = validated_data["user_2"]
-
-        chat = Chat.objects.filter(
-            Q(user_1=request_user, user_2=second_user)
-            | Q(user_1=second_user, user_2=request_user)
-        ).first()
-        if not chat:
-            chat = Chat.objects.create(
-                user_1=request_user,
-                user_2=second_user,
-            )
-
-        return chat
+        # Существующий чат (в любом порядке участников) или новый - одним запросом,
+        # см. ChatQuerySet.get_or_create_between.
+        return Chat.objects.get_or_create_between(
+            validated_data["user_1"],
+            validated_data["user_2"],
+        )
 
     def to_representation(self, obj):
         """
@@ -230,9 +278,9 @@ class ChatSerializer(ModelSerializer):
         """
         representation = super().to_representation(obj)
         representation["user_2"] = (
-            obj.user_1.pk
-            if obj.user_2 == self.context["request"].user
-            else obj.user_2.pk
+            obj.user_1_id
+            if obj.user_2_id == self.context["request"].user.pk
+            else obj.user_2_id
         )
         return representation
     
@@ -246,8 +294,6 @@ class MessageListSerializer(ModelSerializer):
 
 class ChatListSerializer(ModelSerializer):
     companion_name = SerializerMethodField()
-    last_message_content = SerializerMethodField()
-    last_message_datetime = DateTimeField()
 
     class Meta:
         model = Chat
@@ -258,11 +304,8 @@ class ChatListSerializer(ModelSerializer):
             "last_message_datetime",
         )
 
-    def get_last_message_content(self, obj) -> str:
-        return obj.last_message_content
-
     def get_companion_name(self, obj) -> str:
-        companion = obj.user_1 if obj.user_2 == self.context["request"].user else obj.user_2
+        companion = obj.user_1 if obj.user_2_id == self.context["request"].user.pk else obj.user_2
         return f"{companion.first_name} {companion.last_name}"
     
 
@@ -276,10 +319,96 @@ class MessageSerializer(ModelSerializer):
     def validate(self, attrs):
         chat = attrs["chat"]
         author = attrs["author"]
-        if chat.user_1 != author and chat.user_2 != author:
+        # Сравниваем id, чтобы не загружать участников чата.
+        if author.pk not in (chat.user_1_id, chat.user_2_id):
             raise ValidationError("Вы не являетесь участником этого чата.")
         return super().validate(attrs)
 
     class Meta:
         model = Message
-        fields = ("id", "author", "content", "chat", "created_at")
\ No newline at end of file
+        fields = ("id", "author", "content", "chat", "created_at")
+
+    def create(self, validated_data):
+        message = super().create(validated_data)
+        validated_data["chat"].set_last_message(message)
+        return message
+
+
+class MessageBatchItemSerializer(Serializer):
+    # chat - просто id: участие во всех чатах пакета проверяется одним запросом в MessageBatchSerializer.
+    chat = IntegerField(min_value=1)
+    content = CharField()
+
+
+class MessageBatchSerializer(Serializer):
+    """
+    Пакетная отправка сообщений в несколько чатов: POST /api/messages/batch/.
+    Сообщения создаются одним bulk_create, последние сообщения чатов обновляются одним запросом.
+    """
+    author = HiddenField(
+        default=CurrentUserDefault()
+    )
+    messages = MessageBatchItemSerializer(
+        many=True,
+        allow_empty=False,
+        max_length=settings.MESSAGE_BATCH_LIMIT,
+    )
+
+    def validate(self, attrs):
+        author = attrs["author"]
+        chat_ids = {item["chat"] for item in attrs["messages"]}
+        chats = Chat.objects.filter(
+            Q(user_1=author) | Q(user_2=author),
+            pk__in=chat_ids,
+        ).in_bulk()
+        foreign = sorted(chat_ids - set(chats))
+        if foreign:
+            raise ValidationError({
+                "messages": f"Вы не являетесь участником чатов: {', '.join(map(str, foreign))}."
+            })
+        attrs["chats"] = chats
+        return attrs
+
+    def create(self, validated_data):
+        chats = validated_data["chats"]
+        with transaction.atomic():
+            messages = Message.objects.bulk_create([
+                Message(
+                    author=validated_data["author"],
+                    chat=chats[item["chat"]],
+                    content=item["content"],
+                )
+                for item in validated_data["messages"]
+            ])
+            Chat.set_last_messages(chats.values(), messages)
+        return messages
+
+    def to_representation(self, instance):
+        return {
+            "results": [
+                {
+                    "id": message.pk,
+                    "chat": message.chat_id,
+                    "created_at": message.created_at.strftime(settings.REST_FRAMEWORK["DATETIME_FORMAT"]),
+                }
+                for message in instance
+            ]
+        }
+
+
+class SyncMessageSerializer(ModelSerializer):
+    # сообщения при синхронизации приходят из разных чатов, поэтому отдаем chat и author.
+    class Meta:
+        model = Message
+        fields = ("id", "chat", "author", "content", "created_at")
+
+
+# Ответ /api/sync/ - один объект, хотя view отдает его из list().
+@extend_schema_serializer(many=False)
+class SyncResponseSerializer(Serializer):
+    # изменения с момента выдачи since и токен для следующего запроса.
+    chats = ChatListSerializer(many=True)
+    messages = SyncMessageSerializer(many=True)
+    deleted_messages = ListField(child=IntegerField())
+    next_token = CharField()
+    has_more = BooleanField()
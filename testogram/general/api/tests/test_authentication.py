@@ -0,0 +1,82 @@
+from django.core.cache import cache
+from rest_framework.test import APITestCase
+from rest_framework import status
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from general.models import User
+from general.factories import UserFactory, PostFactory
+
+
+class TokenAuthenticationTestCase(APITestCase):
+    def setUp(self):
+        # состояние пользователей кэшируется, а id в тестовой БД повторяются.
+        cache.clear()
+        self.user = UserFactory()
+        self.authenticate(self.user)
+
+    def authenticate(self, user):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(user)}")
+
+    def test_user_is_not_loaded_on_each_request(self):
+        PostFactory.create_batch(3)
+        self.client.get("/api/feed/")
+
+        # лента друзей и посты, без запроса пользователя.
+        with self.assertNumQueries(2):
+            response = self.client.get("/api/feed/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_write_with_token_user(self):
+        response = self.client.post(
+            "/api/posts/",
+            data={"title": "title", "body": "body"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.user.posts.count(), 1)
+
+        friend = UserFactory()
+        response = self.client.post(f"/api/users/{friend.pk}/add_friend/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.friend_count, 1)
+
+    def test_inactive_user(self):
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        response = self.client.get("/api/feed/")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_revoke_tokens(self):
+        response = self.client.post("/api/users/revoke_tokens/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get("/api/feed/")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_revoke_tokens_survives_cache_clear(self):
+        self.client.post("/api/users/revoke_tokens/")
+        cache.clear()
+
+        response = self.client.get("/api/feed/")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_revoked_refresh_token(self):
+        refresh = RefreshToken.for_user(self.user)
+        response = self.client.post("/api/token/refresh/", data={"refresh": str(refresh)}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.client.post("/api/users/revoke_tokens/")
+        response = self.client.post("/api/token/refresh/", data={"refresh": str(refresh)}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_admin_endpoint_uses_cached_flags(self):
+        self.authenticate(UserFactory(is_staff=False))
+        response = self.client.get("/api/posts/cache_stats/")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_schema_declares_jwt_auth(self):
+        response = self.client.get("/api/schema/", HTTP_ACCEPT="application/vnd.oai.openapi+json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        schema = response.json()
+        self.assertIn("jwtAuth", schema["components"]["securitySchemes"])
+        self.assertIn({"jwtAuth": []}, schema["paths"]["/api/feed/"]["get"]["security"])
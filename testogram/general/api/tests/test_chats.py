@@ -3,6 +3,9 @@ from rest_framework import status
 
 from general.models import User, Post, Comment, Chat, Message, Reaction
 from general.factories import ( UserFactory, PostFactory, CommentFactory, ChatFactory, MessageFactory, ReactionFactory)
+from general.api.pagination import MessageKeysetPagination
+
+from unittest.mock import patch
 
 
 
@@ -38,6 +41,7 @@ class ChatTestCase(APITestCase):
         # что получаем только свои чаты и сообщения.
         MessageFactory.create_batch(10)
 
+        # одна страница без COUNT(*): чаты, где пользователь первый и второй участник.
         with self.assertNumQueries(2):
             response = self.client.get(self.url, format="json")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -88,6 +92,38 @@ class ChatTestCase(APITestCase):
             chat_1_expected_data,
         )
 
+    def test_chat_list_pages(self):
+        # чаты, где пользователь первый и второй участник, чередуются, и страницы
+        # собираются из обеих выборок без пропусков и повторов.
+        chats = [
+            ChatFactory(user_1=self.user) if index % 3 else ChatFactory(user_2=self.user)
+            for index in range(25)
+        ]
+        for chat in reversed(chats):
+            MessageFactory(chat=chat, author=self.user)
+        # чат без сообщений в списке не показывается.
+        ChatFactory(user_1=self.user)
+
+        chat_ids = []
+        url = self.url
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            chat_ids += [chat["id"] for chat in response.data["results"]]
+            url = response.data["next"]
+        self.assertListEqual(chat_ids, [chat.pk for chat in chats])
+
+    def test_older_message_does_not_replace_last_message(self):
+        chat = ChatFactory(user_1=self.user)
+        older = MessageFactory(chat=chat, author=self.user)
+        newer = MessageFactory(chat=chat, author=self.user)
+
+        # отправка, которая выполнялась дольше, записывает свое сообщение последней.
+        chat.set_last_message(older)
+
+        chat.refresh_from_db()
+        self.assertEqual(chat.last_message_id, newer.pk)
+
     def test_create_chat(self):
         user = UserFactory()
         data = {"user_2": user.pk}
@@ -142,11 +178,13 @@ class ChatTestCase(APITestCase):
         chat = ChatFactory(user_1=user, user_2=self.user)
         data = {"user_2": user.pk}
 
-        response = self.client.post(
-            self.url,
-            data=data,
-            format="json",
-        )
+        # проверка собеседника и один INSERT ... ON CONFLICT ... RETURNING.
+        with self.assertNumQueries(2):
+            response = self.client.post(
+                self.url,
+                data=data,
+                format="json",
+            )
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
 
         chats = Chat.objects.all()
@@ -165,6 +203,18 @@ class ChatTestCase(APITestCase):
             response.data,
         )
 
+    def test_get_or_create_between_is_idempotent(self):
+        user = UserFactory()
+        chat = Chat.objects.get_or_create_between(self.user, user)
+
+        self.assertEqual(Chat.objects.get_or_create_between(self.user, user).pk, chat.pk)
+        self.assertEqual(Chat.objects.get_or_create_between(user, self.user).pk, chat.pk)
+
+        chat.refresh_from_db()
+        self.assertEqual(chat.user_1, self.user)
+        self.assertEqual(chat.user_2, user)
+        self.assertEqual(Chat.objects.count(), 1)
+
     def test_delete_chat(self):
         chat_1 = ChatFactory(user_1=self.user)
         chat_2 = ChatFactory(user_2=self.user)
@@ -202,7 +252,9 @@ class ChatTestCase(APITestCase):
         with self.assertNumQueries(2):
             response = self.client.get(url, format="json")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 3)
+        self.assertEqual(len(response.data["results"]), 3)
+        self.assertIsNone(response.data["next"])
+        self.assertIsNone(response.data["previous"])
 
         # сообщения приходят в порядке от новых к старым.
         # поэтому сначала проверяем message_3.
@@ -213,7 +265,7 @@ class ChatTestCase(APITestCase):
             "created_at": message_3.created_at.strftime(("%Y-%m-%dT%H:%M:%S")),
         }
         self.assertDictEqual(
-            response.data[0],
+            response.data["results"][0],
             message_3_expected_data,
         )
 
@@ -224,7 +276,7 @@ class ChatTestCase(APITestCase):
             "created_at": message_2.created_at.strftime(("%Y-%m-%dT%H:%M:%S")),
         }
         self.assertDictEqual(
-            response.data[1],
+            response.data["results"][1],
             message_2_expected_data,
         )
 
@@ -235,6 +287,52 @@ class ChatTestCase(APITestCase):
             "created_at": message_1.created_at.strftime(("%Y-%m-%dT%H:%M:%S")),
         }
         self.assertDictEqual(
-            response.data[2],
+            response.data["results"][2],
             message_1_expected_data,
-        )
\ No newline at end of file
+        )
+
+    @patch.object(MessageKeysetPagination, "page_size", 2)
+    def test_get_messages_pagination(self):
+        chat = ChatFactory(user_1=self.user)
+        messages = MessageFactory.create_batch(5, author=self.user, chat=chat)
+        # сообщения приходят от новых к старым.
+        expected_ids = [message.pk for message in reversed(messages)]
+
+        url = f"{self.url}{chat.pk}/messages/"
+        response = self.client.get(url, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [message["id"] for message in response.data["results"]],
+            expected_ids[:2],
+        )
+        self.assertIsNone(response.data["previous"])
+
+        # листаем историю назад по курсору before.
+        with self.assertNumQueries(2):
+            response = self.client.get(response.data["next"], format="json")
+        self.assertEqual(
+            [message["id"] for message in response.data["results"]],
+            expected_ids[2:4],
+        )
+
+        response = self.client.get(response.data["next"], format="json")
+        self.assertEqual(
+            [message["id"] for message in response.data["results"]],
+            expected_ids[4:],
+        )
+        self.assertIsNone(response.data["next"])
+
+        # и возвращаемся вперед по курсору after.
+        response = self.client.get(response.data["previous"], format="json")
+        self.assertEqual(
+            [message["id"] for message in response.data["results"]],
+            expected_ids[2:4],
+        )
+
+    def test_get_messages_invalid_cursor(self):
+        chat = ChatFactory(user_1=self.user)
+        MessageFactory(author=self.user, chat=chat)
+
+        url = f"{self.url}{chat.pk}/messages/?before=invalid"
+        response = self.client.get(url, format="json")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
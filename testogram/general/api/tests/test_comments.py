@@ -32,6 +32,9 @@ class CommentTestCase(APITestCase):
         self.assertEqual(self.user, comment.author)
         self.assertIsNotNone(comment.created_at)
 
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+
     def test_pass_incorrect_post_id(self):
         data = {
             "post": self.post.pk + 1,
@@ -53,6 +56,9 @@ class CommentTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         self.assertEqual(Comment.objects.count(), 0)
 
+        comment.post.refresh_from_db()
+        self.assertEqual(comment.post.comment_count, 0)
+
     def test_delete_other_comment(self):
         comment = CommentFactory()
         response = self.client.delete(
@@ -66,6 +72,37 @@ class CommentTestCase(APITestCase):
             "Вы не являетесь автором этого комментария.",
         )
 
+    def test_admin_delete_updates_comment_count(self):
+        comments = CommentFactory.create_batch(3, post=self.post)
+        self.client.force_login(UserFactory(is_staff=True, is_superuser=True))
+
+        response = self.client.post(f"/admin/general/comment/{comments[0].pk}/delete/", {"post": "yes"})
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 2)
+
+        response = self.client.post("/admin/general/comment/", {
+            "action": "delete_selected",
+            "_selected_action": [comment.pk for comment in comments[1:]],
+            "post": "yes",
+        })
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 0)
+
+    def test_deleted_user_comments_leave_comment_count(self):
+        author = UserFactory()
+        CommentFactory.create_batch(2, post=self.post, author=author)
+        CommentFactory(post=self.post)
+        other_post = PostFactory()
+        CommentFactory(post=other_post, author=author)
+
+        author.delete()
+        self.post.refresh_from_db()
+        other_post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+        self.assertEqual(other_post.comment_count, 0)
+
     def test_comment_list_filtered_by_post_id(self):
         comments = CommentFactory.create_batch(5, post=self.post)
 
@@ -101,4 +138,71 @@ class CommentTestCase(APITestCase):
             "post": comment.post.id,
             "created_at": comment.created_at.strftime("%Y-%m-%dT%H:%M:%S"),
         }
-        self.assertDictEqual(response.data["results"][0], expected_data)
\ No newline at end of file
+        self.assertDictEqual(response.data["results"][0], expected_data)
+
+class PostCommentsTestCase(APITestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.client.force_authenticate(user=self.user)
+        self.post = PostFactory()
+        self.url = f"/api/posts/{self.post.pk}/comments/"
+
+    def test_comments_paginated_by_cursor(self):
+        comments = CommentFactory.create_batch(60, post=self.post)
+        # comments of other posts
+        CommentFactory.create_batch(5)
+        expected_ids = [comment.pk for comment in reversed(comments)]
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([comment["id"] for comment in response.data["results"]], expected_ids[:50])
+        self.assertIsNone(response.data["previous"])
+        self.assertIsNotNone(response.data["next"])
+
+        response = self.client.get(response.data["next"])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([comment["id"] for comment in response.data["results"]], expected_ids[50:])
+        self.assertIsNone(response.data["next"])
+
+        response = self.client.get(response.data["previous"])
+        self.assertEqual([comment["id"] for comment in response.data["results"]], expected_ids[:50])
+
+    def test_comment_data_structure(self):
+        comment = CommentFactory(post=self.post)
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        expected_data = {
+            "id": comment.pk,
+            "body": comment.body,
+            "author": {
+                "id": comment.author.id,
+                "first_name": comment.author.first_name,
+                "last_name": comment.author.last_name,
+            },
+            "post": self.post.pk,
+            "created_at": comment.created_at.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        self.assertDictEqual(response.data["results"][0], expected_data)
+
+    def test_authors_fetched_in_one_query(self):
+        CommentFactory.create_batch(10, post=self.post)
+
+        # комментарии вместе с авторами.
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.data["results"]), 10)
+
+    def test_post_without_comments(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["results"], [])
+
+    def test_post_not_found(self):
+        response = self.client.get(f"/api/posts/{self.post.pk + 1}/comments/")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {"before": "not-a-cursor"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,71 @@
+import json
+from io import StringIO
+
+from django.core.management import call_command
+from rest_framework.test import APITestCase
+from rest_framework import status
+
+from general.factories import UserFactory, PostFactory, CommentFactory, ReactionFactory, ChatFactory, MessageFactory
+
+
+class ExportTestCase(APITestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.client.force_authenticate(user=self.user)
+        self.url = "/api/users/export/"
+
+        self.friend = UserFactory()
+        self.user.add_friend(self.friend)
+        self.post = PostFactory(author=self.user)
+        self.comment = CommentFactory(author=self.user)
+        self.reaction = ReactionFactory(author=self.user)
+        self.chat = ChatFactory(user_1=self.user)
+        self.messages = [
+            MessageFactory(chat=self.chat, author=self.user),
+            MessageFactory(chat=self.chat, author=self.chat.user_2),
+        ]
+
+        # чужие данные в выгрузку не попадают.
+        PostFactory()
+        CommentFactory(post=self.post)
+        MessageFactory()
+
+    def get_records(self, content):
+        return [json.loads(line) for line in content.splitlines()]
+
+    def test_export_streams_user_data(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertTrue(response["Content-Type"].startswith("application/x-ndjson"))
+
+        records = self.get_records(b"".join(response.streaming_content).decode())
+        self.assertEqual(
+            [record["type"] for record in records],
+            ["user", "friend", "post", "comment", "reaction", "chat", "message", "message"],
+        )
+        self.assertEqual(records[0]["id"], self.user.pk)
+        self.assertEqual(records[0]["username"], self.user.username)
+        self.assertEqual(records[1]["user_id"], self.friend.pk)
+        self.assertEqual(records[2]["id"], self.post.pk)
+        self.assertEqual(records[2]["body"], self.post.body)
+        self.assertEqual(records[3]["id"], self.comment.pk)
+        self.assertEqual(records[4]["value"], self.reaction.value)
+        self.assertEqual(records[5]["id"], self.chat.pk)
+        self.assertEqual(
+            [(record["id"], record["author_id"]) for record in records[6:]],
+            [(message.pk, message.author_id) for message in self.messages],
+        )
+
+    def test_export_requires_authentication(self):
+        self.client.force_authenticate(user=None)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_management_command(self):
+        out = StringIO()
+        call_command("export_user_data", self.user.username, stdout=out)
+
+        records = self.get_records(out.getvalue())
+        self.assertEqual(len(records), 8)
+        self.assertEqual(records[0]["id"], self.user.pk)
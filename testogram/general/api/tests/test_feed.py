@@ -0,0 +1,128 @@
+from rest_framework.test import APITestCase
+from rest_framework import status
+
+from general.models import User, Post, Comment, Chat, Message, Reaction, TimelineEntry
+from general.factories import ( UserFactory, PostFactory, CommentFactory, ChatFactory, MessageFactory, ReactionFactory)
+from general.friends import friend_sets
+
+from django.test import override_settings
+
+
+class FeedTestCase(APITestCase):
+    def setUp(self):
+        friend_sets.clear()
+        self.user = UserFactory()
+        self.client.force_authenticate(user=self.user)
+        self.url = "/api/feed/"
+
+    def create_post(self, author):
+        # публикуем от имени автора через API, чтобы пост разослался по лентам.
+        self.client.force_authenticate(user=author)
+        response = self.client.post(
+            "/api/posts/",
+            data={"title": "title", "body": "body"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.client.force_authenticate(user=self.user)
+        return Post.objects.get(pk=response.data["id"])
+
+    def test_feed_contains_friends_posts(self):
+        friend = UserFactory()
+        self.user.add_friend(friend)
+        stranger = UserFactory()
+
+        post_1 = self.create_post(friend)
+        self.create_post(stranger)
+        post_2 = self.create_post(friend)
+
+        self.assertEqual(TimelineEntry.objects.filter(owner=self.user).count(), 2)
+
+        response = self.client.get(self.url, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [post["id"] for post in response.data["results"]],
+            [post_2.pk, post_1.pk],
+        )
+        self.assertIsNone(response.data["next"])
+
+    def test_fan_out_ignores_stale_friend_cache(self):
+        friend = UserFactory()
+        friend_sets.get(friend.pk)
+        # дружбу записал другой процесс, кэш этого процесса о ней еще не знает.
+        User.friends.through.objects.bulk_create([
+            User.friends.through(from_user=self.user, to_user=friend),
+            User.friends.through(from_user=friend, to_user=self.user),
+        ])
+
+        post = self.create_post(friend)
+        self.assertTrue(TimelineEntry.objects.filter(owner=self.user, post=post).exists())
+
+    @override_settings(FEED_FANOUT_LIMIT=1)
+    def test_high_degree_author_is_read_on_demand(self):
+        celebrity = UserFactory()
+        self.user.add_friend(celebrity)
+        celebrity.add_friend(UserFactory())
+        friend = UserFactory()
+        self.user.add_friend(friend)
+
+        celebrity_post = self.create_post(celebrity)
+        friend_post = self.create_post(friend)
+
+        # пост автора с большим количеством друзей не рассылается.
+        self.assertFalse(TimelineEntry.objects.filter(post=celebrity_post).exists())
+
+        response = self.client.get(self.url, format="json")
+        self.assertEqual(
+            [post["id"] for post in response.data["results"]],
+            [friend_post.pk, celebrity_post.pk],
+        )
+
+    def test_author_crossing_fanout_limit(self):
+        friend = UserFactory()
+        self.user.add_friend(friend)
+        with override_settings(FEED_FANOUT_LIMIT=0):
+            direct_post = self.create_post(friend)
+        fanned_out_post = self.create_post(friend)
+
+        self.assertFalse(Post.objects.get(pk=direct_post.pk).fanned_out)
+        self.assertTrue(Post.objects.get(pk=fanned_out_post.pk).fanned_out)
+
+        # пост, опубликованный без рассылки, остается в ленте и после того, как автор
+        # оказался ниже порога, и наоборот: разосланный пост не приходит дважды.
+        for limit in [1000, 0]:
+            with override_settings(FEED_FANOUT_LIMIT=limit):
+                response = self.client.get(self.url, format="json")
+            self.assertEqual(
+                [post["id"] for post in response.data["results"]],
+                [fanned_out_post.pk, direct_post.pk],
+            )
+
+    @override_settings(FEED_PAGE_SIZE=2)
+    def test_feed_pagination(self):
+        friend = UserFactory()
+        self.user.add_friend(friend)
+        posts = [self.create_post(friend) for _ in range(3)]
+
+        response = self.client.get(self.url, format="json")
+        self.assertEqual(
+            [post["id"] for post in response.data["results"]],
+            [posts[2].pk, posts[1].pk],
+        )
+
+        response = self.client.get(response.data["next"], format="json")
+        self.assertEqual(
+            [post["id"] for post in response.data["results"]],
+            [posts[0].pk],
+        )
+        self.assertIsNone(response.data["next"])
+
+    def test_remove_friend_cleans_feed(self):
+        friend = UserFactory()
+        self.user.add_friend(friend)
+        self.create_post(friend)
+
+        self.user.remove_friend(friend)
+
+        response = self.client.get(self.url, format="json")
+        self.assertEqual(response.data["results"], [])
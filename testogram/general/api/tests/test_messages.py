@@ -62,4 +62,99 @@ class MessageTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
         self.assertEqual(chat.messages.count(), 1)
-        self.assertEqual(companion.messages.count(), 1)
\ No newline at end of file
+        self.assertEqual(companion.messages.count(), 1)
+
+    def test_create_message_updates_chat_last_message(self):
+        chat = ChatFactory(user_1=self.user)
+        data = {
+            "chat": chat.pk,
+            "content": "Тестовое сообщение.",
+        }
+        response = self.client.post(self.url, data=data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        message = Message.objects.last()
+        chat.refresh_from_db()
+        self.assertEqual(chat.last_message, message)
+        self.assertEqual(chat.last_message_content, data["content"])
+        self.assertEqual(chat.last_message_author, self.user)
+        self.assertEqual(chat.last_message_datetime, message.created_at)
+
+    def test_delete_last_message_restores_previous(self):
+        chat = ChatFactory(user_1=self.user)
+        previous_message = MessageFactory(author=self.user, chat=chat)
+        last_message = MessageFactory(author=self.user, chat=chat)
+
+        # DELETE с условием author_id, запись об удалении и обновление последнего сообщения чата
+        # (плюс SAVEPOINT/RELEASE транзакции). Чат и автор не загружаются.
+        with self.assertNumQueries(5):
+            response = self.client.delete(
+                self.url + f"{last_message.pk}/",
+                format="json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        chat.refresh_from_db()
+        self.assertEqual(chat.last_message, previous_message)
+        self.assertEqual(chat.last_message_content, previous_message.content)
+        self.assertEqual(chat.last_message_datetime, previous_message.created_at)
+
+        response = self.client.delete(
+            self.url + f"{previous_message.pk}/",
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        chat.refresh_from_db()
+        self.assertIsNone(chat.last_message)
+        self.assertIsNone(chat.last_message_datetime)
+
+    def test_create_message_batch(self):
+        chat_1 = ChatFactory(user_1=self.user)
+        chat_2 = ChatFactory(user_2=self.user)
+        data = {
+            "messages": [
+                {"chat": chat_1.pk, "content": "Первое"},
+                {"chat": chat_2.pk, "content": "Второе"},
+                {"chat": chat_1.pk, "content": "Третье"},
+            ],
+        }
+        # проверка участия во всех чатах, вставка сообщений и обновление последних сообщений чатов
+        # (плюс SAVEPOINT/RELEASE транзакции).
+        with self.assertNumQueries(5):
+            response = self.client.post(f"{self.url}batch/", data=data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        messages = list(Message.objects.order_by("id"))
+        self.assertEqual(
+            response.data["results"],
+            [
+                {
+                    "id": message.pk,
+                    "chat": message.chat_id,
+                    "created_at": message.created_at.strftime("%Y-%m-%dT%H:%M:%S"),
+                }
+                for message in messages
+            ],
+        )
+        self.assertEqual([message.content for message in messages], ["Первое", "Второе", "Третье"])
+        self.assertTrue(all(message.author == self.user for message in messages))
+
+        chat_1.refresh_from_db()
+        chat_2.refresh_from_db()
+        self.assertEqual(chat_1.last_message, messages[2])
+        self.assertEqual(chat_1.last_message_content, "Третье")
+        self.assertEqual(chat_2.last_message, messages[1])
+
+    def test_try_to_create_message_batch_for_other_chat(self):
+        own_chat = ChatFactory(user_1=self.user)
+        other_chat = ChatFactory()
+        data = {
+            "messages": [
+                {"chat": own_chat.pk, "content": "Сообщение"},
+                {"chat": other_chat.pk, "content": "Сообщение"},
+            ],
+        }
+        response = self.client.post(f"{self.url}batch/", data=data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Message.objects.count(), 0)
@@ -1,12 +1,25 @@
+import time
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
 from rest_framework.test import APITestCase
 from rest_framework import status
 
 from general.models import User, Post, Comment, Chat, Message, Reaction
 from general.factories import ( UserFactory, PostFactory, CommentFactory, ChatFactory, MessageFactory, ReactionFactory)
+from general.api.cache import post_cache
+from general.api.serializers import PostRetrieveSerializer
 
 
+# Кэш постов включен, как с Redis; в тестах он работает поверх LocMemCache одного процесса.
+@override_settings(POST_CACHE_ALIAS="default")
 class PostTestCase(APITestCase):
     def setUp(self) -> None:
+        # кэш постов общий для всех тестов, а id в тестовой БД повторяются.
+        cache.clear()
+        post_cache.reset_stats()
         self.user = UserFactory()
         self.client.force_authenticate(user=self.user)
         self.url = '/api/posts/'
@@ -45,7 +58,9 @@ class PostTestCase(APITestCase):
     def test_post_list(self):
         PostFactory.create_batch(5)
 
-        response = self.client.get(path=self.url, format="json")
+        # страница вместе с авторами и приблизительное количество из статистики, без COUNT(*).
+        with self.assertNumQueries(2):
+            response = self.client.get(path=self.url, format="json")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data["results"]), 5)
 
@@ -68,10 +83,45 @@ class PostTestCase(APITestCase):
                 if len(post.body) > 128
                 else post.body 
             ),
+            "my_reaction": "",
+            "reaction_counts": {
+                "smile": 0,
+                "thumb_up": 0,
+                "laugh": 0,
+                "sad": 0,
+                "heart": 0,
+            },
+            "comment_count": 0,
             "created_at": post.created_at.strftime("%Y-%m-%dT%H:%M:%S"),
         }
         self.assertDictEqual(expected_data, response.data["results"][0])
 
+    def test_post_list_my_reaction(self):
+        posts = PostFactory.create_batch(3)
+        ReactionFactory(author=self.user, post=posts[0], value=Reaction.Values.HEART)
+        ReactionFactory(author=self.user, post=posts[2], value=Reaction.Values.SAD)
+        # чужая реакция не должна попасть в my_reaction.
+        ReactionFactory(post=posts[1], value=Reaction.Values.LAUGH)
+
+        with self.assertNumQueries(2):
+            response = self.client.get(path=self.url, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        my_reactions = [post["my_reaction"] for post in response.data["results"]]
+        self.assertListEqual(
+            my_reactions,
+            [Reaction.Values.SAD, "", Reaction.Values.HEART],
+        )
+
+    def test_post_list_long_body_is_truncated(self):
+        PostFactory(body="a" * 128)
+        PostFactory(body="b" * 129)
+
+        response = self.client.get(path=self.url, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["results"][0]["body"], "b" * 125 + "...")
+        self.assertEqual(response.data["results"][1]["body"], "a" * 128)
+
     def test_retrieve_structure(self):
         post = PostFactory()
         author = post.author
@@ -81,10 +131,11 @@ class PostTestCase(APITestCase):
             value=Reaction.Values.HEART,
         )
 
-        response = self.client.get(
-            path=f"{self.url}{post.pk}/",
-            format="json",
-        )
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                path=f"{self.url}{post.pk}/",
+                format="json",
+            )
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
         expected_data = {
@@ -97,6 +148,14 @@ class PostTestCase(APITestCase):
             "title": post.title,
             "body": post.body,
             "my_reaction": reaction.value,
+            "reaction_counts": {
+                "smile": 0,
+                "thumb_up": 0,
+                "laugh": 0,
+                "sad": 0,
+                "heart": 1,
+            },
+            "comment_count": 0,
             "created_at": post.created_at.strftime("%Y-%m-%dT%H:%M:%S"),
         }
         self.assertDictEqual(expected_data, response.data)
@@ -123,11 +182,13 @@ class PostTestCase(APITestCase):
             "title": "new_title",
             "body": "new_body",
         }
-        response = self.client.patch(
-            path=f"{self.url}{post.pk}/",
-            data=new_data,
-            format="json",
-        )
+        # права проверяются условием author_id в самом UPDATE ... RETURNING.
+        with self.assertNumQueries(1):
+            response = self.client.patch(
+                path=f"{self.url}{post.pk}/",
+                data=new_data,
+                format="json",
+            )
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
         self.assertEqual(response.data["title"], new_data["title"])
@@ -203,3 +264,136 @@ class PostTestCase(APITestCase):
             format="json",
         )
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_post_list_is_cached(self):
+        PostFactory.create_batch(3)
+        self.client.get(path=self.url, format="json")
+
+        # повторный запрос читает из БД только реакции текущего пользователя.
+        with self.assertNumQueries(1):
+            response = self.client.get(path=self.url, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 3)
+        self.assertEqual(post_cache.stats(), {"hits": 3, "misses": 0})
+
+    def test_post_list_cache_invalidated_on_create(self):
+        PostFactory()
+        self.client.get(path=self.url, format="json")
+        self.client.post(path=self.url, data={"title": "new", "body": "new"}, format="json")
+
+        response = self.client.get(path=self.url, format="json")
+        self.assertEqual(len(response.data["results"]), 2)
+        self.assertEqual(response.data["results"][0]["title"], "new")
+
+    def test_retrieve_cache_invalidated_on_update(self):
+        post = PostFactory(author=self.user, title="old_title")
+        self.client.get(path=f"{self.url}{post.pk}/", format="json")
+        self.client.patch(path=f"{self.url}{post.pk}/", data={"title": "new_title"}, format="json")
+
+        response = self.client.get(path=f"{self.url}{post.pk}/", format="json")
+        self.assertEqual(response.data["title"], "new_title")
+
+    @override_settings(POST_CACHE_VERSION_TIMEOUT=600)
+    def test_post_versions_expire(self):
+        post = PostFactory(author=self.user)
+        # версия списка создается при чтении и увеличивается при создании поста,
+        # версия поста создается при изменении непрочитанного поста.
+        self.client.get(path=self.url, format="json")
+        self.client.post(path=self.url, data={"title": "new", "body": "new"}, format="json")
+        self.client.patch(path=f"{self.url}{post.pk}/", data={"title": "new_title"}, format="json")
+        version_keys = [post_cache._list_version_key(), post_cache._version_key(post.pk)]
+        self.assertEqual(len(cache.get_many(version_keys)), 2)
+
+        # ключи версий не хранятся бессрочно.
+        with patch("time.time", return_value=time.time() + 601):
+            self.assertEqual(cache.get_many(version_keys), {})
+
+    def test_cached_post_counters_are_live(self):
+        post = PostFactory()
+        self.client.get(path=f"{self.url}{post.pk}/", format="json")
+        self.client.get(path=self.url, format="json")
+        self.client.post("/api/reaction/", data={"post": post.pk, "value": "smile"}, format="json")
+        self.client.post("/api/comments/", data={"post": post.pk, "body": "body"}, format="json")
+
+        # реакции и комментарии не сбрасывают кэш: счетчики дочитываются из БД.
+        response = self.client.get(path=f"{self.url}{post.pk}/", format="json")
+        self.assertEqual(response.data["my_reaction"], "smile")
+        self.assertEqual(response.data["reaction_counts"]["smile"], 1)
+        self.assertEqual(response.data["comment_count"], 1)
+        self.assertEqual(list(response.data), list(PostRetrieveSerializer().fields))
+
+        response = self.client.get(path=self.url, format="json")
+        self.assertEqual(response.data["results"][0]["reaction_counts"]["smile"], 1)
+        self.assertEqual(response.data["results"][0]["comment_count"], 1)
+        self.assertEqual(post_cache.stats(), {"hits": 2, "misses": 1})
+
+    def test_post_list_page_key_ignores_other_params(self):
+        PostFactory.create_batch(12)
+        self.client.get(path=self.url, data={"page": 2}, format="json")
+
+        # посторонние параметры не создают новых записей: страница берется из кэша.
+        with self.assertNumQueries(1):
+            response = self.client.get(path=self.url, data={"page": "2", "x": "1"}, format="json")
+        self.assertEqual(len(response.data["results"]), 2)
+
+    def test_cached_post_list_links_use_current_host(self):
+        PostFactory.create_batch(12)
+        self.client.get(path=self.url, format="json", HTTP_HOST="first.example.com")
+
+        response = self.client.get(path=self.url, format="json", HTTP_HOST="second.example.com")
+        self.assertEqual(post_cache.stats()["hits"], 10)
+        self.assertEqual(response.data["next"], "http://second.example.com/api/posts/?page=2")
+        self.assertIsNone(response.data["previous"])
+
+    @override_settings(POST_CACHE_ALIAS=None)
+    def test_post_cache_is_off_without_alias(self):
+        post = PostFactory()
+        self.client.get(path=self.url, format="json")
+        self.client.get(path=f"{self.url}{post.pk}/", format="json")
+
+        response = self.client.get(path=self.url, format="json")
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertEqual(post_cache.stats(), {"hits": 0, "misses": 0})
+
+    def test_cached_post_my_reaction_is_per_user(self):
+        post = PostFactory()
+        ReactionFactory(author=self.user, post=post, value="heart")
+        response = self.client.get(path=f"{self.url}{post.pk}/", format="json")
+        self.assertEqual(response.data["my_reaction"], "heart")
+
+        self.client.force_authenticate(user=UserFactory())
+        response = self.client.get(path=f"{self.url}{post.pk}/", format="json")
+        self.assertEqual(response.data["my_reaction"], "")
+        self.assertEqual(post_cache.stats()["hits"], 1)
+
+    def test_cache_stats_only_for_admin(self):
+        self.client.force_authenticate(user=UserFactory(is_staff=False))
+        response = self.client.get(path=f"{self.url}cache_stats/", format="json")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_update_not_existing_post(self):
+        response = self.client.patch(path=f"{self.url}999/", data={"title": "new_title"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_post_list_approximate_count(self):
+        PostFactory.create_batch(12)
+        response = self.client.get(path=self.url, format="json")
+        # статистики еще нет, точное количество не считается.
+        self.assertIsNone(response.data["count"])
+        self.assertIsNotNone(response.data["next"])
+
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        cache.clear()
+        response = self.client.get(path=self.url, format="json")
+        self.assertEqual(response.data["count"], 12)
+
+        response = self.client.get(path=response.data["next"], format="json")
+        self.assertEqual(len(response.data["results"]), 2)
+        self.assertIsNone(response.data["next"])
+        self.assertIsNotNone(response.data["previous"])
+
+    def test_post_list_page_out_of_range(self):
+        PostFactory()
+        response = self.client.get(path=self.url, data={"page": 2}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,208 @@
+import os
+import random
+from datetime import timedelta
+from unittest import skipUnless
+
+from django.db import connection
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APITestCase, APIRequestFactory
+
+from general.models import User, Post, Comment, Chat, Message
+from general.api.pagination import CommentKeysetPagination, MessageKeysetPagination
+from general.feed import get_direct_queries
+from general.api.views import ChatViewSet, CommentsViewSet, PostViewSet, UserViewSet
+
+
+# По умолчанию набор данных небольшой, чтобы тесты шли быстро.
+# Проверка на реалистичном объеме (около миллиона строк):
+# QUERY_PLAN_ROWS=1000000 python manage.py test general.api.tests.test_query_plans
+ROWS = int(os.environ.get("QUERY_PLAN_ROWS", 5000))
+BATCH_SIZE = 5000
+
+
+@skipUnless(connection.vendor == "sqlite", "планы запросов проверяются для SQLite")
+class QueryPlanTestCase(APITestCase):
+    """
+    Проверяем, что запросы viewset-ов используют индексы, а не полный просмотр таблиц
+    и не сортировку во временном B-дереве.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        rnd = random.Random(0)
+        now = timezone.now()
+
+        user_count = max(ROWS // 100, 10)
+        User.objects.bulk_create(
+            [User(username=f"plan_user_{i}") for i in range(user_count)],
+            batch_size=BATCH_SIZE,
+        )
+        user_ids = list(User.objects.values_list("id", flat=True))
+        cls.user = User.objects.get(pk=user_ids[0])
+
+        # большая часть постов разослана по лентам, напрямую читается примерно каждый десятый.
+        Post.objects.bulk_create(
+            [
+                Post(author_id=rnd.choice(user_ids), title="title", body="body", fanned_out=i % 10 != 0)
+                for i in range(max(ROWS // 10, 10))
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        post_ids = list(Post.objects.values_list("id", flat=True))
+        cls.post = Post.objects.get(pk=post_ids[0])
+
+        Comment.objects.bulk_create(
+            [
+                Comment(author_id=rnd.choice(user_ids), post_id=rnd.choice(post_ids), body="body")
+                for _ in range(ROWS)
+            ],
+            batch_size=BATCH_SIZE,
+        )
+
+        # у каждого пользователя около десятка чатов с "соседями".
+        Chat.objects.bulk_create(
+            [
+                Chat(
+                    user_1_id=user_id,
+                    user_2_id=user_ids[(index + shift) % user_count],
+                    last_message_datetime=now - timedelta(seconds=index),
+                )
+                for index, user_id in enumerate(user_ids)
+                for shift in range(1, 6)
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        chat_ids = list(Chat.objects.values_list("id", flat=True))
+        cls.chat = Chat.objects.get(pk=chat_ids[0])
+
+        Message.objects.bulk_create(
+            [
+                Message(
+                    author_id=user_ids[0],
+                    chat_id=rnd.choice(chat_ids),
+                    content="content",
+                    created_at=now - timedelta(seconds=i),
+                )
+                for i in range(ROWS)
+            ],
+            batch_size=BATCH_SIZE,
+        )
+
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def get_queryset(self, viewset_class, action, query_params=None):
+        request = Request(APIRequestFactory().get("/", query_params or {}))
+        request.user = self.user
+        view = viewset_class(action=action, request=request, format_kwarg=None, kwargs={})
+        return view.filter_queryset(view.get_queryset())
+
+    def assertSearchesIndex(self, queryset, table, index_name=None):
+        # SEARCH ... USING INDEX - выборка по индексу, а не полный просмотр таблицы.
+        plan = queryset.explain()
+        self.assertRegex(plan, rf"SEARCH {table} USING (COVERING )?INDEX")
+        if index_name:
+            self.assertIn(index_name, plan)
+        return plan
+
+    def assertNoSort(self, plan):
+        self.assertNotIn("USE TEMP B-TREE", plan)
+
+    def get_page_queryset(self, paginator, queryset, param):
+        # Выборка страницы после курсора на середине выборки, как ее строит paginate_queryset.
+        middle = queryset.order_by(*paginator.ordering)[queryset.count() // 2]
+        paginator.fields = [field.lstrip("-") for field in paginator.ordering]
+        request = Request(APIRequestFactory().get("/", {param: paginator.encode_cursor(middle)}))
+        return paginator.get_page_queryset(queryset, request)[:paginator.page_size + 1]
+
+    def assertKeysetRange(self, plan, index_name):
+        # Курсор - граница диапазона индекса (created_at<? / created_at>?), а не фильтр
+        # по всем строкам от начала индекса.
+        self.assertRegex(plan, rf"{index_name} \(\w+=\? AND created_at[<>]\?")
+
+    def test_chat_list(self):
+        # чаты, где пользователь первый и второй участник, выбираются каждые по своему индексу
+        # уже в нужном порядке.
+        merged = self.get_queryset(ChatViewSet, "list")
+        index_names = ["chat_user_1_last_message_idx", "chat_user_2_last_message_idx"]
+        for queryset, index_name in zip(merged.querysets, index_names):
+            plan = self.assertSearchesIndex(queryset[:11], "general_chat", index_name)
+            self.assertNoSort(plan)
+
+    def test_chat_messages(self):
+        queryset = self.chat.messages.order_by("-created_at", "-id")[:51]
+        plan = self.assertSearchesIndex(queryset, "general_message", "message_chat_created_idx")
+        self.assertNoSort(plan)
+
+    def test_chat_messages_cursor(self):
+        for param in ["before", "after"]:
+            queryset = self.get_page_queryset(MessageKeysetPagination(), self.chat.messages.all(), param)
+            plan = self.assertSearchesIndex(queryset, "general_message", "message_chat_created_idx")
+            self.assertKeysetRange(plan, "message_chat_created_idx")
+            self.assertNoSort(plan)
+
+    def test_sync_messages(self):
+        # сообщения для /api/sync/ ищутся по индексу в каждом чате пользователя после позиции,
+        # а не просмотром таблицы по первичному ключу.
+        chat_ids = list(
+            Chat.objects.filter(Q(user_1=self.user) | Q(user_2=self.user)).values_list("id", flat=True)
+        )
+        position = Message.objects.order_by("id")[Message.objects.count() // 2].pk
+        queryset = Message.objects.filter(chat_id__in=chat_ids, id__gt=position).order_by("id")
+        self.assertSearchesIndex(queryset[:101], "general_message", "message_chat_id_idx (chat_id=? AND id>?)")
+
+    def test_comments_filtered_by_post(self):
+        queryset = self.get_queryset(CommentsViewSet, "list", {"post__id": self.post.pk})
+        plan = self.assertSearchesIndex(queryset[:10], "general_comment")
+        self.assertNoSort(plan)
+
+    def test_post_comments(self):
+        # ветка комментариев поста: /api/posts/<id>/comments/.
+        queryset = Comment.objects.filter(post=self.post).order_by("-created_at", "-id")[:51]
+        plan = self.assertSearchesIndex(queryset, "general_comment", "comment_post_created_idx")
+        self.assertNoSort(plan)
+
+    def test_post_comments_cursor(self):
+        comments = Comment.objects.filter(post=self.post).select_related("author")
+        for param in ["before", "after"]:
+            queryset = self.get_page_queryset(CommentKeysetPagination(), comments, param)
+            plan = self.assertSearchesIndex(queryset, "general_comment", "comment_post_created_idx")
+            self.assertKeysetRange(plan, "comment_post_created_idx")
+            self.assertNoSort(plan)
+
+    def test_user_posts(self):
+        queryset = Post.objects.filter(author=self.user).with_body_preview().order_by("-id")
+        plan = self.assertSearchesIndex(queryset[:10], "general_post")
+        self.assertNoSort(plan)
+
+    def test_feed_direct_posts(self):
+        # неразосланные посты друзей читаются по частичному индексу отдельно для каждого друга,
+        # а не одной выборкой с сортировкой или просмотром всей таблицы постов.
+        friend_ids = list(
+            Post.objects.filter(fanned_out=False).values_list("author_id", flat=True).distinct()[:5]
+        )
+        self.user.add_friends(friend_ids)
+        before = Post.objects.order_by("-id")[Post.objects.count() // 2].pk
+
+        queries = get_direct_queries(self.user, before, 21)
+        self.assertTrue(queries)
+        for queryset in queries:
+            plan = self.assertSearchesIndex(queryset, "general_post", "post_author_direct_idx (author_id=? AND id<?)")
+            self.assertNoSort(plan)
+
+        authors = User.friends.through.objects.filter(
+            Exists(Post.objects.filter(author=OuterRef("to_user"), fanned_out=False, id__lt=before)),
+            from_user=self.user,
+        )
+        self.assertNotIn("SCAN general_post", authors.explain())
+
+    def test_post_list(self):
+        # лента идет по первичному ключу в обратном порядке, без сортировки.
+        queryset = self.get_queryset(PostViewSet, "list")
+        self.assertNoSort(queryset[:10].explain())
+
+    def test_user_list(self):
+        queryset = self.get_queryset(UserViewSet, "list")
+        self.assertNoSort(queryset[:10].explain())
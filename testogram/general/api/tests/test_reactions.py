@@ -30,6 +30,18 @@ class ReactionTestCase(APITestCase):
         self.assertEqual(reaction.post, self.post)
         self.assertEqual(reaction.value, data["value"])
 
+    def test_create_reaction_without_value(self):
+        ReactionFactory(author=self.user, post=self.post, value=Reaction.Values.SMILE)
+
+        # value необязателен: реакция без значения снимает текущую.
+        response = self.client.post(path=self.url, data={"post": self.post.id}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIsNone(response.data["value"])
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.smile_count, 0)
+        self.assertIsNone(Reaction.objects.get(author=self.user, post=self.post).value)
+
     def test_pass_other_reaction(self):
         reaction = ReactionFactory(
             author=self.user,
@@ -82,4 +94,88 @@ class ReactionTestCase(APITestCase):
         )
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
-        self.assertEqual(Reaction.objects.count(), 0)
\ No newline at end of file
+        self.assertEqual(Reaction.objects.count(), 0)
+
+    def test_reaction_counters(self):
+        data = {
+            "post": self.post.id,
+            "value": Reaction.Values.SMILE,
+        }
+        self.client.post(path=self.url, data=data, format="json")
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.smile_count, 1)
+
+        # смена реакции переносит ее из одного счетчика в другой.
+        data["value"] = Reaction.Values.HEART
+        self.client.post(path=self.url, data=data, format="json")
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.smile_count, 0)
+        self.assertEqual(self.post.heart_count, 1)
+
+        # повторная реакция снимается.
+        self.client.post(path=self.url, data=data, format="json")
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.heart_count, 0)
+        self.assertDictEqual(
+            self.post.reaction_counts,
+            {value: 0 for value in Reaction.Values.values},
+        )
+
+    def test_toggle_existing_reaction_without_reading_it(self):
+        # повторная отправка той же реакции (например, двойное нажатие)
+        # не должна падать на ограничении author_post_unique.
+        reaction = ReactionFactory(
+            author=self.user,
+            post=self.post,
+            value=Reaction.Values.SMILE,
+        )
+        result = Reaction.objects.toggle(self.user, self.post, Reaction.Values.SMILE)
+        self.assertEqual(result.pk, reaction.pk)
+        self.assertIsNone(result.value)
+
+        result = Reaction.objects.toggle(self.user, self.post, Reaction.Values.SMILE)
+        self.assertEqual(result.pk, reaction.pk)
+        self.assertEqual(result.value, Reaction.Values.SMILE)
+        self.assertEqual(Reaction.objects.count(), 1)
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.smile_count, 1)
+
+    def test_admin_delete_updates_reaction_counts(self):
+        reactions = [
+            ReactionFactory(post=self.post, value=Reaction.Values.SMILE),
+            ReactionFactory(post=self.post, value=Reaction.Values.HEART),
+            ReactionFactory(post=self.post, value=Reaction.Values.HEART),
+        ]
+        self.client.force_login(UserFactory(is_staff=True, is_superuser=True))
+
+        response = self.client.post(f"/admin/general/reaction/{reactions[0].pk}/delete/", {"post": "yes"})
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.smile_count, 0)
+        self.assertEqual(self.post.heart_count, 2)
+
+        response = self.client.post("/admin/general/reaction/", {
+            "action": "delete_selected",
+            "_selected_action": [reactions[1].pk],
+            "post": "yes",
+        })
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.heart_count, 1)
+
+    def test_deleted_user_reactions_leave_counts(self):
+        author = UserFactory()
+        ReactionFactory(author=author, post=self.post, value=Reaction.Values.SMILE)
+        ReactionFactory(post=self.post, value=Reaction.Values.SMILE)
+        other_post = PostFactory()
+        ReactionFactory(author=author, post=other_post, value=Reaction.Values.HEART)
+
+        author.delete()
+        self.post.refresh_from_db()
+        other_post.refresh_from_db()
+        self.assertEqual(self.post.smile_count, 1)
+        self.assertDictEqual(
+            other_post.reaction_counts,
+            {value: 0 for value in Reaction.Values.values},
+        )
@@ -0,0 +1,99 @@
+import asyncio
+import json
+
+from asgiref.sync import async_to_sync, sync_to_async
+from rest_framework.test import APITestCase
+from rest_framework import status
+from rest_framework_simplejwt.tokens import AccessToken
+
+from general.models import Message
+from general.factories import UserFactory, ChatFactory
+from general.realtime import get_broker
+from general.websocket import websocket_application
+
+
+class WebSocketClient:
+    """Минимальный клиент для вызова ASGI-приложения в тестах."""
+
+    def __init__(self, path, query_string=b""):
+        self.scope = {"type": "websocket", "path": path, "query_string": query_string, "headers": []}
+        self.incoming = asyncio.Queue()
+        self.outgoing = asyncio.Queue()
+
+    async def connect(self):
+        self.task = asyncio.ensure_future(
+            websocket_application(self.scope, self.incoming.get, self.outgoing.put)
+        )
+        await self.incoming.put({"type": "websocket.connect"})
+        return await self.receive()
+
+    async def receive(self):
+        return await asyncio.wait_for(self.outgoing.get(), timeout=1)
+
+    async def disconnect(self):
+        await self.incoming.put({"type": "websocket.disconnect", "code": 1000})
+        await asyncio.wait_for(self.task, timeout=1)
+
+
+class RealtimeTestCase(APITestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.companion = UserFactory()
+        self.chat = ChatFactory(user_1=self.user, user_2=self.companion)
+        self.client.force_authenticate(user=self.user)
+
+    def test_reject_without_token(self):
+        async def scenario():
+            client = WebSocketClient("/ws/messages/")
+            return await client.connect()
+
+        event = async_to_sync(scenario)()
+        self.assertEqual(event["type"], "websocket.close")
+
+    def test_reject_invalid_token(self):
+        async def scenario():
+            client = WebSocketClient("/ws/messages/", b"token=invalid")
+            return await client.connect()
+
+        event = async_to_sync(scenario)()
+        self.assertEqual(event["type"], "websocket.close")
+
+    def test_new_message_is_pushed_to_both_participants(self):
+        def send_message():
+            with self.captureOnCommitCallbacks(execute=True):
+                return self.client.post(
+                    "/api/messages/",
+                    data={"chat": self.chat.pk, "content": "Привет!"},
+                    format="json",
+                )
+
+        async def scenario():
+            clients = [
+                WebSocketClient("/ws/messages/", f"token={AccessToken.for_user(user)}".encode())
+                for user in (self.user, self.companion)
+            ]
+            for client in clients:
+                accepted = await client.connect()
+                self.assertEqual(accepted["type"], "websocket.accept")
+
+            response = await sync_to_async(send_message)()
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+            events = [await client.receive() for client in clients]
+            for client in clients:
+                await client.disconnect()
+            return events
+
+        events = async_to_sync(scenario)()
+
+        message = Message.objects.last()
+        for event in events:
+            self.assertEqual(event["type"], "websocket.send")
+            payload = json.loads(event["text"])
+            self.assertEqual(payload["type"], "message.created")
+            self.assertEqual(payload["message"]["id"], message.pk)
+            self.assertEqual(payload["message"]["chat"], self.chat.pk)
+            self.assertEqual(payload["message"]["content"], "Привет!")
+
+        # после отключения подписки удаляются.
+        self.assertEqual(get_broker()._subscriptions, {})
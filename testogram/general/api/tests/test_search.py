@@ -0,0 +1,80 @@
+from rest_framework.test import APITestCase
+from rest_framework import status
+
+from django.test import override_settings
+
+from general.models import Post, Comment
+from general.factories import UserFactory, PostFactory, CommentFactory
+
+
+class SearchTestCase(APITestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.client.force_authenticate(user=self.user)
+        self.url = "/api/search/"
+
+    def search_post_ids(self, query):
+        response = self.client.get(f"{self.url}posts/", {"q": query})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [post["id"] for post in response.data["results"]]
+
+    def test_search_posts_ranked(self):
+        in_body = PostFactory(title="Отпуск", body="Фотографии с моря и гор")
+        in_title = PostFactory(title="Море", body="Было тепло")
+        PostFactory(title="Работа", body="Новый проект")
+
+        # совпадение в заголовке весит больше, чем в тексте; поиск идет по началу слова.
+        self.assertEqual(self.search_post_ids("мор"), [in_title.pk, in_body.pk])
+        self.assertEqual(self.search_post_ids("море тепло"), [in_title.pk])
+
+    def test_search_posts_response_structure(self):
+        post = PostFactory(title="Поход в горы", body="Маршрут на выходные")
+        response = self.client.get(f"{self.url}posts/", {"q": "горы"})
+
+        self.assertIsNone(response.data["next"])
+        result = response.data["results"][0]
+        self.assertEqual(result["id"], post.pk)
+        self.assertEqual(result["title"], post.title)
+        self.assertEqual(result["body"], post.body)
+        self.assertEqual(result["my_reaction"], "")
+
+    def test_search_index_follows_updates_and_deletes(self):
+        post = PostFactory(author=self.user, title="Старый заголовок", body="текст")
+        self.client.patch(f"/api/posts/{post.pk}/", {"title": "Новый заголовок"}, format="json")
+        self.assertEqual(self.search_post_ids("старый"), [])
+        self.assertEqual(self.search_post_ids("новый"), [post.pk])
+
+        Post.objects.filter(pk=post.pk).update(title="Свежий заголовок")
+        self.assertEqual(self.search_post_ids("свежий"), [post.pk])
+
+        post.delete()
+        self.assertEqual(self.search_post_ids("свежий"), [])
+
+    @override_settings(SEARCH_PAGE_SIZE=2)
+    def test_search_posts_pagination(self):
+        posts = [PostFactory(title="Котики", body="текст") for _ in range(3)]
+
+        response = self.client.get(f"{self.url}posts/", {"q": "котики"})
+        self.assertEqual(len(response.data["results"]), 2)
+        self.assertIsNotNone(response.data["next"])
+
+        response = self.client.get(response.data["next"])
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertIsNone(response.data["next"])
+
+    def test_search_comments(self):
+        comment = CommentFactory(body="Отличная идея, поддерживаю")
+        CommentFactory(body="Не согласен")
+
+        response = self.client.get(f"{self.url}comments/", {"q": "идея"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item["id"] for item in response.data["results"]], [comment.pk])
+        self.assertEqual(response.data["results"][0]["author"]["id"], comment.author_id)
+
+        Comment.objects.filter(pk=comment.pk).delete()
+        response = self.client.get(f"{self.url}comments/", {"q": "идея"})
+        self.assertEqual(response.data["results"], [])
+
+    def test_search_without_query(self):
+        response = self.client.get(f"{self.url}posts/", {"q": " !!! "})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,82 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import Count
+from rest_framework.test import APITestCase
+
+from general.models import User, Post, Comment, Reaction, Chat, Message
+
+
+class SeedCommandTestCase(APITestCase):
+    options = {
+        "users": 60,
+        "friends": 6,
+        "posts": 2,
+        "comments": 3,
+        "reactions": 4,
+        "chats": 3,
+        "messages": 4,
+        "batch_size": 25,
+    }
+
+    def seed(self, **options):
+        call_command("seed", stdout=StringIO(), **{**self.options, **options})
+
+    def snapshot(self):
+        return {
+            "friends": sorted(
+                User.friends.through.objects.values_list("from_user__username", "to_user__username")
+            ),
+            "posts": sorted(Post.objects.values_list("author__username", "title", "created_at")),
+            "comments": sorted(Comment.objects.values_list("author__username", "post__title", "body")),
+            "reactions": sorted(Reaction.objects.values_list("author__username", "post__created_at", "value")),
+            "messages": sorted(
+                Message.objects.values_list("chat__user_1__username", "chat__user_2__username", "created_at")
+            ),
+        }
+
+    def test_seed_creates_consistent_data(self):
+        self.seed()
+
+        self.assertEqual(User.objects.filter(username__startswith="seed0_").count(), 60)
+        self.assertTrue(Post.objects.exists())
+        self.assertTrue(Comment.objects.exists())
+        self.assertTrue(Reaction.objects.exists())
+        self.assertTrue(Message.objects.exists())
+
+        # денормализованные счетчики совпадают с данными.
+        for user in User.objects.annotate(friends_number=Count("friends")):
+            self.assertEqual(user.friend_count, user.friends_number)
+        for post in Post.objects.annotate(comments_number=Count("comments")):
+            self.assertEqual(post.comment_count, post.comments_number)
+        for post in Post.objects.all():
+            counts = dict(post.reactions.values_list("value").annotate(count=Count("*")))
+            self.assertEqual(
+                post.reaction_counts,
+                {value: counts.get(value, 0) for value in post.reaction_counts},
+            )
+        for chat in Chat.objects.all():
+            last_message = chat.messages.order_by("-created_at", "-id").first()
+            self.assertEqual(chat.last_message_id, last_message and last_message.pk)
+
+    def test_seed_is_deterministic(self):
+        self.seed()
+        first = self.snapshot()
+
+        User.objects.all().delete()
+        self.seed()
+        self.assertEqual(self.snapshot(), first)
+
+    def test_other_seed_gives_other_data(self):
+        self.seed()
+        first = self.snapshot()
+
+        User.objects.all().delete()
+        self.seed(seed=1)
+        self.assertNotEqual(self.snapshot()["posts"], first["posts"])
+
+    def test_same_seed_twice(self):
+        self.seed()
+        with self.assertRaises(CommandError):
+            self.seed()
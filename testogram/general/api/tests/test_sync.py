@@ -0,0 +1,151 @@
+from rest_framework.test import APITestCase
+from rest_framework import status
+
+from general.models import User, Post, Comment, Chat, Message, Reaction, DeletedMessage
+from general.factories import ( UserFactory, PostFactory, CommentFactory, ChatFactory, MessageFactory, ReactionFactory)
+
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils import timezone
+
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+import time
+
+
+# Без окна позиция проходит все отданные записи; окно проверяется в test_recent_rows_are_resent.
+@override_settings(SYNC_SAFETY_WINDOW=0)
+class SyncTestCase(APITestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.client.force_authenticate(user=self.user)
+        self.url = "/api/sync/"
+
+    def test_initial_sync(self):
+        chat = ChatFactory(user_1=self.user)
+        message = MessageFactory(author=self.user, chat=chat)
+
+        # чужие чаты и сообщения.
+        MessageFactory.create_batch(3)
+
+        response = self.client.get(self.url, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item["id"] for item in response.data["chats"]], [chat.pk])
+        self.assertEqual([item["id"] for item in response.data["messages"]], [message.pk])
+        self.assertEqual(response.data["deleted_messages"], [])
+        self.assertFalse(response.data["has_more"])
+
+    def test_sync_since_token(self):
+        chat = ChatFactory(user_2=self.user)
+        old_message = MessageFactory(author=chat.user_1, chat=chat)
+
+        response = self.client.get(self.url, format="json")
+        token = response.data["next_token"]
+
+        # изменения после выдачи токена.
+        new_chat = ChatFactory(user_1=self.user)
+        new_message = MessageFactory(author=self.user, chat=new_chat)
+        response = self.client.delete(f"/api/messages/{new_message.pk}/", format="json")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        newest_message = MessageFactory(author=chat.user_1, chat=chat)
+
+        response = self.client.get(self.url, {"since": token}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item["id"] for item in response.data["chats"]], [new_chat.pk])
+        self.assertEqual([item["id"] for item in response.data["messages"]], [newest_message.pk])
+        self.assertEqual(response.data["deleted_messages"], [new_message.pk])
+
+        expected_message = {
+            "id": newest_message.pk,
+            "chat": chat.pk,
+            "author": chat.user_1.pk,
+            "content": newest_message.content,
+            "created_at": newest_message.created_at.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        self.assertDictEqual(response.data["messages"][0], expected_message)
+
+        # повторный запрос с новым токеном ничего не возвращает.
+        response = self.client.get(self.url, {"since": response.data["next_token"]}, format="json")
+        self.assertEqual(response.data["chats"], [])
+        self.assertEqual(response.data["messages"], [])
+        self.assertEqual(response.data["deleted_messages"], [])
+
+    @override_settings(SYNC_BATCH_SIZE=2)
+    def test_sync_in_batches(self):
+        chat = ChatFactory(user_1=self.user)
+        messages = MessageFactory.create_batch(5, author=self.user, chat=chat)
+
+        received = []
+        token = None
+        for _ in range(3):
+            params = {"since": token} if token else {}
+            response = self.client.get(self.url, params, format="json")
+            received += [item["id"] for item in response.data["messages"]]
+            token = response.data["next_token"]
+        self.assertFalse(response.data["has_more"])
+        self.assertEqual(received, [message.pk for message in messages])
+
+    def test_invalid_token(self):
+        response = self.client.get(self.url, {"since": "invalid"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(SYNC_SAFETY_WINDOW=30)
+    def test_recent_rows_are_resent(self):
+        chat = ChatFactory(user_1=self.user)
+        old_message = MessageFactory(author=self.user, chat=chat)
+        an_hour_ago = timezone.now() - timedelta(hours=1)
+        Chat.objects.filter(pk=chat.pk).update(created_at=an_hour_ago)
+        Message.objects.filter(pk=old_message.pk).update(created_at=an_hour_ago)
+
+        response = self.client.get(self.url, format="json")
+        token = response.data["next_token"]
+
+        # сообщение моложе окна отдается, но позиция его не проходит.
+        new_message = MessageFactory(id=old_message.pk + 10, author=self.user, chat=chat)
+        response = self.client.get(self.url, {"since": token}, format="json")
+        self.assertEqual([item["id"] for item in response.data["messages"]], [new_message.pk])
+        self.assertFalse(response.data["has_more"])
+
+        # строка с меньшим id, закоммиченная позже, тоже приходит.
+        late_message = MessageFactory(id=old_message.pk + 5, author=self.user, chat=chat)
+        response = self.client.get(self.url, {"since": response.data["next_token"]}, format="json")
+        self.assertEqual(
+            [item["id"] for item in response.data["messages"]],
+            [late_message.pk, new_message.pk],
+        )
+        self.assertEqual(response.data["chats"], [])
+
+    @override_settings(SYNC_DELETED_MESSAGES_RETENTION=30)
+    def test_expired_token(self):
+        token = self.client.get(self.url, format="json").data["next_token"]
+
+        # токен старше срока хранения удалений не принимается.
+        later = time.time() + timedelta(days=31).total_seconds()
+        with patch("time.time", return_value=later):
+            response = self.client.get(self.url, {"since": token}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_prune_deleted_messages(self):
+        chat = ChatFactory(user_1=self.user)
+        records = [DeletedMessage.objects.create(message_id=i, chat=chat) for i in range(4)]
+        DeletedMessage.objects.filter(pk__in=[record.pk for record in records[:3]]).update(
+            deleted_at=timezone.now() - timedelta(days=31),
+        )
+
+        # старые записи удаляются пачками до первой новой.
+        cutoff = timezone.now() - timedelta(days=30)
+        self.assertEqual(DeletedMessage.prune(cutoff, batch_size=2), 3)
+        self.assertEqual(list(DeletedMessage.objects.values_list("id", flat=True)), [records[3].pk])
+
+        call_command("prune_deleted_messages", days=0, stdout=StringIO())
+        self.assertFalse(DeletedMessage.objects.exists())
+
+    def test_sync_in_schema(self):
+        response = self.client.get("/api/schema/", HTTP_ACCEPT="application/vnd.oai.openapi+json")
+        operation = response.json()["paths"]["/api/sync/"]["get"]
+        self.assertEqual(
+            operation["responses"]["200"]["content"]["application/json"]["schema"],
+            {"$ref": "#/components/schemas/SyncResponse"},
+        )
+        self.assertEqual([parameter["name"] for parameter in operation["parameters"]], ["since"])
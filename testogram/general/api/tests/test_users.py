@@ -3,8 +3,11 @@ from rest_framework import status
 
 from general.models import User, Post, Comment, Chat, Message, Reaction
 from general.factories import ( UserFactory, PostFactory, CommentFactory, ChatFactory, MessageFactory)
+from general.friends import friend_sets
 
 from django.contrib.auth.hashers import check_password
+from django.db.models import Q
+from django.test import override_settings
 
 import json
 
@@ -14,16 +17,24 @@ class UserTestCase(APITestCase):
     затем запускается setUp, а затем очередной тестовый метод. И так с каждым методом.
     """
     def setUp(self):
+        # множества друзей кэшируются в памяти процесса, а id в тестовой БД повторяются.
+        friend_sets.clear()
         self.user = UserFactory()
         self.client.force_authenticate(user=self.user)
         self.url = "/api/users/"
 
+    @staticmethod
+    def body_preview(body):
+        return body[:125] + "..." if len(body) > 128 else body
+
     def test_user_list(self):
         UserFactory.create_batch(20)
         response = self.client.get(path=self.url, format="json")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data["results"]), 10)
-        self.assertEqual(response.data["count"], 21)
+        # количество берется только из статистики БД, которой в тестах нет.
+        self.assertIsNone(response.data["count"])
+        self.assertIsNotNone(response.data["next"])
 
     def test_user_list_response_structure(self):
         response = self.client.get(path=self.url, format="json")
@@ -45,6 +56,7 @@ class UserTestCase(APITestCase):
         self.user.friends.add(users[-1])
         self.user.save()
 
+        # статистика для приблизительного количества, запрос страницы и множество друзей текущего пользователя.
         with self.assertNumQueries(3):
             response = self.client.get(path=self.url, format="json")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -107,10 +119,13 @@ class UserTestCase(APITestCase):
         self.user.refresh_from_db()
         self.assertTrue(friend in self.user.friends.all())
 
+        friend.refresh_from_db()
+        self.assertEqual(self.user.friend_count, 1)
+        self.assertEqual(friend.friend_count, 1)
+
     def test_user_add_friend_request_whith_existent_friend(self):
         friend = UserFactory()
-        self.user.friends.add(friend)
-        self.user.save()
+        self.user.add_friend(friend)
 
         url = f"{self.url}{friend.pk}/add_friend/"
 
@@ -119,11 +134,11 @@ class UserTestCase(APITestCase):
 
         self.user.refresh_from_db()
         self.assertTrue(friend in self.user.friends.all())
+        self.assertEqual(self.user.friend_count, 1)
 
     def test_user_remove_friend(self):
         friend = UserFactory()
-        self.user.friends.add(friend)
-        self.user.save()
+        self.user.add_friend(friend)
 
         url = f"{self.url}{friend.pk}/remove_friend/"
 
@@ -132,6 +147,10 @@ class UserTestCase(APITestCase):
 
         self.user.refresh_from_db()
         self.assertFalse(friend in self.user.friends.all())
+
+        friend.refresh_from_db()
+        self.assertEqual(self.user.friend_count, 0)
+        self.assertEqual(friend.friend_count, 0)
     
     def test_user_add_friend_request_when_non_existent_friend(self):
         friend = UserFactory()
@@ -143,15 +162,157 @@ class UserTestCase(APITestCase):
 
         self.user.refresh_from_db()
         self.assertTrue(friend not in self.user.friends.all())
+        self.assertEqual(self.user.friend_count, 0)
+
+    def test_user_add_friends(self):
+        old_friend, *new_friends = UserFactory.create_batch(3)
+        self.user.add_friend(old_friend)
+        ids = [old_friend.pk] + [friend.pk for friend in new_friends] + [self.user.pk, 999]
+
+        response = self.client.post(
+            path=f"{self.url}add_friends/", data={"ids": ids}, format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        statuses = {item["id"]: item["status"] for item in response.data["results"]}
+        self.assertDictEqual(
+            statuses,
+            {
+                old_friend.pk: "already_friends",
+                new_friends[0].pk: "added",
+                new_friends[1].pk: "added",
+                self.user.pk: "self",
+                999: "user_not_found",
+            },
+        )
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.friend_count, 3)
+        self.assertEqual(set(self.user.friends.all()), {old_friend, *new_friends})
+        for friend in new_friends:
+            friend.refresh_from_db()
+            self.assertEqual(friend.friend_count, 1)
+            self.assertIn(self.user, friend.friends.all())
+
+    def test_user_remove_friends(self):
+        friend, other_friend, stranger = UserFactory.create_batch(3)
+        self.user.add_friend(friend)
+        self.user.add_friend(other_friend)
+
+        response = self.client.post(
+            path=f"{self.url}remove_friends/",
+            data={"ids": [friend.pk, stranger.pk]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data["results"],
+            [{"id": friend.pk, "status": "removed"}, {"id": stranger.pk, "status": "not_friends"}],
+        )
+
+        self.user.refresh_from_db()
+        friend.refresh_from_db()
+        self.assertEqual(list(self.user.friends.all()), [other_friend])
+        self.assertEqual(self.user.friend_count, 1)
+        self.assertEqual(friend.friend_count, 0)
+        self.assertFalse(friend.friends.exists())
+
+    def test_user_add_friends_empty_ids(self):
+        response = self.client.post(path=f"{self.url}add_friends/", data={"ids": []}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_add_friends_counts_only_inserted_rows(self):
+        # связь уже записал одновременный запрос: ее не вставляем и не считаем второй раз.
+        friend, other_friend = UserFactory.create_batch(2)
+        User.friends.through.objects.bulk_create([
+            User.friends.through(from_user=self.user, to_user=friend),
+            User.friends.through(from_user=friend, to_user=self.user),
+        ])
+
+        self.assertFalse(self.user.add_friend(friend))
+        statuses = self.user.add_friends([friend.pk, other_friend.pk])
+        self.assertDictEqual(
+            statuses,
+            {friend.pk: User.FRIEND_ALREADY_ADDED, other_friend.pk: User.FRIEND_ADDED},
+        )
+
+        self.user.refresh_from_db()
+        friend.refresh_from_db()
+        other_friend.refresh_from_db()
+        self.assertEqual(self.user.friend_count, 1)
+        self.assertEqual(friend.friend_count, 0)
+        self.assertEqual(other_friend.friend_count, 1)
+        self.assertEqual(User.friends.through.objects.count(), 4)
+
+    def test_remove_friend_twice(self):
+        friend = UserFactory()
+        self.user.add_friend(friend)
+
+        self.assertTrue(self.user.remove_friend(friend))
+        # повторное удаление (например, двойное нажатие) счетчики не меняет.
+        self.assertFalse(self.user.remove_friend(friend))
+
+        self.user.refresh_from_db()
+        friend.refresh_from_db()
+        self.assertEqual(self.user.friend_count, 0)
+        self.assertEqual(friend.friend_count, 0)
+
+    def test_deleted_user_is_removed_from_friend_counts(self):
+        friend, other_friend = UserFactory.create_batch(2)
+        self.user.add_friends([friend.pk, other_friend.pk])
+        friend.add_friend(other_friend)
+
+        friend.delete()
+
+        self.user.refresh_from_db()
+        other_friend.refresh_from_db()
+        self.assertEqual(self.user.friend_count, 1)
+        self.assertEqual(other_friend.friend_count, 1)
+        self.assertEqual(list(self.user.friends.all()), [other_friend])
+
+    def test_remove_friends_counts_only_deleted_rows(self):
+        friend, other_friend = UserFactory.create_batch(2)
+        self.user.add_friends([friend.pk, other_friend.pk])
+        # связь с friend уже удалил одновременный запрос (и уменьшил счетчики сам).
+        User.friends.through.objects.filter(
+            Q(from_user=self.user, to_user=friend) | Q(from_user=friend, to_user=self.user)
+        ).delete()
+
+        statuses = self.user.remove_friends([friend.pk, other_friend.pk])
+        self.assertDictEqual(
+            statuses,
+            {friend.pk: User.FRIEND_NOT_FOUND, other_friend.pk: User.FRIEND_REMOVED},
+        )
+
+        self.user.refresh_from_db()
+        friend.refresh_from_db()
+        other_friend.refresh_from_db()
+        self.assertEqual(self.user.friend_count, 1)
+        self.assertEqual(friend.friend_count, 1)
+        self.assertEqual(other_friend.friend_count, 0)
+        self.assertFalse(User.friends.through.objects.exists())
+
+    def test_friend_count_of_deferred_user(self):
+        # Так выглядит пользователь из CachedTokenUserAuthentication: friend_count не загружен
+        # и дочитывается из БД после UPDATE.
+        friend, other_friend = UserFactory.create_batch(2)
+        user = User.objects.only("id").get(pk=self.user.pk)
+        deferred_friend = User.objects.only("id").get(pk=friend.pk)
+
+        user.add_friend(deferred_friend)
+        self.assertEqual(user.friend_count, 1)
+        self.assertEqual(deferred_friend.friend_count, 1)
+
+        user = User.objects.only("id").get(pk=self.user.pk)
+        user.add_friends([other_friend.pk])
+        self.assertEqual(user.friend_count, 2)
 
 
     def test_retrieve_user(self):
         target_user = UserFactory()
 
         # friends
-        target_user.friends.add(self.user)
-        target_user.friends.add(UserFactory())
-        target_user.save()
+        target_user.add_friend(self.user)
+        target_user.add_friend(UserFactory())
 
         # posts
         post_1 = PostFactory(author=target_user, title="Post 1")
@@ -160,10 +321,12 @@ class UserTestCase(APITestCase):
         # other posts
         PostFactory.create_batch(10)
 
-        response = self.client.get(
-            path=f"{self.url}{target_user.pk}/",
-            format="json",
-        )
+        # пользователь, множество друзей текущего пользователя и публикации.
+        with self.assertNumQueries(3):
+            response = self.client.get(
+                path=f"{self.url}{target_user.pk}/",
+                format="json",
+            )
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
         expected_data = {
@@ -173,19 +336,20 @@ class UserTestCase(APITestCase):
             "email": target_user.email,
             "is_friend": True,
             "friend_count": 2,
+            # последние публикации идут от новых к старым, текст обрезается.
             "posts": [
-                {
-                    "id": post_1.pk,
-                    "title": post_1.title,
-                    "body": post_1.body,
-                    "created_at": post_1.created_at.strftime("%Y-%m-%dT%H:%M:%S"),
-                },
                 {
                     "id": post_2.pk,
                     "title": post_2.title,
-                    "body": post_2.body,
+                    "body": self.body_preview(post_2.body),
                     "created_at": post_2.created_at.strftime("%Y-%m-%dT%H:%M:%S"),
                 },
+                {
+                    "id": post_1.pk,
+                    "title": post_1.title,
+                    "body": self.body_preview(post_1.body),
+                    "created_at": post_1.created_at.strftime("%Y-%m-%dT%H:%M:%S"),
+                },
             ],
         }
         self.assertDictEqual(expected_data, response.data)
@@ -228,14 +392,54 @@ class UserTestCase(APITestCase):
         }
         self.assertDictEqual(response.data["results"][0], expected_data)
     
+    def test_get_user_friends_is_friend_field(self):
+        target_user = UserFactory()
+        common_friend = UserFactory()
+        other_friend = UserFactory()
+
+        target_user.friends.add(common_friend, other_friend)
+        self.user.friends.add(common_friend)
+
+        url = f"{self.url}{target_user.pk}/friends/"
+        # пользователь, количество, страница друзей и множество друзей текущего пользователя.
+        with self.assertNumQueries(4):
+            response = self.client.get(path=url, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        is_friend = {
+            friend["id"]: friend["is_friend"]
+            for friend in response.data["results"]
+        }
+        self.assertDictEqual(
+            is_friend,
+            {common_friend.pk: True, other_friend.pk: False},
+        )
+
+    def test_friend_set_is_cached_and_invalidated(self):
+        other_user = UserFactory()
+        self.client.get(path=self.url, format="json")
+
+        # множество друзей уже в кэше: только статистика и страница.
+        with self.assertNumQueries(2):
+            response = self.client.get(path=self.url, format="json")
+        self.assertFalse(response.data["results"][0]["is_friend"])
+
+        # add_friend сбрасывает кэш обоих пользователей.
+        self.user.add_friend(other_user)
+        response = self.client.get(path=self.url, format="json")
+        self.assertTrue(response.data["results"][0]["is_friend"])
+
+        other_user.remove_friend(self.user)
+        response = self.client.get(path=self.url, format="json")
+        self.assertFalse(response.data["results"][0]["is_friend"])
+
     def test_me(self):
         target_user = UserFactory()
         self.client.force_authenticate(user=target_user)
 
         # friends
-        target_user.friends.add(self.user)
-        target_user.friends.add(UserFactory())
-        target_user.save()
+        target_user.add_friend(self.user)
+        target_user.add_friend(UserFactory())
 
         # posts
         post_1 = PostFactory(author=target_user, title="Post 1")
@@ -244,10 +448,11 @@ class UserTestCase(APITestCase):
         # other posts
         PostFactory.create_batch(10)
 
-        response = self.client.get(
-            path=f"{self.url}me/",
-            format="json",
-        )
+        with self.assertNumQueries(3):
+            response = self.client.get(
+                path=f"{self.url}me/",
+                format="json",
+            )
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
         expected_data = {
@@ -257,19 +462,58 @@ class UserTestCase(APITestCase):
             "email": target_user.email,
             "is_friend": False,
             "friend_count": 2,
+            # последние публикации идут от новых к старым, текст обрезается.
             "posts": [
-                {
-                    "id": post_1.pk,
-                    "title": post_1.title,
-                    "body": post_1.body,
-                    "created_at": post_1.created_at.strftime("%Y-%m-%dT%H:%M:%S"),
-                },
                 {
                     "id": post_2.pk,
                     "title": post_2.title,
-                    "body": post_2.body,
+                    "body": self.body_preview(post_2.body),
                     "created_at": post_2.created_at.strftime("%Y-%m-%dT%H:%M:%S"),
                 },
+                {
+                    "id": post_1.pk,
+                    "title": post_1.title,
+                    "body": self.body_preview(post_1.body),
+                    "created_at": post_1.created_at.strftime("%Y-%m-%dT%H:%M:%S"),
+                },
             ],
         }
-        self.assertDictEqual(expected_data, response.data)
\ No newline at end of file
+        self.assertDictEqual(expected_data, response.data)
+
+    @override_settings(PROFILE_RECENT_POSTS_LIMIT=2)
+    def test_retrieve_user_recent_posts_limit(self):
+        target_user = UserFactory()
+        posts = PostFactory.create_batch(5, author=target_user, body="a" * 300)
+
+        response = self.client.get(
+            path=f"{self.url}{target_user.pk}/",
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [post["id"] for post in response.data["posts"]],
+            [posts[4].pk, posts[3].pk],
+        )
+        self.assertEqual(response.data["posts"][0]["body"], "a" * 125 + "...")
+
+    def test_get_user_posts(self):
+        target_user = UserFactory()
+        posts = PostFactory.create_batch(12, author=target_user)
+
+        # other posts
+        PostFactory.create_batch(3)
+
+        url = f"{self.url}{target_user.pk}/posts/"
+        response = self.client.get(path=url, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 12)
+        self.assertEqual(len(response.data["results"]), 10)
+
+        post = posts[-1]
+        expected_data = {
+            "id": post.pk,
+            "title": post.title,
+            "body": self.body_preview(post.body),
+            "created_at": post.created_at.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        self.assertDictEqual(response.data["results"][0], expected_data)
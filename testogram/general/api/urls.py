@@ -1,7 +1,7 @@
 from rest_framework.routers import SimpleRouter
 
 from general.api.views import ( UserViewSet, PostViewSet, CommentsViewSet, ReactionViewSet, ChatViewSet,
-                               MessageViewSet
+                               MessageViewSet, SyncViewSet, FeedViewSet, SearchViewSet
                                
                                )
 
@@ -17,6 +17,9 @@ router.register(r'reaction', ReactionViewSet, basename="reaction")
 router.register(r'users', UserViewSet, basename="users")
 router.register(r'chats', ChatViewSet, basename="chats")
 router.register(r'messages', MessageViewSet, basename="messages")
+router.register(r'sync', SyncViewSet, basename="sync")
+router.register(r'feed', FeedViewSet, basename="feed")
+router.register(r'search', SearchViewSet, basename="search")
 
 
 urlpatterns = router.urls
\ No newline at end of file
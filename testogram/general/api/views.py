@@ -1,15 +1,29 @@
 from rest_framework.viewsets import GenericViewSet, ModelViewSet
-from rest_framework.permissions import IsAuthenticated, AllowAny
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
+from rest_framework.exceptions import ValidationError, NotFound
 from rest_framework.decorators import action
 from rest_framework.response import Response
-
-
-from general.models import User, Post, Comment, Chat, Message
+from rest_framework.pagination import PageNumberPagination
+from rest_framework import status
+from rest_framework.utils.urls import replace_query_param
+
+
+from general.models import User, Post, Comment, Reaction, Chat, Message, DeletedMessage
+from general.api.cache import post_cache
+from general.authentication import revoke_tokens
+from general.api.mixins import AuthorScopedMixin
+from general.api.pagination import ( MessageKeysetPagination, CommentKeysetPagination, CountFreePagination,
+                                     ApproximateCountPagination
+                                     )
+from general.realtime import publish_message
+from general.feed import fan_out_post, get_feed_page
+from general.search import SEARCH_INDEXES, get_terms
+from general.export import iter_user_export
 from general.api.serializers import ( UserRegistrationSerializer, UserListSerializer, UserRetrieveSerializer,
                                      PostCreateUpdateSerializer, PostListSerializer, PostRetrieveSerializer,
-                                     CommentSerializer, ReactionSerializer, ChatSerializer, MessageListSerializer,
-                                     ChatListSerializer, MessageSerializer
+                                     CommentSerializer, CommentReadSerializer, ReactionSerializer, ChatSerializer, MessageListSerializer,
+                                     ChatListSerializer, MessageSerializer, NestedPostListSerializer,
+                                     SyncResponseSerializer, FriendIdsSerializer, MessageBatchSerializer
 
                                       )
 
@@ -19,7 +33,15 @@ from rest_framework.mixins import ( CreateModelMixin, ListModelMixin, RetrieveMo
                                     )
 
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import F, Case, When, CharField, Value, Q, OuterRef, Subquery
+from drf_spectacular.utils import OpenApiParameter, extend_schema
+from django.db import transaction
+from django.conf import settings
+from django.core import signing
+from django.http import StreamingHttpResponse
+from django.db.models import F, Case, When, CharField, Value, Q
+from django.utils import timezone
+
+from datetime import timedelta
 
 
 # На уровне View определяется логика обработки HTTP запросов и возвращения ответов.
@@ -36,6 +58,8 @@ class UserViewSet(
     """
 
     queryset = User.objects.all().order_by('-id')
+    # Список всех пользователей листается без COUNT(*), количество - приблизительное.
+    pagination_class = ApproximateCountPagination
 
     def get_permissions(self):
         if self.action == 'create':
@@ -51,25 +75,53 @@ class UserViewSet(
                     return super().get_permissions() """
     
     def get_queryset(self):
-        queryset = User.objects.all().prefetch_related(
-            "friends", ).order_by("-id")
-        return queryset
+        # Признак is_friend сериализаторы берут из закэшированного множества друзей
+        # текущего пользователя (general/friends.py), а не из таблицы связей.
+        return User.objects.all().order_by("-id")
 
     def get_serializer_class(self):
         if self.action == 'create':
             return UserRegistrationSerializer
         if self.action in ["retrieve", "me"]:
             return UserRetrieveSerializer
+        if self.action == "posts":
+            return NestedPostListSerializer
+        if self.action in ["add_friends", "remove_friends"]:
+            return FriendIdsSerializer
         return UserListSerializer
     
     @action(detail=False, methods=['get'], url_path='me')
     def me(self, request):
-        instance = self.request.user 
         # мы берем пользователя из запроса. А он там есть, потому что для выполнения этого запроса пользователь положит в хедер свой токен.
+        # Сам объект перечитываем, чтобы friend_count был актуальным.
+        instance = self.get_queryset().get(pk=self.request.user.pk)
         serializer = self.get_serializer(instance)
         return Response(serializer.data)
     
-    @action(detail=True, methods=["get"])
+    @action(detail=False, methods=["post"])
+    def revoke_tokens(self, request):
+        """
+        Выход на всех устройствах: POST "api/users/revoke_tokens/".
+        Все выданные до этого момента access- и refresh-токены пользователя перестают приниматься.
+        """
+        revoke_tokens(request.user.pk)
+        return Response("Tokens revoked")
+
+    @action(detail=False, methods=["get"])
+    def export(self, request):
+        """
+        Выгрузка всех данных текущего пользователя: GET "api/users/export/".
+        Ответ в формате NDJSON отдается потоком по мере чтения из БД, см. general/export.py.
+        """
+        response = StreamingHttpResponse(
+            iter_user_export(request.user.pk),
+            content_type="application/x-ndjson; charset=utf-8",
+        )
+        response["Content-Disposition"] = f'attachment; filename="user-{request.user.pk}.ndjson"'
+        return response
+
+    # Списки одного пользователя небольшие и фильтруются по индексу, для них оставляем точный count.
+    @action(detail=True, methods=["get"], pagination_class=PageNumberPagination)
     def friends(self, request, pk=None):
         user = self.get_object()
         queryset = self.filter_queryset(
@@ -83,10 +135,56 @@ class UserViewSet(
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
     
+    @action(detail=True, methods=["get"], pagination_class=PageNumberPagination)
+    def posts(self, request, pk=None):
+        """
+        Полный список публикаций пользователя с пагинацией: GET "api/users/<user_id>/posts/".
+        В профиле (retrieve, me) отдаются только последние публикации.
+        """
+        user = self.get_object()
+        queryset = Post.objects.filter(
+            author=user,
+        ).with_body_preview().order_by("-id")
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
+
+    @action(detail=False, methods=["post"])
+    def add_friends(self, request):
+        """
+        Массовое добавление друзей: POST "api/users/add_friends/" с телом {"ids": [...]}.
+        В ответе статус для каждого id, см. User.add_friends.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        statuses = request.user.add_friends(serializer.validated_data["ids"])
+        return Response(self.format_statuses(statuses))
+
+    @action(detail=False, methods=["post"])
+    def remove_friends(self, request):
+        """Массовое удаление друзей: POST "api/users/remove_friends/" с телом {"ids": [...]}."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        statuses = request.user.remove_friends(serializer.validated_data["ids"])
+        return Response(self.format_statuses(statuses))
+
+    @staticmethod
+    def format_statuses(statuses):
+        return {
+            "results": [
+                {"id": user_id, "status": user_status}
+                for user_id, user_status in sorted(statuses.items())
+            ]
+        }
+
     @action(detail=True, methods=["post"])
     def add_friend(self, request, pk=None):
         user = self.get_object()
-        request.user.friends.add(user)
+        request.user.add_friend(user)
         return Response('Friend added')
 
     @action(detail=True, methods=["post"])
@@ -96,34 +194,180 @@ class UserViewSet(
         Будут выполняться запросы POST "api/users/<user_id>/add_friend/" и POST "api/users/<user_id>/remove_friend".
         """
         user = self.get_object()
-        request.user.friends.remove(user)
+        request.user.remove_friend(user)
         return Response("Friend removed")
     
 
-class PostViewSet(ModelViewSet):
-    queryset = Post.objects.all().order_by("-id")
+class PostViewSet(AuthorScopedMixin, ModelViewSet):
     permission_classes = [IsAuthenticated]
+    pagination_class = ApproximateCountPagination
+    not_author_message = "Вы не являетесь автором этого поста."
+
+    def get_queryset(self):
+        # Автор нужен в каждом ответе, поэтому забираем его тем же запросом.
+        queryset = Post.objects.select_related("author").order_by("-id")
+        if self.action in ["list", "retrieve"]:
+            queryset = queryset.with_my_reaction(self.request.user)
+        if self.action == "list":
+            # В ленте текст обрезается в БД, полный body не передается в приложение.
+            queryset = queryset.with_body_preview()
+        return queryset
 
     def get_serializer_class(self):
         if self.action == "list":
             return PostListSerializer
         elif self.action == "retrieve":
             return PostRetrieveSerializer
+        elif self.action == "comments":
+            return CommentReadSerializer
         return PostCreateUpdateSerializer
     
-    def perform_update(self, serializer):
-        instance = self.get_object()
+    def list(self, request, *args, **kwargs):
+        # Страница списка (id постов) и представления постов берутся из кэша,
+        # из БД одним запросом читаются только отсутствующие в кэше посты и LIVE_FIELDS.
+        page_key = self.get_page_cache_key(request)
+        if page_key is None:
+            return super().list(request, *args, **kwargs)
+
+        paginator = self.paginator
+        page = post_cache.get_page(page_key)
+        if page is None:
+            response = super().list(request, *args, **kwargs)
+            post_cache.set_page(
+                page_key,
+                {
+                    "ids": [post["id"] for post in response.data["results"]],
+                    "count": paginator.count,
+                    "has_next": paginator.has_next,
+                },
+                response.data["results"],
+            )
+            return response
+
+        # Ссылки next/previous строятся заново от адреса текущего запроса.
+        paginator.request = request
+        paginator.page_number = page_key[0]
+        paginator.count = page["count"]
+        paginator.has_next = page["has_next"]
+        return paginator.get_paginated_response(self.get_cached_posts("list", page["ids"]))
+
+    def get_page_cache_key(self, request):
+        # Страница определяется только номером и размером: остальные параметры запроса на выдачу
+        # не влияют, и произвольная строка запроса не создает новую запись в кэше.
+        if not post_cache.enabled:
+            return None
+        paginator = self.paginator
+        try:
+            page_number = int(request.query_params.get(paginator.page_query_param, 1))
+        except ValueError:
+            return None
+        if page_number < 1:
+            return None
+        return page_number, paginator.get_page_size(request)
+
+    def retrieve(self, request, *args, **kwargs):
+        if not post_cache.enabled:
+            return super().retrieve(request, *args, **kwargs)
+        try:
+            post_id = int(self.kwargs["pk"])
+        except ValueError:
+            raise NotFound()
+
+        cached = post_cache.get_many("retrieve", [post_id])
+        if post_id not in cached:
+            response = super().retrieve(request, *args, **kwargs)
+            post_cache.set_many("retrieve", {post_id: response.data})
+            return response
+        posts = self.add_live_fields([cached[post_id]])
+        if not posts:
+            raise NotFound()
+        return Response(posts[0])
+
+    def get_cached_posts(self, kind, post_ids):
+        posts = post_cache.get_many(kind, post_ids)
+        missing = [post_id for post_id in post_ids if post_id not in posts]
+        if missing:
+            queryset = self.get_queryset().filter(id__in=missing)
+            serializer = self.get_serializer(queryset, many=True)
+            loaded = {post["id"]: post for post in serializer.data}
+            post_cache.set_many(kind, loaded)
+            posts.update(loaded)
+        # Удаленный пост мог остаться в закэшированной странице, такие id пропускаем.
+        return self.add_live_fields([posts[post_id] for post_id in post_ids if post_id in posts])
+
+    def add_live_fields(self, posts):
+        # my_reaction зависит от пользователя, а счетчики меняются при каждой реакции
+        # и комментарии, поэтому они не кэшируются и дочитываются одним запросом.
+        count_fields = {value: Post.reaction_count_field(value) for value in Reaction.Values.values}
+        rows = {
+            row["id"]: row
+            for row in Post.objects.filter(
+                id__in=[post["id"] for post in posts],
+            ).with_my_reaction(self.request.user).values(
+                "id", "my_reaction", "comment_count", *count_fields.values(),
+            )
+        }
+        return [
+            {
+                **post,
+                "my_reaction": rows[post["id"]]["my_reaction"] or "",
+                "reaction_counts": {
+                    value: rows[post["id"]][field] for value, field in count_fields.items()
+                },
+                "comment_count": rows[post["id"]]["comment_count"],
+            }
+            for post in posts
+            if post["id"] in rows
+        ]
+
+    @action(detail=True, methods=["get"])
+    def comments(self, request, pk=None):
+        """
+        Комментарии поста от новых к старым: GET /api/posts/<id>/comments/.
+        Страницы по ключу (?before= / ?after=, см. KeysetPagination), поэтому глубокие страницы
+        длинных обсуждений стоят столько же, сколько первая. Запрос идет по индексу
+        Comment(post, created_at, id), авторы выбираются тем же запросом.
+        """
+        try:
+            post_id = int(pk)
+        except ValueError:
+            raise NotFound()
+
+        queryset = Comment.objects.filter(post_id=post_id).select_related("author")
+        paginator = CommentKeysetPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        # Существование поста проверяем отдельным запросом, только если комментариев нет.
+        if not page and not Post.objects.filter(pk=post_id).exists():
+            raise NotFound()
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=["get"], permission_classes=[IsAdminUser])
+    def cache_stats(self, request):
+        # Счетчики попаданий и промахов кэша постов (в пределах процесса).
+        return Response(post_cache.stats())
+
+    def perform_create(self, serializer):
+        post = serializer.save()
+        post_cache.invalidate_list()
+        # Рассылаем пост в ленты друзей автора.
+        fan_out_post(post)
 
-        if instance.author != self.request.user:
-            raise PermissionDenied("Вы не являетесь автором этого поста.")
-        serializer.save()
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        post_cache.invalidate(serializer.instance.pk)
     
-    def perform_destroy(self, instance):
-        if instance.author != self.request.user:
-            raise PermissionDenied("Вы не являетесь автором этого поста.")
-        instance.delete()
+    def perform_author_destroy(self, queryset):
+        # У поста есть комментарии, реакции и записи лент, поэтому удаляем через delete(),
+        # который удаляет и их. Условие author_id остается в выборке удаляемых постов.
+        deleted, _ = queryset.delete()
+        if deleted:
+            post_cache.invalidate(int(self.kwargs["pk"]))
+            post_cache.invalidate_list()
+        return deleted
 
 class CommentsViewSet(
+    AuthorScopedMixin,
     CreateModelMixin,
     DestroyModelMixin,
     ListModelMixin,
@@ -132,17 +376,26 @@ class CommentsViewSet(
     """
     Если нам нужно получить все комментарии, то можем выполнить запрос GET /api/comments/.
     Если же у нас есть ID поста (допустим id=100), то мы можем выполнить запрос GET /api/comments/?post__id=100 и получить все комментарии к этому посту.
+    Для длинных обсуждений удобнее GET /api/posts/100/comments/ - там страницы листаются по ключу.
     """
-    queryset = Comment.objects.all().order_by("-id")
+    queryset = Comment.objects.select_related("author").order_by("-id")
     permission_classes = [IsAuthenticated]
-    serializer_class = CommentSerializer
+    pagination_class = CountFreePagination
+    not_author_message = "Вы не являетесь автором этого комментария."
     filter_backends = [DjangoFilterBackend] #стандартный бэкенд для фильтров. Он нужен для того, чтобы в эндпоинт включить стандартную фильтрацию
     filterset_fields = ["post__id"] # в поле filterset_fields мы можем указать, по какому параметру мы можем фильтровать список комментариев
 
-    def perform_destroy(self, instance):
-        if instance.author != self.request.user:
-            raise PermissionDenied("Вы не являетесь автором этого комментария.")
-        instance.delete()
+    def get_serializer_class(self):
+        if self.action == "list":
+            return CommentReadSerializer
+        return CommentSerializer
+
+    def perform_author_destroy(self, queryset):
+        with transaction.atomic():
+            comments = queryset.delete_returning()
+            for comment in comments:
+                Post.change_comment_count(comment.post_id, -1)
+        return comments
 
 
 class ReactionViewSet(
@@ -169,6 +422,7 @@ class ChatViewSet(
     GenericViewSet,
 ):
     permission_classes = [IsAuthenticated]
+    pagination_class = CountFreePagination
 
     def get_serializer_class(self):
         if self.action == "list":
@@ -179,48 +433,278 @@ class ChatViewSet(
     
     def get_queryset(self):
         user = self.request.user
-
-        last_message_subquery = Message.objects.filter(
-            chat=OuterRef('pk')
-        ).order_by('-created_at').values('created_at')[:1]
-        last_message_content_subquery = Message.objects.filter(
-            chat=OuterRef('pk')
-        ).order_by('-created_at').values('content')[:1]
-
-        qs = Chat.objects.filter(
-            Q(user_1=user) | Q(user_2=user),
-            messages__isnull=False,
-        ).annotate(
-            last_message_datetime=Subquery(last_message_subquery),
-            last_message_content=Subquery(last_message_content_subquery),
-        ).select_related(
+        qs = Chat.objects.select_related(
             "user_1",
             "user_2",
-        ).order_by("-last_message_datetime").distinct()
-        return qs
+        )
+        if self.action == "list":
+            # Данные о последнем сообщении хранятся в самом чате, поэтому список
+            # сортируется по индексам без подзапросов и DISTINCT (см. ChatQuerySet.inbox).
+            return qs.inbox(user)
+        return qs.filter(
+            Q(user_1=user) | Q(user_2=user),
+            last_message_datetime__isnull=False,
+        )
     
     @action(detail=True, methods=["get"])
     def messages(self, request, pk=None):
-        messages = self.get_object().messages.filter(chat__id=pk).annotate(
+        """
+        История сообщений отдается страницами по ключу (created_at, id):
+        GET /api/chats/<id>/messages/?before=<курсор> - более старые сообщения,
+        GET /api/chats/<id>/messages/?after=<курсор> - более новые.
+        """
+        messages = self.get_object().messages.annotate(
             message_author=Case(
                 When(author=self.request.user, then=Value("Вы")),
                 default=F("author__first_name"),
                 output_field=CharField(),
             )
-        ).order_by("-created_at")
-        serializer = self.get_serializer(messages, many=True)
-        return Response(serializer.data)
+        )
+        paginator = MessageKeysetPagination()
+        page = paginator.paginate_queryset(messages, request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
 class MessageViewSet(
+    AuthorScopedMixin,
     CreateModelMixin,
     DestroyModelMixin,
     GenericViewSet,
 ):
-    serializer_class = MessageSerializer
+    not_author_message = "Вы не являетесь автором этого сообщения."
     permission_classes = [IsAuthenticated]
     queryset = Message.objects.all().order_by("-id")
 
-    def perform_destroy(self, instance):
-        if instance.author != self.request.user:
-            raise PermissionDenied("Вы не являетесь автором этого сообщения.")
-        instance.delete()
\ No newline at end of file
+    def perform_create(self, serializer):
+        message = serializer.save()
+        chat = serializer.validated_data["chat"]
+        # Участники чата получат сообщение по WebSocket только после коммита.
+        transaction.on_commit(lambda: publish_message(message, chat))
+
+    def get_serializer_class(self):
+        if self.action == "batch":
+            return MessageBatchSerializer
+        return MessageSerializer
+
+    @action(detail=False, methods=["post"])
+    def batch(self, request):
+        """
+        Отправка нескольких сообщений одним запросом: {"messages": [{"chat": id, "content": "..."}, ...]}.
+        В ответе id и время создания сообщений в том же порядке.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        messages = serializer.save()
+        chats = serializer.validated_data["chats"]
+
+        def publish():
+            for message in messages:
+                publish_message(message, chats[message.chat_id])
+
+        transaction.on_commit(publish)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def perform_author_destroy(self, queryset):
+        with transaction.atomic():
+            messages = queryset.delete_returning()
+            for message in messages:
+                # Запоминаем удаление, чтобы клиенты узнали о нем при синхронизации.
+                DeletedMessage.objects.create(message_id=message.pk, chat_id=message.chat_id)
+                Chat.message_deleted(message)
+        return messages
+
+
+class SyncViewSet(GenericViewSet):
+    """
+    Инкрементальная синхронизация чатов и сообщений: GET /api/sync/?since=<token>.
+
+    В ответе только то, что изменилось с момента выдачи токена: новые чаты, новые сообщения
+    и id удаленных сообщений. Каждый вид данных ограничен SYNC_BATCH_SIZE записями за запрос.
+    Клиент сохраняет next_token и, пока has_more равен True, сразу запрашивает следующую порцию.
+    Без параметра since синхронизация начинается с самого начала.
+
+    id выдаются при вставке, а видны другим запросам после коммита, поэтому строка с меньшим id
+    может появиться позже строки с большим (PostgreSQL). Чтобы такие строки не пропускались,
+    позиция в токене не проходит записи моложе SYNC_SAFETY_WINDOW секунд: они отдаются,
+    но придут и в следующем ответе. Клиент объединяет записи по id.
+    """
+    permission_classes = [IsAuthenticated]
+    serializer_class = SyncResponseSerializer
+    # Порции задает токен since, постраничная выдача не используется.
+    pagination_class = None
+    token_salt = "general.sync"
+
+    def encode_token(self, position):
+        return signing.dumps(position, salt=self.token_salt, compress=True)
+
+    def decode_token(self, token):
+        # Записи об удаленных сообщениях хранятся ограниченное время, поэтому и токен тоже.
+        max_age = timedelta(days=settings.SYNC_DELETED_MESSAGES_RETENTION)
+        try:
+            position = signing.loads(token, salt=self.token_salt, max_age=max_age)
+            return {key: int(position.get(key, 0)) for key in ("chat", "message", "deleted")}
+        except signing.SignatureExpired:
+            raise ValidationError({"since": "Токен синхронизации устарел, начните синхронизацию заново."})
+        except (signing.BadSignature, AttributeError, TypeError, ValueError):
+            raise ValidationError({"since": "Некорректный токен синхронизации."})
+
+    @staticmethod
+    def settled_position(items, position, cutoff):
+        """
+        Позиция после последней записи items (пары (id, время создания)), до которой все записи
+        созданы не позже cutoff. Более новые записи еще отдаются, но позиция их не проходит.
+        """
+        for pk, created_at in items:
+            if created_at > cutoff:
+                break
+            position = pk
+        return position
+
+    @extend_schema(parameters=[
+        OpenApiParameter("since", str, description="next_token из предыдущего ответа"),
+    ])
+    def list(self, request):
+        user = request.user
+        batch_size = settings.SYNC_BATCH_SIZE
+        since = request.query_params.get("since")
+        position = self.decode_token(since) if since else {"chat": 0, "message": 0, "deleted": 0}
+        # Отсчет окна берется до выборок: строка, которая закоммитится после них, создана позже.
+        cutoff = timezone.now() - timedelta(seconds=settings.SYNC_SAFETY_WINDOW)
+
+        # Все три выборки идут по возрастанию id и строятся от списка id чатов пользователя:
+        # сообщения и удаления ищутся по индексам (chat_id, id) в каждом чате, без соединения
+        # с таблицей чатов и без просмотра всей таблицы сообщений по первичному ключу.
+        chat_ids = sorted(
+            Chat.objects.filter(Q(user_1=user) | Q(user_2=user)).values_list("id", flat=True)
+        )
+        new_chat_ids = [chat_id for chat_id in chat_ids if chat_id > position["chat"]][:batch_size + 1]
+        chats = list(
+            Chat.objects.filter(id__in=new_chat_ids).select_related("user_1", "user_2").order_by("id")
+        ) if new_chat_ids else []
+        messages = list(
+            Message.objects.filter(
+                chat_id__in=chat_ids,
+                id__gt=position["message"],
+            ).order_by("id")[:batch_size + 1]
+        )
+        deleted_messages = list(
+            DeletedMessage.objects.filter(
+                chat_id__in=chat_ids,
+                id__gt=position["deleted"],
+            ).order_by("id").values_list("id", "message_id", "deleted_at")[:batch_size + 1]
+        )
+
+        has_more = False
+        for key, items in (
+            ("chat", [(chat.pk, chat.created_at) for chat in chats]),
+            ("message", [(message.pk, message.created_at) for message in messages]),
+            ("deleted", [(pk, deleted_at) for pk, _, deleted_at in deleted_messages]),
+        ):
+            position[key] = self.settled_position(items[:batch_size], position[key], cutoff)
+            # Следующую порцию отдаем сразу, только если позиция дошла до конца текущей.
+            if len(items) > batch_size and position[key] == items[batch_size - 1][0]:
+                has_more = True
+        chats = chats[:batch_size]
+        messages = messages[:batch_size]
+        deleted_messages = deleted_messages[:batch_size]
+
+        serializer = self.get_serializer({
+            "chats": chats,
+            "messages": messages,
+            "deleted_messages": [message_id for _, message_id, _ in deleted_messages],
+            "next_token": self.encode_token(position),
+            "has_more": has_more,
+        })
+        return Response(serializer.data)
+
+
+class FeedViewSet(GenericViewSet):
+    """
+    Лента публикаций друзей: GET /api/feed/, следующая страница - GET /api/feed/?before=<post_id>.
+    Посты приходят от новых к старым, постраничная выдача идет по ключу (id поста).
+    """
+    permission_classes = [IsAuthenticated]
+    serializer_class = PostListSerializer
+
+    def list(self, request):
+        before = request.query_params.get("before")
+        if before is not None:
+            try:
+                before = int(before)
+            except ValueError:
+                raise ValidationError({"before": "Ожидается id поста."})
+
+        post_ids, has_more = get_feed_page(request.user, before)
+        posts = Post.objects.filter(
+            id__in=post_ids,
+        ).select_related(
+            "author",
+        ).with_my_reaction(request.user).with_body_preview().order_by("-id")
+        serializer = self.get_serializer(posts, many=True)
+
+        next_link = None
+        if has_more:
+            next_link = replace_query_param(request.build_absolute_uri(), "before", post_ids[-1])
+        return Response({
+            "next": next_link,
+            "results": serializer.data,
+        })
+
+
+class SearchViewSet(GenericViewSet):
+    """
+    Полнотекстовый поиск: GET /api/search/posts/?q=<запрос> и GET /api/search/comments/?q=<запрос>.
+    Результаты отсортированы по релевантности, следующая страница - по ссылке next (?page=<номер>).
+    Индексы описаны в general/search.py.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get_serializer_class(self):
+        if self.action == "comments":
+            return CommentReadSerializer
+        return PostListSerializer
+
+    def search(self, kind):
+        query = self.request.query_params.get("q", "")
+        if not get_terms(query):
+            raise ValidationError({"q": "Введите поисковый запрос."})
+        try:
+            page = int(self.request.query_params.get("page", 1))
+        except ValueError:
+            page = 0
+        if page < 1:
+            raise ValidationError({"page": "Ожидается номер страницы."})
+
+        page_size = settings.SEARCH_PAGE_SIZE
+        ids = SEARCH_INDEXES[kind].search(query, limit=page_size + 1, offset=(page - 1) * page_size)
+
+        next_link = None
+        if len(ids) > page_size:
+            next_link = replace_query_param(self.request.build_absolute_uri(), "page", page + 1)
+        return ids[:page_size], next_link
+
+    def get_search_response(self, ids, objects, next_link):
+        # Объекты выбираются по id одним запросом, порядок релевантности восстанавливаем по списку id.
+        objects = objects.in_bulk(ids)
+        serializer = self.get_serializer(
+            [objects[pk] for pk in ids if pk in objects],
+            many=True,
+        )
+        return Response({
+            "next": next_link,
+            "results": serializer.data,
+        })
+
+    @action(detail=False, methods=["get"])
+    def posts(self, request):
+        ids, next_link = self.search("post")
+        posts = Post.objects.select_related(
+            "author",
+        ).with_my_reaction(request.user).with_body_preview()
+        return self.get_search_response(ids, posts, next_link)
+
+    @action(detail=False, methods=["get"])
+    def comments(self, request):
+        ids, next_link = self.search("comment")
+        comments = Comment.objects.select_related("author")
+        return self.get_search_response(ids, comments, next_link)
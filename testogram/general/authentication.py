@@ -0,0 +1,100 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from drf_spectacular.contrib.rest_framework_simplejwt import SimpleJWTScheme
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+
+from general.models import User
+
+
+# Аутентификация по JWT без запроса пользователя к БД на каждом вызове API.
+#
+# Стандартный JWTAuthentication загружает строку User перед каждым запросом. Здесь request.user
+# собирается из id пользователя в подписанном токене и нескольких полей (USER_STATE_FIELDS),
+# которые берутся из кэша на AUTH_USER_CACHE_TIMEOUT секунд. Это обычный объект User, у которого
+# остальные поля отложены (deferred): сравнение с другими пользователями, фильтры вида author=user
+# и присваивание в ForeignKey работают без запросов. Если коду нужно другое поле (например,
+# friend_count в add_friend), Django дочитает его из БД при первом обращении.
+#
+# Деактивация пользователя вступает в силу не позже чем через AUTH_USER_CACHE_TIMEOUT секунд.
+# revoke_tokens() записывает в User.tokens_revoked_at время отзыва: access- и refresh-токены,
+# выданные до него, больше не принимаются. Время отзыва входит в кэшируемое состояние, поэтому
+# в процессе, где вызван revoke_tokens (и везде при общем кэше), отзыв действует сразу, а при
+# кэше в памяти других процессов — не позже чем через AUTH_USER_CACHE_TIMEOUT секунд.
+
+USER_STATE_FIELDS = ("id", "username", "is_active", "is_staff", "is_superuser", "tokens_revoked_at")
+
+
+def _state_key(user_id):
+    return f"auth:user:{user_id}"
+
+
+def _get_state(user_id):
+    state = cache.get(_state_key(user_id))
+    if state is None:
+        # Несуществующий пользователь кэшируется как пустой словарь.
+        state = User.objects.filter(pk=user_id).values(*USER_STATE_FIELDS).first() or {}
+        cache.set(_state_key(user_id), state, timeout=settings.AUTH_USER_CACHE_TIMEOUT)
+    return state
+
+
+def _check_not_revoked(token, state):
+    revoked_at = state.get("tokens_revoked_at")
+    # iat хранится с точностью до секунды, поэтому токены, выданные в ту же секунду, что и отзыв,
+    # тоже отклоняются.
+    if revoked_at is not None and token.get("iat", 0) <= revoked_at.timestamp():
+        raise AuthenticationFailed("Токен отозван.", code="token_revoked")
+
+
+def revoke_tokens(user_id):
+    User.objects.filter(pk=user_id).update(tokens_revoked_at=timezone.now())
+    cache.delete(_state_key(user_id))
+
+
+class RevocableTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Обновление access-токена, которое не принимает refresh-токены, отозванные revoke_tokens().
+    """
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs["refresh"])
+        state = _get_state(refresh.get(api_settings.USER_ID_CLAIM))
+        if not state:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        _check_not_revoked(refresh, state)
+        return super().validate(attrs)
+
+
+class CachedTokenUserAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        state = _get_state(user_id)
+        if not state:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        _check_not_revoked(validated_token, state)
+        if not state["is_active"]:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        # from_db ожидает значения в порядке полей модели.
+        fields = [
+            field.attname
+            for field in User._meta.concrete_fields
+            if field.attname in USER_STATE_FIELDS
+        ]
+        return User.from_db(User.objects.db, fields, [state[field] for field in fields])
+
+
+class CachedTokenUserScheme(SimpleJWTScheme):
+    """
+    Описание CachedTokenUserAuthentication в схеме OpenAPI: токены те же, что у JWTAuthentication.
+    """
+
+    target_class = "general.authentication.CachedTokenUserAuthentication"
@@ -0,0 +1,71 @@
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Q
+
+from general.models import User, Post, Comment, Reaction, Chat, Message
+
+
+# Выгрузка всех данных пользователя (GET /api/users/export/, команда export_user_data).
+#
+# Формат - NDJSON: по одному JSON-объекту на строку, тип записи в поле "type"
+# (user, friend, post, comment, reaction, chat, message). Строки отдаются генератором
+# по мере чтения из БД, поэтому выгрузка целиком не собирается ни в памяти, ни в ответе.
+#
+# Каждая выборка читается через .values(...).iterator(chunk_size=EXPORT_CHUNK_SIZE):
+# объекты моделей не создаются, а QuerySet не кэширует прочитанные строки. На PostgreSQL
+# iterator() использует серверный курсор, на SQLite - построчное чтение (fetchmany).
+# Сообщения выбираются по одному чату за раз, по индексу Message(chat, created_at, id).
+
+USER_FIELDS = ("id", "username", "first_name", "last_name", "email", "date_joined", "last_login")
+
+
+def _dumps(record_type, values):
+    return json.dumps({"type": record_type, **values}, cls=DjangoJSONEncoder, ensure_ascii=False) + "\n"
+
+
+def _iter_records(record_type, queryset):
+    for values in queryset.iterator(chunk_size=settings.EXPORT_CHUNK_SIZE):
+        yield _dumps(record_type, values)
+
+
+def iter_user_export(user_id):
+    """Генератор строк NDJSON со всеми данными пользователя."""
+    yield _dumps("user", User.objects.filter(pk=user_id).values(*USER_FIELDS).get())
+
+    yield from _iter_records(
+        "friend",
+        User.friends.through.objects.filter(
+            from_user_id=user_id,
+        ).order_by("to_user_id").values(user_id=F("to_user_id")),
+    )
+    yield from _iter_records(
+        "post",
+        Post.objects.filter(author_id=user_id).order_by("id").values("id", "title", "body", "created_at"),
+    )
+    yield from _iter_records(
+        "comment",
+        Comment.objects.filter(author_id=user_id).order_by("id").values("id", "post_id", "body", "created_at"),
+    )
+    yield from _iter_records(
+        "reaction",
+        Reaction.objects.filter(author_id=user_id).order_by("id").values("id", "post_id", "value"),
+    )
+
+    # Чатов у пользователя немного, их id держим в памяти, а сообщения читаем по чату.
+    chats = Chat.objects.filter(
+        Q(user_1_id=user_id) | Q(user_2_id=user_id),
+    ).order_by("id").values("id", "user_1_id", "user_2_id")
+    chat_ids = []
+    for chat in chats.iterator(chunk_size=settings.EXPORT_CHUNK_SIZE):
+        chat_ids.append(chat["id"])
+        yield _dumps("chat", chat)
+
+    for chat_id in chat_ids:
+        yield from _iter_records(
+            "message",
+            Message.objects.filter(
+                chat_id=chat_id,
+            ).order_by("created_at", "id").values("id", "chat_id", "author_id", "content", "created_at"),
+        )
@@ -33,6 +33,13 @@ class CommentFactory(DjangoModelFactory):
     author = factory.SubFactory(UserFactory)
     post = factory.SubFactory(PostFactory)
 
+    @classmethod
+    def _create(cls, model_class, *args, **kwargs):
+        # Поддерживаем счетчик комментариев поста так же, как это делает API.
+        comment = super()._create(model_class, *args, **kwargs)
+        Post.change_comment_count(comment.post_id, 1)
+        return comment
+
 class ReactionFactory(DjangoModelFactory):
     class Meta:
         model = Reaction
@@ -41,6 +48,13 @@ class ReactionFactory(DjangoModelFactory):
     author = factory.SubFactory(UserFactory)
     post = factory.SubFactory(PostFactory)
 
+    @classmethod
+    def _create(cls, model_class, *args, **kwargs):
+        # Поддерживаем счетчики реакций поста так же, как это делает API.
+        reaction = super()._create(model_class, *args, **kwargs)
+        Post.change_reaction_counts(reaction.post_id, None, reaction.value)
+        return reaction
+
 
 class ChatFactory(DjangoModelFactory):
     class Meta:
@@ -59,3 +73,10 @@ class MessageFactory(DjangoModelFactory):
     chat = factory.LazyAttribute(lambda obj: ChatFactory(user_1=obj.author))
     # LazyAttribute. Он позволяет определить сложную логику для полей при создании экземпляра класса.
     # В нашем случае он для создания чата в качестве user_1 передает автора сообщения.
+
+    @classmethod
+    def _create(cls, model_class, *args, **kwargs):
+        # Как и при отправке через API, обновляем данные о последнем сообщении чата.
+        message = super()._create(model_class, *args, **kwargs)
+        message.chat.set_last_message(message)
+        return message
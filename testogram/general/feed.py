@@ -0,0 +1,94 @@
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Exists, OuterRef
+
+from general.models import User, Post, TimelineEntry
+
+
+# Лента друзей строится по модели fan-out on write: при публикации пост записывается
+# в ленту (TimelineEntry) каждого друга автора, а чтение ленты - это выборка по индексу
+# (owner, post_id). Если у автора больше FEED_FANOUT_LIMIT друзей, рассылка стоила бы слишком
+# дорого, поэтому такие посты не рассылаются, а подмешиваются в ленту при чтении (fan-out on read).
+# Разослан ли пост, записано в самом посте (Post.fanned_out), а не выводится из текущего
+# количества друзей автора: иначе при переходе автора через порог его посты пропадали бы
+# из лент или приходили дважды. При удалении из друзей записи чистит User.remove_friend.
+
+# Ограничение SQLite на количество частей составного SELECT - 500.
+UNION_ALL_MAX_PARTS = 400
+
+
+def is_high_degree(user):
+    return user.friend_count > settings.FEED_FANOUT_LIMIT
+
+
+def fan_out_post(post):
+    """Записывает новый пост в ленты друзей автора и отмечает его разосланным."""
+    if is_high_degree(post.author):
+        return
+    with transaction.atomic():
+        # Друзья читаются из таблицы связей, а не из кэша friend_sets: записи лент постоянные,
+        # и устаревшее множество оставило бы пост у бывшего друга или не доставило новому.
+        friend_ids = User.friends.through.objects.filter(
+            from_user_id=post.author_id,
+        ).values_list("to_user_id", flat=True)
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(owner_id=friend_id, post=post) for friend_id in friend_ids],
+            batch_size=1000,
+        )
+        Post.objects.filter(pk=post.pk).update(fanned_out=True)
+    post.fanned_out = True
+
+
+def get_feed_page(user, before=None, page_size=None):
+    """
+    Возвращает страницу ленты: список id постов (от новых к старым) и признак следующей страницы.
+    before - id поста, после которого (в сторону старых) начинается страница.
+    Каждая выборка ограничена размером страницы, поэтому стоимость не зависит от глубины.
+    """
+    page_size = page_size or settings.FEED_PAGE_SIZE
+
+    timeline = TimelineEntry.objects.filter(owner=user)
+    if before is not None:
+        timeline = timeline.filter(post_id__lt=before)
+    post_ids = set(timeline.order_by("-post_id").values_list("post_id", flat=True)[:page_size + 1])
+
+    post_ids.update(_union_all(get_direct_queries(user, before, page_size + 1)))
+
+    post_ids = sorted(post_ids, reverse=True)
+    return post_ids[:page_size], len(post_ids) > page_size
+
+
+def get_direct_queries(user, before, limit):
+    """
+    Выборки неразосланных постов друзей: по одной на каждого друга, у которого такие посты есть,
+    не больше limit постов, по индексу post_author_direct_idx (author_id = ? AND id < ?).
+    Общая выборка по всем друзьям (author IN ... ORDER BY id DESC) шла бы по всей таблице постов.
+    """
+    unfanned = Post.objects.filter(fanned_out=False)
+    if before is not None:
+        unfanned = unfanned.filter(id__lt=before)
+    # Для каждого друга - одна проверка по тому же индексу.
+    author_ids = User.friends.through.objects.filter(
+        Exists(unfanned.filter(author=OuterRef("to_user"))),
+        from_user=user,
+    ).values_list("to_user_id", flat=True)
+    return [
+        unfanned.filter(author_id=author_id).order_by("-id").values_list("id", flat=True)[:limit]
+        for author_id in author_ids
+    ]
+
+
+def _union_all(querysets):
+    # Django не поддерживает LIMIT в частях union() на SQLite, поэтому выборки объединяются
+    # в UNION ALL вручную, каждая как подзапрос во FROM.
+    ids = []
+    for start in range(0, len(querysets), UNION_ALL_MAX_PARTS):
+        parts, params = [], []
+        for number, queryset in enumerate(querysets[start:start + UNION_ALL_MAX_PARTS]):
+            part_sql, part_params = queryset.query.get_compiler(queryset.db).as_sql()
+            parts.append(f"SELECT * FROM ({part_sql}) part_{number}")
+            params.extend(part_params)
+        with connections[querysets[start].db].cursor() as cursor:
+            cursor.execute(" UNION ALL ".join(parts), params)
+            ids.extend(row[0] for row in cursor.fetchall())
+    return ids
@@ -0,0 +1,103 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+# Множества id друзей пользователей для проверок, где небольшое отставание допустимо (признак
+# is_friend в ответах /api/users/), читаются из таблицы связей один раз и кэшируются.
+# Постоянные записи (рассылка постов по лентам, general/feed.py) читают таблицу связей напрямую.
+#
+# Первый уровень - LRU-кэш в памяти процесса с ограниченным временем жизни записей
+# (FRIEND_CACHE_MAX_SIZE, FRIEND_CACHE_TIMEOUT). Второй, необязательный уровень - общий кэш Django
+# (FRIEND_CACHE_ALIAS), через который множества разделяются между процессами.
+# User.add_friend/remove_friend сбрасывают множества обоих пользователей. Кэш в памяти других
+# процессов при этом не сбрасывается и может отставать не дольше FRIEND_CACHE_TIMEOUT секунд.
+
+
+class FriendSetCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = OrderedDict()
+
+    @property
+    def shared(self):
+        if settings.FRIEND_CACHE_ALIAS is None:
+            return None
+        return caches[settings.FRIEND_CACHE_ALIAS]
+
+    def _shared_key(self, user_id):
+        return f"friends:{user_id}"
+
+    def _get_local(self, user_id):
+        with self._lock:
+            item = self._local.get(user_id)
+            if item is None:
+                return None
+            friend_ids, expires_at = item
+            if expires_at < time.monotonic():
+                del self._local[user_id]
+                return None
+            self._local.move_to_end(user_id)
+            return friend_ids
+
+    def _set_local(self, user_id, friend_ids):
+        with self._lock:
+            self._local[user_id] = (friend_ids, time.monotonic() + settings.FRIEND_CACHE_TIMEOUT)
+            self._local.move_to_end(user_id)
+            while len(self._local) > settings.FRIEND_CACHE_MAX_SIZE:
+                self._local.popitem(last=False)
+
+    def get(self, user_id):
+        """Возвращает frozenset id друзей пользователя."""
+        friend_ids = self._get_local(user_id)
+        if friend_ids is not None:
+            return friend_ids
+
+        shared = self.shared
+        if shared is not None:
+            friend_ids = shared.get(self._shared_key(user_id))
+        if friend_ids is None:
+            from general.models import User
+
+            friend_ids = frozenset(
+                User.friends.through.objects.filter(
+                    from_user_id=user_id,
+                ).values_list("to_user_id", flat=True)
+            )
+            if shared is not None:
+                shared.set(self._shared_key(user_id), friend_ids, timeout=settings.FRIEND_CACHE_TIMEOUT)
+        self._set_local(user_id, friend_ids)
+        return friend_ids
+
+    def _delete(self, user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._local.pop(user_id, None)
+        shared = self.shared
+        if shared is not None:
+            shared.delete_many([self._shared_key(user_id) for user_id in user_ids])
+
+    def invalidate(self, *user_ids):
+        # Повторный сброс после коммита не дает запросу, прочитавшему связи до коммита,
+        # оставить в кэше устаревшее множество.
+        self._delete(user_ids)
+        transaction.on_commit(lambda: self._delete(user_ids))
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+
+
+friend_sets = FriendSetCache()
+
+
+def get_friend_ids(user_id):
+    return friend_sets.get(user_id)
+
+
+def are_friends(user_id, other_id):
+    return other_id in friend_sets.get(user_id)
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from general.export import iter_user_export
+from general.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Выгружает все данные пользователя в формате NDJSON (как GET /api/users/export/). "
+        "Пользователь задается id или username, без --output выгрузка пишется в stdout."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("user", help="id или username пользователя")
+        parser.add_argument("-o", "--output", help="файл для выгрузки")
+
+    def handle(self, *args, **options):
+        user = options["user"]
+        lookup = {"pk": int(user)} if user.isdigit() else {"username": user}
+        user_id = User.objects.filter(**lookup).values_list("id", flat=True).first()
+        if user_id is None:
+            raise CommandError(f"Пользователь {user} не найден.")
+
+        if options["output"] is None:
+            for line in iter_user_export(user_id):
+                self.stdout.write(line, ending="")
+            return
+
+        lines = 0
+        with open(options["output"], "w", encoding="utf-8") as output:
+            for line in iter_user_export(user_id):
+                output.write(line)
+                lines += 1
+        self.stdout.write(self.style.SUCCESS(f"Записано строк: {lines} ({options['output']})."))
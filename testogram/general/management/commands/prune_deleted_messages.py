@@ -0,0 +1,26 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from general.models import DeletedMessage
+
+
+class Command(BaseCommand):
+    help = (
+        "Удаляет записи об удаленных сообщениях старше SYNC_DELETED_MESSAGES_RETENTION дней. "
+        "Запускается по расписанию (например, раз в сутки)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=settings.SYNC_DELETED_MESSAGES_RETENTION,
+            help="срок хранения записей в днях",
+        )
+
+    def handle(self, *args, **options):
+        pruned = DeletedMessage.prune(timezone.now() - timedelta(days=options["days"]))
+        self.stdout.write(self.style.SUCCESS(f"Удалено записей: {pruned}."))
@@ -0,0 +1,116 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, connections
+from django.db.models import Max
+
+from general.api.cache import post_cache
+from general.models import User, Post
+from general.seed import SeedPlan
+
+
+# План набора данных для процессов-исполнителей. Процессы создаются через fork
+# и получают его копию, поэтому массивы плана не передаются в каждую задачу.
+_plan = None
+
+
+def _run_chunk(phase, chunk):
+    return _plan.run(phase, chunk)
+
+
+class Command(BaseCommand):
+    help = (
+        "Создает большой набор данных для нагрузочного тестования: пользователей, друзей, посты, "
+        "комментарии, реакции, чаты и сообщения (см. general/seed.py). Количества задаются "
+        "в среднем на пользователя, с теми же --seed и --batch-size получаются те же данные."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000, help="количество пользователей")
+        parser.add_argument("--friends", type=float, default=20, help="друзей на пользователя в среднем")
+        parser.add_argument("--posts", type=float, default=5, help="постов на пользователя в среднем")
+        parser.add_argument("--comments", type=float, default=10, help="комментариев на пользователя в среднем")
+        parser.add_argument("--reactions", type=float, default=20, help="реакций на пользователя в среднем")
+        parser.add_argument("--chats", type=float, default=5, help="чатов на пользователя в среднем")
+        parser.add_argument("--messages", type=float, default=20, help="сообщений в чате в среднем")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--batch-size", type=int, default=5000,
+            help="пользователей в одном блоке и строк в одном INSERT",
+        )
+        parser.add_argument(
+            "--workers", type=int, default=1,
+            help="количество процессов (только для PostgreSQL, на SQLite пишет один процесс)",
+        )
+        parser.add_argument(
+            "--until", type=datetime.fromisoformat, default=datetime(2025, 1, 1),
+            help="дата, к которой относятся самые новые записи (ISO 8601, UTC)",
+        )
+        parser.add_argument("--days", type=int, default=365, help="за сколько дней созданы записи")
+
+    def handle(self, *args, **options):
+        global _plan
+
+        if options["users"] < 1 or options["batch_size"] < 1:
+            raise CommandError("--users и --batch-size должны быть больше нуля.")
+        if User.objects.filter(username=f"seed{options['seed']}_0").exists():
+            raise CommandError(f"Данные с --seed {options['seed']} уже созданы, укажите другой --seed.")
+
+        workers = options["workers"]
+        if workers > 1 and connection.vendor == "sqlite":
+            # В SQLite одновременно пишет только одно соединение.
+            self.stdout.write("SQLite не поддерживает параллельную запись, используется один процесс.")
+            workers = 1
+        if workers > 1 and "fork" not in multiprocessing.get_all_start_methods():
+            raise CommandError("Параллельная генерация требует запуска процессов через fork.")
+
+        until = options["until"]
+        if until.tzinfo is None:
+            until = until.replace(tzinfo=timezone.utc)
+        _plan = SeedPlan(
+            users=options["users"],
+            friends=options["friends"],
+            posts=options["posts"],
+            comments=options["comments"],
+            reactions=options["reactions"],
+            chats=options["chats"],
+            messages=options["messages"],
+            seed=options["seed"],
+            batch_size=options["batch_size"],
+            until=until,
+            days=options["days"],
+            user_base=(User.objects.aggregate(id=Max("id"))["id"] or 0) + 1,
+            post_base=(Post.objects.aggregate(id=Max("id"))["id"] or 0) + 1,
+        )
+
+        if workers > 1:
+            # Дочерние процессы открывают свои соединения. Унаследованное соединение
+            # закрываем до fork, иначе процессы будут работать через один сокет.
+            connections.close_all()
+            executor = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("fork"))
+        else:
+            executor = None
+
+        try:
+            for phase in SeedPlan.PHASES:
+                started = time.monotonic()
+                chunks = range(_plan.chunk_count)
+                if executor is None:
+                    rows = sum(_run_chunk(phase, chunk) for chunk in chunks)
+                else:
+                    rows = sum(executor.map(_run_chunk, [phase] * len(chunks), chunks))
+                self.stdout.write(f"{phase}: {rows} ({time.monotonic() - started:.1f} с)")
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        # id пользователей и постов заданы явно, поэтому сдвигаем последовательности (PostgreSQL).
+        with connection.cursor() as cursor:
+            for statement in connection.ops.sequence_reset_sql(no_style(), [User, Post]):
+                cursor.execute(statement)
+        post_cache.invalidate_list()
+        self.stdout.write(self.style.SUCCESS("Готово."))
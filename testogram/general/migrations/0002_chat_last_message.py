@@ -0,0 +1,59 @@
+# Generated by Django 4.0 on 2026-10-16 22:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_last_message(apps, schema_editor):
+    Chat = apps.get_model("general", "Chat")
+    Message = apps.get_model("general", "Message")
+    for chat in Chat.objects.iterator():
+        message = Message.objects.filter(chat=chat).order_by("-created_at", "-id").first()
+        if message is None:
+            continue
+        chat.last_message = message
+        chat.last_message_content = message.content[:255]
+        chat.last_message_author_id = message.author_id
+        chat.last_message_datetime = message.created_at
+        chat.save(update_fields=[
+            "last_message", "last_message_content", "last_message_author", "last_message_datetime",
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('general', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chat',
+            name='last_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='general.message'),
+        ),
+        migrations.AddField(
+            model_name='chat',
+            name='last_message_author',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='general.user'),
+        ),
+        migrations.AddField(
+            model_name='chat',
+            name='last_message_content',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='chat',
+            name='last_message_datetime',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='chat',
+            index=models.Index(fields=['user_1', '-last_message_datetime'], name='chat_user_1_last_message_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chat',
+            index=models.Index(fields=['user_2', '-last_message_datetime'], name='chat_user_2_last_message_idx'),
+        ),
+        migrations.RunPython(fill_last_message, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.0 on 2026-10-16 22:31
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_friend_count(apps, schema_editor):
+    User = apps.get_model("general", "User")
+    counts = User.friends.through.objects.values("from_user").annotate(count=Count("id"))
+    for row in counts.iterator():
+        User.objects.filter(pk=row["from_user"]).update(friend_count=row["count"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('general', '0003_message_chat_created_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='friend_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_friend_count, migrations.RunPython.noop),
+    ]
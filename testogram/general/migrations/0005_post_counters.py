@@ -0,0 +1,68 @@
+# Generated by Django 4.0 on 2026-10-16 22:32
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+REACTION_VALUES = ("smile", "thumb_up", "laugh", "sad", "heart")
+
+
+def fill_post_counters(apps, schema_editor):
+    Post = apps.get_model("general", "Post")
+    Comment = apps.get_model("general", "Comment")
+    Reaction = apps.get_model("general", "Reaction")
+
+    def count_subquery(queryset):
+        counts = queryset.order_by().values("post").annotate(count=Count("id")).values("count")
+        return Coalesce(Subquery(counts), Value(0))
+
+    counters = {
+        "comment_count": count_subquery(Comment.objects.filter(post=OuterRef("pk"))),
+    }
+    for value in REACTION_VALUES:
+        counters[f"{value}_count"] = count_subquery(
+            Reaction.objects.filter(post=OuterRef("pk"), value=value)
+        )
+    Post.objects.update(**counters)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('general', '0004_user_friend_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='heart_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='laugh_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='sad_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='smile_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='thumb_up_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_post_counters, migrations.RunPython.noop),
+    ]
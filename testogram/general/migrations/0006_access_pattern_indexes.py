@@ -0,0 +1,47 @@
+# Generated by Django 4.0 on 2026-10-16 22:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('general', '0005_post_counters'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='chat',
+            name='user_1',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='chats_as_user1', to='general.user'),
+        ),
+        migrations.AlterField(
+            model_name='chat',
+            name='user_2',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='chats_as_user2', to='general.user'),
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='post',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='comments', to='general.post'),
+        ),
+        migrations.AlterField(
+            model_name='message',
+            name='chat',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='general.chat'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='author',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='posts', to='general.user'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', '-id'], name='comment_post_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', '-id'], name='post_author_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.0 on 2026-10-16 22:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('general', '0006_access_pattern_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeletedMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('message_id', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+                ('chat', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deleted_messages', to='general.chat')),
+            ],
+        ),
+    ]
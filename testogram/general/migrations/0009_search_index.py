@@ -0,0 +1,24 @@
+from django.db import migrations
+
+from general.search import SEARCH_INDEXES
+
+
+def install_search_indexes(apps, schema_editor):
+    for index in SEARCH_INDEXES.values():
+        index.install(schema_editor.connection)
+
+
+def uninstall_search_indexes(apps, schema_editor):
+    for index in SEARCH_INDEXES.values():
+        index.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('general', '0008_timeline_entry'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search_indexes, uninstall_search_indexes),
+    ]
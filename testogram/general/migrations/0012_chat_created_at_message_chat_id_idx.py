@@ -0,0 +1,24 @@
+# Generated by Django 4.0 on 2026-10-16 23:40
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('general', '0011_user_tokens_revoked_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chat',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['chat', 'id'], name='message_chat_id_idx'),
+        ),
+    ]
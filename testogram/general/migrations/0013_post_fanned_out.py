@@ -0,0 +1,44 @@
+# Generated by Django 4.0 on 2026-10-16 23:22
+
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef
+
+from general.search import SEARCH_INDEXES
+
+
+def fill_fanned_out(apps, schema_editor):
+    # Разосланными считаем посты, у которых есть записи в лентах. Остальные будут читаться
+    # напрямую, как посты авторов с большим количеством друзей.
+    Post = apps.get_model("general", "Post")
+    TimelineEntry = apps.get_model("general", "TimelineEntry")
+    Post.objects.filter(
+        Exists(TimelineEntry.objects.filter(post=OuterRef("pk"))),
+    ).update(fanned_out=True)
+
+
+def install_post_search_index(apps, schema_editor):
+    # На SQLite AddField и RemoveField пересоздают general_post вместе с триггерами поиска.
+    SEARCH_INDEXES["post"].install(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('general', '0012_chat_created_at_message_chat_id_idx'),
+    ]
+
+    operations = [
+        # При откате выполняется последней, после удаления поля.
+        migrations.RunPython(migrations.RunPython.noop, install_post_search_index),
+        migrations.AddField(
+            model_name='post',
+            name='fanned_out',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('fanned_out', False)), fields=['author', '-id'], name='post_author_direct_idx'),
+        ),
+        migrations.RunPython(fill_fanned_out, migrations.RunPython.noop),
+        migrations.RunPython(install_post_search_index, migrations.RunPython.noop),
+    ]
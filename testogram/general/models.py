@@ -1,6 +1,12 @@
-from django.db import models
+import heapq
+from itertools import islice, takewhile
+from operator import attrgetter
+
+from django.db import connections, models, transaction
 from django.contrib.auth.models import AbstractUser
-from django.db.models import UniqueConstraint, F, functions
+from django.db.models import UniqueConstraint, F, OuterRef, Subquery, functions, sql
+
+from general.friends import friend_sets
 
 
 class User(AbstractUser):
@@ -9,17 +15,355 @@ class User(AbstractUser):
         symmetrical=True,
         blank=True,
     )
+    # Кэшированное количество друзей. Поддерживается методами add_friend/remove_friend
+    # и add_friends/remove_friends, чтобы профиль не считал друзей через COUNT по таблице связей.
+    friend_count = models.PositiveIntegerField(default=0)
+    # Момент вызова revoke_tokens: токены, выданные до него, не принимаются (general/authentication.py).
+    tokens_revoked_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    def add_friend(self, friend):
+        """
+        Добавляет друга и увеличивает счетчики друзей у обоих пользователей.
+        Возвращает False, если пользователи уже дружат.
+        """
+        with transaction.atomic():
+            if not self._insert_friendships([friend.pk]):
+                return False
+            User.objects.filter(pk__in={self.pk, friend.pk}).update(
+                friend_count=F("friend_count") + 1,
+            )
+            friend_sets.invalidate(self.pk, friend.pk)
+        self._change_friend_count(friend, 1)
+        return True
+
+    def remove_friend(self, friend):
+        """
+        Удаляет друга и уменьшает счетчики друзей у обоих пользователей.
+        Возвращает False, если пользователи не дружили.
+        """
+        with transaction.atomic():
+            if not self._delete_friendships([friend.pk]):
+                return False
+            User.objects.filter(pk__in={self.pk, friend.pk}).update(
+                friend_count=F("friend_count") - 1,
+            )
+            # Посты бывших друзей убираются из лент друг друга.
+            TimelineEntry.objects.filter(owner=self, post__author=friend).delete()
+            TimelineEntry.objects.filter(owner=friend, post__author=self).delete()
+            friend_sets.invalidate(self.pk, friend.pk)
+        self._change_friend_count(friend, -1)
+        return True
+
+    # Статусы, которые возвращают add_friends/remove_friends для каждого id.
+    FRIEND_ADDED = "added"
+    FRIEND_REMOVED = "removed"
+    FRIEND_ALREADY_ADDED = "already_friends"
+    FRIEND_NOT_FOUND = "not_friends"
+    USER_NOT_FOUND = "user_not_found"
+    USER_IS_SELF = "self"
+
+    def add_friends(self, user_ids):
+        """
+        Добавляет в друзья сразу несколько пользователей: одна вставка в таблицу связей
+        (см. _insert_friendships) и одно обновление счетчиков.
+        Возвращает словарь {id пользователя: статус}.
+        """
+        with transaction.atomic():
+            statuses, existing = self._check_friend_ids(user_ids)
+            added = self._insert_friendships(existing)
+            statuses.update({user_id: self.FRIEND_ALREADY_ADDED for user_id in existing - added})
+            statuses.update({user_id: self.FRIEND_ADDED for user_id in added})
+            if added:
+                self._change_friend_counts(sorted(added), 1)
+        return statuses
+
+    def remove_friends(self, user_ids):
+        """
+        Удаляет из друзей сразу несколько пользователей: одно удаление из таблицы связей
+        (см. _delete_friendships) и одно обновление счетчиков.
+        Возвращает словарь {id пользователя: статус}.
+        """
+        with transaction.atomic():
+            statuses, existing = self._check_friend_ids(user_ids)
+            removed = sorted(self._delete_friendships(existing))
+            statuses.update({user_id: self.FRIEND_NOT_FOUND for user_id in existing})
+            statuses.update({user_id: self.FRIEND_REMOVED for user_id in removed})
+            if removed:
+                TimelineEntry.objects.filter(owner=self, post__author__in=removed).delete()
+                TimelineEntry.objects.filter(owner__in=removed, post__author=self).delete()
+                self._change_friend_counts(removed, -1)
+        return statuses
+
+    def _check_friend_ids(self, user_ids):
+        # Делит id на существующих пользователей и id со статусом ошибки.
+        user_ids = set(user_ids)
+        existing = set(
+            User.objects.filter(pk__in=user_ids - {self.pk}).values_list("pk", flat=True)
+        )
+        statuses = {user_id: self.USER_NOT_FOUND for user_id in user_ids - existing}
+        if self.pk in user_ids:
+            statuses[self.pk] = self.USER_IS_SELF
+        return statuses, existing
+
+    def _insert_friendships(self, user_ids, batch_size=500):
+        """
+        Записывает связи с пользователями user_ids (обе стороны) запросами
+        INSERT ... ON CONFLICT DO NOTHING RETURNING и возвращает множество id, связь с которыми
+        действительно добавлена. Уже существующие связи, в том числе вставленные одновременным
+        запросом, пропускает сама БД, поэтому счетчики меняются только для новых строк.
+        """
+        through = User.friends.through
+        connection = connections[through.objects.db]
+        quote = connection.ops.quote_name
+        table = quote(through._meta.db_table)
+        from_column = quote(through._meta.get_field("from_user").column)
+        to_column = quote(through._meta.get_field("to_user").column)
+
+        # Строки вставляются в одном порядке во всех запросах, чтобы одновременные вставки
+        # пересекающихся пар ждали друг друга, а не взаимно блокировались.
+        user_ids = sorted(user_ids)
+        added = set()
+        with connection.cursor() as cursor:
+            for start in range(0, len(user_ids), batch_size):
+                rows = sorted(
+                    (from_id, to_id)
+                    for user_id in user_ids[start:start + batch_size]
+                    for from_id, to_id in ((self.pk, user_id), (user_id, self.pk))
+                )
+                cursor.execute(
+                    f"INSERT INTO {table} ({from_column}, {to_column}) "
+                    f"VALUES {', '.join(['(%s, %s)'] * len(rows))} "
+                    f"ON CONFLICT ({from_column}, {to_column}) DO NOTHING "
+                    f"RETURNING {from_column}, {to_column}",
+                    [value for row in rows for value in row],
+                )
+                added.update(to_id for from_id, to_id in cursor.fetchall() if from_id == self.pk)
+        return added
+
+    def _delete_friendships(self, user_ids, batch_size=500):
+        """
+        Удаляет связи с пользователями user_ids (обе стороны) запросами DELETE ... RETURNING
+        и возвращает множество id, связь с которыми действительно удалена. Связи, которые уже
+        удалил одновременный запрос, не возвращаются, и счетчики не уменьшаются второй раз.
+        """
+        through = User.friends.through
+        connection = connections[through.objects.db]
+        quote = connection.ops.quote_name
+        table = quote(through._meta.db_table)
+        from_column = quote(through._meta.get_field("from_user").column)
+        to_column = quote(through._meta.get_field("to_user").column)
+
+        user_ids = sorted(user_ids)
+        removed = set()
+        with connection.cursor() as cursor:
+            for start in range(0, len(user_ids), batch_size):
+                batch = user_ids[start:start + batch_size]
+                placeholders = ", ".join(["%s"] * len(batch))
+                cursor.execute(
+                    f"DELETE FROM {table} "
+                    f"WHERE ({from_column} = %s AND {to_column} IN ({placeholders})) "
+                    f"OR ({to_column} = %s AND {from_column} IN ({placeholders})) "
+                    f"RETURNING {from_column}, {to_column}",
+                    [self.pk, *batch, self.pk, *batch],
+                )
+                removed.update(to_id for from_id, to_id in cursor.fetchall() if from_id == self.pk)
+        return removed
+
+    def _change_friend_counts(self, user_ids, delta):
+        User.objects.filter(pk__in=user_ids).update(friend_count=F("friend_count") + delta)
+        User.objects.filter(pk=self.pk).update(friend_count=F("friend_count") + delta * len(user_ids))
+        friend_sets.invalidate(self.pk, *user_ids)
+        self._adjust_friend_count(delta * len(user_ids))
+
+    def _change_friend_count(self, friend, delta):
+        self._adjust_friend_count(delta)
+        if friend is not self:
+            friend._adjust_friend_count(delta)
+
+    def _adjust_friend_count(self, delta):
+        # Синхронизируем значение в памяти с тем, что записали в БД. Если поле отложено
+        # (пользователь из CachedTokenUserAuthentication), Django дочитает его из БД уже
+        # после UPDATE, и прибавлять delta еще раз нельзя.
+        if "friend_count" not in self.get_deferred_fields():
+            self.friend_count += delta
+
+class AuthoredQuerySet(models.QuerySet):
+    """
+    QuerySet моделей с автором. Изменение и удаление своих объектов выполняется одним запросом
+    с условием author_id (UPDATE/DELETE ... WHERE id = %s AND author_id = %s), а затронутые строки
+    возвращаются через RETURNING (SQLite 3.35+, PostgreSQL). Объект автора при этом не загружается.
+    """
+    def of_author(self, user):
+        return self.filter(author_id=user.pk)
+
+    def update_returning(self, **values):
+        """Как update(), но возвращает список обновленных объектов."""
+        query = self.query.chain(sql.UpdateQuery)
+        query.add_update_values(values)
+        query.annotations = {}
+        return self._execute_returning(query)
+
+    def delete_returning(self):
+        """
+        Удаляет строки одним DELETE и возвращает удаленные объекты.
+        В отличие от delete(), связанные объекты (on_delete) не обрабатываются,
+        поэтому подходит только моделям, на которые нет ссылок, или если ссылки чистятся отдельно.
+        """
+        query = self.query.chain(sql.DeleteQuery)
+        return self._execute_returning(query)
+
+    def _execute_returning(self, query):
+        self._for_write = True
+        connection = connections[self.db]
+        statement, params = query.get_compiler(self.db).as_sql()
+        columns = ", ".join(
+            connection.ops.quote_name(field.column)
+            for field in self.model._meta.concrete_fields
+        )
+        # RawQuerySet приводит значения к типам полей модели так же, как обычный SELECT.
+        return list(self.model.objects.db_manager(self.db).raw(
+            f"{statement} RETURNING {columns}", params,
+        ))
+
+
+class PostQuerySet(AuthoredQuerySet):
+    def with_body_preview(self, max_length=128):
+        """
+        Добавляет поле body_preview - текст поста, обрезанный до max_length символов
+        прямо в базе данных. Полный текст (body) при этом не загружается.
+        """
+        return self.annotate(
+            body_length=functions.Length("body"),
+        ).annotate(
+            body_preview=models.Case(
+                models.When(
+                    body_length__gt=max_length,
+                    then=functions.Concat(
+                        functions.Substr("body", 1, max_length - 3),
+                        models.Value("..."),
+                    ),
+                ),
+                default=F("body"),
+                output_field=models.TextField(),
+            ),
+        ).defer("body")
+
+    def with_my_reaction(self, user):
+        """
+        Добавляет поле my_reaction - реакция пользователя на пост (или None).
+        Значение берется подзапросом в том же SQL-запросе, без запроса на каждый пост.
+        """
+        reaction = Reaction.objects.filter(
+            post=OuterRef("pk"),
+            author=user,
+        ).values("value")[:1]
+        return self.annotate(my_reaction=Subquery(reaction))
+
 
 class Post(models.Model):
     author = models.ForeignKey(
         to=User,
         on_delete=models.CASCADE,
         related_name="posts",
+        db_index=False, # покрывается индексом post_author_idx
     )
     title = models.CharField(max_length=64)
     body = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Денормализованные счетчики. Комментарии и реакции меняют их при создании/удалении,
+    # чтобы лента и админка не считали COUNT по связанным таблицам.
+    comment_count = models.PositiveIntegerField(default=0)
+    smile_count = models.PositiveIntegerField(default=0)
+    thumb_up_count = models.PositiveIntegerField(default=0)
+    laugh_count = models.PositiveIntegerField(default=0)
+    sad_count = models.PositiveIntegerField(default=0)
+    heart_count = models.PositiveIntegerField(default=0)
+
+    # Разослан ли пост в ленты друзей (TimelineEntry) при публикации. Неразосланные посты
+    # подмешиваются в ленту при чтении, см. general/feed.py.
+    fanned_out = models.BooleanField(default=False)
+
+    objects = PostQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Публикации пользователя (профиль, /api/users/<id>/posts/) выбираются по автору
+            # и сортируются по -id.
+            models.Index(fields=["author", "-id"], name="post_author_idx"),
+            # Неразосланные посты друзей, которые лента читает напрямую.
+            models.Index(
+                fields=["author", "-id"],
+                name="post_author_direct_idx",
+                condition=models.Q(fanned_out=False),
+            ),
+        ]
+
+    @staticmethod
+    def reaction_count_field(value):
+        # Для каждого значения Reaction.Values есть поле "<value>_count".
+        return f"{value}_count"
+
+    @property
+    def reaction_counts(self):
+        return {
+            value: getattr(self, self.reaction_count_field(value))
+            for value in Reaction.Values.values
+        }
+
+    @classmethod
+    def change_reaction_counts(cls, post_id, old_value, new_value):
+        """
+        Переносит одну реакцию из счетчика old_value в счетчик new_value одним UPDATE.
+        None означает отсутствие реакции.
+        """
+        changes = {}
+        if old_value:
+            field = cls.reaction_count_field(old_value)
+            changes[field] = F(field) - 1
+        if new_value:
+            field = cls.reaction_count_field(new_value)
+            changes[field] = F(field) + 1
+        if changes:
+            cls.objects.filter(pk=post_id).update(**changes)
+
+    @classmethod
+    def change_comment_count(cls, post_id, delta):
+        cls.objects.filter(pk=post_id).update(comment_count=F("comment_count") + delta)
+
+    @classmethod
+    def subtract_comments(cls, comments):
+        """
+        Вычитает комментарии из выборки comments из comment_count их постов одним UPDATE.
+        Вызывается до удаления комментариев.
+        """
+        per_post = _count_per_post(comments)
+        cls.objects.filter(pk__in=comments.order_by().values("post_id")).update(
+            comment_count=F("comment_count") - Subquery(per_post),
+        )
+
+    @classmethod
+    def subtract_reactions(cls, reactions):
+        """
+        Вычитает реакции из выборки reactions из счетчиков их постов одним UPDATE.
+        Вызывается до удаления реакций.
+        """
+        changes = {}
+        for value in Reaction.Values.values:
+            field = cls.reaction_count_field(value)
+            per_post = _count_per_post(reactions.filter(value=value))
+            changes[field] = F(field) - functions.Coalesce(Subquery(per_post), 0)
+        cls.objects.filter(
+            pk__in=reactions.exclude(value=None).order_by().values("post_id"),
+        ).update(**changes)
+
+
+def _count_per_post(queryset):
+    # Подзапрос "сколько строк queryset относится к посту из внешнего запроса".
+    return queryset.filter(post=OuterRef("pk")).order_by().values("post").annotate(
+        count=models.Count("*"),
+    ).values("count")
+
 
 class Comment(models.Model):
     body = models.TextField()
@@ -32,9 +376,63 @@ class Comment(models.Model):
         to=Post,
         on_delete=models.CASCADE,
         related_name="comments",
+        db_index=False, # покрывается индексом comment_post_idx
     )
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = AuthoredQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Комментарии к посту в общем списке (?post__id=) фильтруются по посту и сортируются по -id.
+            models.Index(fields=["post", "-id"], name="comment_post_idx"),
+            # Ветка комментариев поста (/api/posts/<id>/comments/) листается по ключу (created_at, id).
+            models.Index(fields=["post", "created_at", "id"], name="comment_post_created_idx"),
+        ]
+
+
+class ReactionQuerySet(models.QuerySet):
+    def toggle(self, author, post, value):
+        """
+        Ставит реакцию автора на пост или снимает ее, если передано то же значение.
+
+        Сама реакция записывается одним запросом INSERT ... ON CONFLICT DO UPDATE ... RETURNING,
+        поэтому одновременные запросы одного пользователя не падают на author_post_unique,
+        а итоговое значение не нужно перечитывать. Счетчики поста переносятся из прежнего
+        значения реакции в значение, которое вернул RETURNING. Прежнее значение читается после
+        блокировки строки поста (SELECT ... FOR UPDATE): одновременные реакции на пост ждут
+        друг друга, и ни одна не считает разницу по уже устаревшему значению.
+        """
+        connection = connections[self.db]
+        quote_name = connection.ops.quote_name
+        table = quote_name(self.model._meta.db_table)
+        author_column = quote_name(self.model._meta.get_field("author").column)
+        post_column = quote_name(self.model._meta.get_field("post").column)
+        value_column = quote_name(self.model._meta.get_field("value").column)
+        pk_column = quote_name(self.model._meta.pk.column)
+
+        with transaction.atomic(using=self.db):
+            # Строку поста UPDATE счетчиков заблокировал бы все равно, здесь это делается раньше.
+            list(Post.objects.using(self.db).select_for_update().filter(pk=post.pk).values_list("pk"))
+            old_value = self.filter(author=author, post=post).values_list("value", flat=True).first()
+
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"INSERT INTO {table} ({author_column}, {post_column}, {value_column}) "
+                    f"VALUES (%s, %s, %s) "
+                    f"ON CONFLICT ({author_column}, {post_column}) DO UPDATE SET {value_column} = "
+                    f"CASE WHEN {table}.{value_column} = excluded.{value_column} "
+                    f"THEN NULL ELSE excluded.{value_column} END "
+                    f"RETURNING {pk_column}, {value_column}",
+                    [author.pk, post.pk, value],
+                )
+                reaction_id, result_value = cursor.fetchone()
+
+            Post.change_reaction_counts(post.pk, old_value, result_value)
+
+        return self.model(id=reaction_id, author=author, post=post, value=result_value)
+
+
 class Reaction(models.Model):
     class Values(models.TextChoices):
         SMILE = "smile", "Улыбка"
@@ -55,6 +453,8 @@ class Reaction(models.Model):
         related_name="reactions",
     )
 
+    objects = ReactionQuerySet.as_manager()
+
     class Meta:
         constraints = [
             models.UniqueConstraint(
@@ -64,7 +464,93 @@ class Reaction(models.Model):
             ),
         ]
 
+class MergedQuerySet:
+    """
+    Несколько выборок, каждая из которых уже отсортирована по своему индексу, как одна
+    отсортированная выборка. Поддерживает срезы [start:stop], как их делает пагинация:
+    из каждой выборки читается не больше stop строк, и они сливаются в Python (heapq.merge).
+    """
+
+    def __init__(self, querysets, key, reverse=False):
+        self.querysets = querysets
+        self.key = key
+        self.reverse = reverse
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice) or item.stop is None or item.step is not None:
+            raise TypeError("MergedQuerySet поддерживает только срезы [start:stop].")
+        parts = [list(queryset[:item.stop]) for queryset in self.querysets]
+        merged = heapq.merge(*parts, key=self.key, reverse=self.reverse)
+        return list(islice(merged, item.start or 0, item.stop))
+
+
+class ChatQuerySet(models.QuerySet):
+    def inbox(self, user):
+        """
+        Чаты пользователя с сообщениями, от последнего сообщения к более старым.
+
+        Условие user_1 = user OR user_2 = user БД выполняет двумя индексами, но порядок строк
+        при этом теряется, и все чаты пользователя сортируются на каждой странице. Поэтому
+        чаты, где пользователь первый и второй участник, выбираются отдельно, каждые в порядке
+        своего индекса (chat_user_1_last_message_idx, chat_user_2_last_message_idx),
+        и сливаются (MergedQuerySet).
+        """
+        chats = self.filter(last_message_datetime__isnull=False).order_by("-last_message_datetime")
+        return MergedQuerySet(
+            [
+                chats.filter(user_1=user),
+                chats.filter(user_2=user).exclude(user_1=user),
+            ],
+            key=attrgetter("last_message_datetime"),
+            reverse=True,
+        )
+
+    def get_or_create_between(self, user, companion):
+        """
+        Возвращает чат двух пользователей, создавая его при необходимости, одним запросом:
+        INSERT ... ON CONFLICT (<выражения users_chat_unique>) DO UPDATE ... RETURNING.
+        Если чат уже есть (в любом порядке участников), вставка превращается в пустое обновление
+        существующей строки, и RETURNING возвращает ее. Одновременные запросы не получают
+        IntegrityError: конфликт разрешает сама БД по уникальному индексу.
+        """
+        connection = connections[self.db]
+        quote = connection.ops.quote_name
+        chat = self.model(user_1=user, user_2=companion)
+        meta = self.model._meta
+
+        fields = [field for field in meta.concrete_fields if not field.primary_key]
+        columns = ", ".join(quote(field.column) for field in fields)
+        values = [
+            field.get_db_prep_save(field.pre_save(chat, add=True), connection)
+            for field in fields
+        ]
+
+        # Цель конфликта - те же выражения, по которым построен уникальный индекс
+        # (GREATEST/LEAST на PostgreSQL, MAX/MIN на SQLite).
+        constraint = next(c for c in meta.constraints if c.name == "users_chat_unique")
+        query = sql.Query(self.model, alias_cols=False)
+        compiler = query.get_compiler(connection=connection)
+        targets = []
+        target_params = []
+        for expression in constraint.expressions:
+            target_sql, params = compiler.compile(expression.resolve_expression(query))
+            targets.append(f"({target_sql})")
+            target_params.extend(params)
+
+        table = quote(meta.db_table)
+        user_1_column = quote(meta.get_field("user_1").column)
+        returning = ", ".join(quote(field.column) for field in meta.concrete_fields)
+        return next(iter(self.raw(
+            f"INSERT INTO {table} ({columns}) VALUES ({', '.join(['%s'] * len(values))}) "
+            f"ON CONFLICT ({', '.join(targets)}) "
+            f"DO UPDATE SET {user_1_column} = {table}.{user_1_column} "
+            f"RETURNING {returning}",
+            values + target_params,
+        )))
+
+
 class Chat(models.Model):
+    LAST_MESSAGE_PREVIEW_LENGTH = 255
 
     class Meta:
         constraints = [
@@ -74,16 +560,131 @@ class Chat(models.Model):
                 name="users_chat_unique",
             ),
         ]
+        # Список чатов пользователя сортируется по дате последнего сообщения,
+        # поэтому индексы покрывают и фильтр по участнику, и сортировку.
+        indexes = [
+            models.Index(
+                fields=["user_1", "-last_message_datetime"],
+                name="chat_user_1_last_message_idx",
+            ),
+            models.Index(
+                fields=["user_2", "-last_message_datetime"],
+                name="chat_user_2_last_message_idx",
+            ),
+        ]
     user_1 = models.ForeignKey(
         to=User,
         on_delete=models.CASCADE,
         related_name="chats_as_user1",
+        db_index=False, # покрывается индексом chat_user_1_last_message_idx
     )
     user_2 = models.ForeignKey(
         to=User,
         on_delete=models.CASCADE,
         related_name="chats_as_user2",
+        db_index=False, # покрывается индексом chat_user_2_last_message_idx
+    )
+
+    # Денормализованные данные о последнем сообщении чата.
+    # Они обновляются при отправке и удалении сообщений, чтобы список чатов
+    # не приходилось собирать подзапросами к таблице сообщений.
+    last_message = models.ForeignKey(
+        to="Message",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
     )
+    last_message_content = models.CharField(
+        max_length=LAST_MESSAGE_PREVIEW_LENGTH,
+        blank=True,
+        default="",
+    )
+    last_message_author = models.ForeignKey(
+        to=User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    last_message_datetime = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = ChatQuerySet.as_manager()
+
+    def set_last_message(self, message):
+        """
+        Одним UPDATE записывает сообщение в качестве последнего сообщения чата.
+        Если message равен None, данные о последнем сообщении очищаются.
+
+        Сообщение записывается, только если оно не старше уже записанного: иначе отправка,
+        которая дольше выполнялась, вернула бы в превью чата более старое сообщение.
+        """
+        chats = Chat.objects.filter(pk=self.pk)
+        if message is None:
+            values = {
+                "last_message": None,
+                "last_message_content": "",
+                "last_message_author": None,
+                "last_message_datetime": None,
+            }
+        else:
+            values = {
+                "last_message": message,
+                "last_message_content": message.content[:self.LAST_MESSAGE_PREVIEW_LENGTH],
+                "last_message_author_id": message.author_id,
+                "last_message_datetime": message.created_at,
+            }
+            chats = chats.filter(
+                models.Q(last_message_datetime__isnull=True)
+                | models.Q(last_message_datetime__lte=message.created_at)
+            )
+        if chats.update(**values):
+            for field, value in values.items():
+                setattr(self, field, value)
+
+    @classmethod
+    def set_last_messages(cls, chats, messages):
+        """
+        То же, что set_last_message, но для нескольких чатов одним запросом.
+        Каждый чат получает самое новое из своих сообщений в БД (см. refresh_last_messages),
+        поэтому одновременная отправка в тот же чат не заменяется более старым сообщением.
+        """
+        chat_ids = {message.chat_id for message in messages}
+        cls.refresh_last_messages(cls.objects.filter(pk__in=[chat.pk for chat in chats if chat.pk in chat_ids]))
+
+    @classmethod
+    def message_deleted(cls, message):
+        """
+        Если удаленное сообщение было последним в чате, одним UPDATE заменяет его
+        самым новым из оставшихся сообщений. Чат при этом не загружается.
+        """
+        cls.refresh_last_messages(
+            cls.objects.filter(pk=message.chat_id, last_message_id=message.pk),
+        )
+
+    @classmethod
+    def refresh_last_messages(cls, chats):
+        """
+        Одним UPDATE записывает в каждый чат выборки chats его самое новое сообщение.
+        Значения берутся подзапросами, ни чаты, ни сообщения не загружаются.
+        """
+        newest = Message.objects.filter(
+            chat=OuterRef("pk"),
+        ).order_by("-created_at", "-id")
+        chats.update(
+            last_message=Subquery(newest.values("pk")[:1]),
+            last_message_content=functions.Coalesce(
+                Subquery(
+                    newest.annotate(
+                        preview=functions.Substr("content", 1, cls.LAST_MESSAGE_PREVIEW_LENGTH),
+                    ).values("preview")[:1]
+                ),
+                models.Value(""),
+            ),
+            last_message_author=Subquery(newest.values("author")[:1]),
+            last_message_datetime=Subquery(newest.values("created_at")[:1]),
+        )
 
 
 class Message(models.Model):
@@ -97,5 +698,81 @@ class Message(models.Model):
         to=Chat,
         on_delete=models.CASCADE,
         related_name="messages",
+        db_index=False, # покрывается индексом message_chat_created_idx
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = AuthoredQuerySet.as_manager()
+
+    class Meta:
+        # История чата листается по ключу (created_at, id) внутри одного чата.
+        indexes = [
+            models.Index(
+                fields=["chat", "created_at", "id"],
+                name="message_chat_created_idx",
+            ),
+            # Новые сообщения чатов пользователя для /api/sync/ (id > позиции).
+            models.Index(
+                fields=["chat", "id"],
+                name="message_chat_id_idx",
+            ),
+        ]
+
+
+class DeletedMessage(models.Model):
+    """
+    Запись об удаленном сообщении. По таким записям клиенты при синхронизации
+    (/api/sync/) узнают, какие сообщения нужно убрать из локальной истории.
+    """
+    message_id = models.BigIntegerField()
+    chat = models.ForeignKey(
+        to=Chat,
+        on_delete=models.CASCADE,
+        related_name="deleted_messages",
+    )
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    @classmethod
+    def prune(cls, before, batch_size=1000):
+        """
+        Удаляет записи, созданные раньше before, пачками по batch_size строк, и возвращает их количество.
+        id растут вместе с deleted_at, поэтому записи читаются по первичному ключу до первой более
+        новой, без просмотра всей таблицы. Редкие записи, закоммиченные позже записей с большим id,
+        удалятся при следующем запуске.
+        """
+        pruned = 0
+        while True:
+            rows = cls.objects.order_by("id").values_list("id", "deleted_at")[:batch_size]
+            expired = [pk for pk, _ in takewhile(lambda row: row[1] < before, rows)]
+            if expired:
+                pruned += cls.objects.filter(pk__in=expired).delete()[0]
+            if len(expired) < batch_size:
+                return pruned
+
+
+class TimelineEntry(models.Model):
+    """
+    Запись ленты друзей: пост, разосланный владельцу ленты при публикации (fan-out on write).
+    Посты авторов с очень большим количеством друзей сюда не попадают (Post.fanned_out = False),
+    они добавляются в ленту при чтении (см. general/feed.py).
+    """
+    owner = models.ForeignKey(
+        to=User,
+        on_delete=models.CASCADE,
+        related_name="timeline_entries",
+        db_index=False, # покрывается ограничением timeline_owner_post_unique
+    )
+    post = models.ForeignKey(
+        to=Post,
+        on_delete=models.CASCADE,
+        related_name="timeline_entries",
     )
-    created_at = models.DateTimeField(auto_now_add=True)
\ No newline at end of file
+
+    class Meta:
+        # Лента читается по ключу (owner, post_id) от новых постов к старым.
+        constraints = [
+            models.UniqueConstraint(
+                fields=["owner", "post"],
+                name="timeline_owner_post_unique",
+            ),
+        ]
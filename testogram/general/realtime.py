@@ -0,0 +1,108 @@
+import asyncio
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+# Доставка событий (например, новых сообщений) пользователям, подключенным по WebSocket.
+#
+# Брокер выбирается настройкой REALTIME_BROKER. По умолчанию используется InProcessBroker,
+# который работает внутри одного процесса. Для нескольких процессов/серверов его можно заменить
+# брокером поверх Redis (pub/sub) с тем же интерфейсом: subscribe(user_id) и publish(user_ids, event).
+
+
+class Subscription:
+    """
+    Подписка одного WebSocket-соединения на события пользователя.
+    События складываются в очередь event loop-а, в котором была создана подписка.
+    """
+    max_size = 100
+
+    def __init__(self, broker, user_id):
+        self.broker = broker
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=self.max_size)
+
+    def deliver(self, event):
+        # Вызывается из любого потока: сама запись в очередь выполняется в event loop подписки.
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event):
+        if self.queue.full():
+            # Медленный клиент: выбрасываем самое старое событие, чтобы не копить память.
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def get(self):
+        return await self.queue.get()
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = {}
+
+    def subscribe(self, user_id):
+        subscription = Subscription(self, user_id)
+        with self._lock:
+            self._subscriptions.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self._subscriptions.pop(subscription.user_id, None)
+
+    def publish(self, user_ids, event):
+        with self._lock:
+            subscriptions = [
+                subscription
+                for user_id in set(user_ids)
+                for subscription in self._subscriptions.get(user_id, ())
+            ]
+        for subscription in subscriptions:
+            subscription.deliver(event)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(settings.REALTIME_BROKER)()
+    return _broker
+
+
+def message_created_event(message):
+    return {
+        "type": "message.created",
+        "message": {
+            "id": message.pk,
+            "chat": message.chat_id,
+            "author": message.author_id,
+            "content": message.content,
+            "created_at": message.created_at.strftime(settings.REST_FRAMEWORK["DATETIME_FORMAT"]),
+        },
+    }
+
+
+def publish_message(message, chat):
+    """
+    Отправляет новое сообщение обоим участникам чата.
+    Вызывается после коммита транзакции, чтобы клиенты не получили сообщение, которого нет в БД.
+    """
+    get_broker().publish(
+        [chat.user_1_id, chat.user_2_id],
+        message_created_event(message),
+    )
@@ -0,0 +1,157 @@
+import re
+
+from django.db import NotSupportedError, connection
+
+
+# Полнотекстовый поиск по постам и комментариям (/api/search/, поиск в админке).
+#
+# SQLite: FTS5-таблицы с внешним содержимым (general_post_fts, general_comment_fts). Сами тексты
+# в них не копируются, индекс обновляется триггерами на INSERT, UPDATE и DELETE исходной таблицы.
+# PostgreSQL: генерируемый столбец search_vector (tsvector) с GIN-индексом, его пересчитывает сама БД.
+#
+# В обоих случаях индекс обновляется построчно при каждой записи, в том числе при bulk_create
+# и удалениях через delete_returning, которые обходят сигналы Django.
+#
+# Важно для SQLite: миграции, которые пересоздают таблицу general_post или general_comment
+# (так Django выполняет большинство ALTER), удаляют ее триггеры. В такую миграцию нужно добавить
+# RunPython, который вызывает SEARCH_INDEXES[...].install(schema_editor.connection).
+
+MAX_TERMS = 8
+
+
+def get_terms(query):
+    # Из запроса берем только слова: операторы FTS5 и tsquery пользователю недоступны,
+    # поэтому любой ввод дает корректный запрос.
+    return re.findall(r"\w+", query.lower())[:MAX_TERMS]
+
+
+class SearchIndex:
+    def __init__(self, table, columns, weights):
+        self.table = table
+        self.columns = columns
+        # Вес каждого столбца для bm25 на SQLite, в порядке columns.
+        # На PostgreSQL столбцы получают метки весов A, B, ... в том же порядке.
+        self.weights = weights
+
+    @property
+    def fts_table(self):
+        return f"{self.table}_fts"
+
+    # Создание и удаление индекса (вызываются из миграций).
+
+    def install(self, connection):
+        if connection.vendor == "sqlite":
+            statements = self._sqlite_install_statements()
+        elif connection.vendor == "postgresql":
+            statements = self._postgresql_install_statements()
+        else:
+            return
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+
+    def uninstall(self, connection):
+        if connection.vendor == "sqlite":
+            statements = [
+                f"DROP TRIGGER IF EXISTS {self.fts_table}_{suffix}"
+                for suffix in ("insert", "update", "delete")
+            ] + [f"DROP TABLE IF EXISTS {self.fts_table}"]
+        elif connection.vendor == "postgresql":
+            statements = [f"ALTER TABLE {self.table} DROP COLUMN IF EXISTS search_vector"]
+        else:
+            return
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+
+    def _sqlite_install_statements(self):
+        fts = self.fts_table
+        columns = ", ".join(self.columns)
+        new_values = ", ".join(f"new.{column}" for column in self.columns)
+        old_values = ", ".join(f"old.{column}" for column in self.columns)
+        return [
+            f"DROP TRIGGER IF EXISTS {fts}_insert",
+            f"DROP TRIGGER IF EXISTS {fts}_update",
+            f"DROP TRIGGER IF EXISTS {fts}_delete",
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+            f"{columns}, content='{self.table}', content_rowid='id', "
+            f"tokenize='unicode61 remove_diacritics 2')",
+            f"CREATE TRIGGER {fts}_insert AFTER INSERT ON {self.table} BEGIN "
+            f"INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new_values}); END",
+            # Срабатывает только при изменении текстов, а не, например, счетчиков поста.
+            f"CREATE TRIGGER {fts}_update AFTER UPDATE OF {columns} ON {self.table} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); "
+            f"INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new_values}); END",
+            f"CREATE TRIGGER {fts}_delete AFTER DELETE ON {self.table} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); END",
+            # Индексируем уже существующие строки.
+            f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+        ]
+
+    def _postgresql_install_statements(self):
+        vector = " || ".join(
+            f"setweight(to_tsvector('simple', coalesce({column}, '')), '{weight}')"
+            for column, weight in zip(self.columns, "ABCD")
+        )
+        return [
+            f"ALTER TABLE {self.table} ADD COLUMN IF NOT EXISTS search_vector tsvector "
+            f"GENERATED ALWAYS AS ({vector}) STORED",
+            f"CREATE INDEX IF NOT EXISTS {self.table}_search_idx ON {self.table} USING GIN (search_vector)",
+        ]
+
+    # Поиск.
+
+    def _match(self, terms):
+        if connection.vendor == "sqlite":
+            # "слово"* - поиск по префиксу, слова через пробел объединяются по И.
+            return " ".join(f'"{term}"*' for term in terms)
+        if connection.vendor == "postgresql":
+            return " & ".join(f"{term}:*" for term in terms)
+        raise NotSupportedError(f"Полнотекстовый поиск не поддерживается для {connection.vendor}.")
+
+    def matching_ids_sql(self, query):
+        """
+        SQL-подзапрос с id всех найденных строк, без ранжирования (для фильтра id__in=RawSQL(...)).
+        Возвращает None, если в запросе нет слов.
+        """
+        terms = get_terms(query)
+        if not terms:
+            return None
+        if connection.vendor == "sqlite":
+            return f"SELECT rowid FROM {self.fts_table} WHERE {self.fts_table} MATCH %s", [self._match(terms)]
+        return (
+            f"SELECT id FROM {self.table} WHERE search_vector @@ to_tsquery('simple', %s)",
+            [self._match(terms)],
+        )
+
+    def search(self, query, limit, offset=0):
+        """Возвращает id найденных строк, от более релевантных к менее релевантным."""
+        terms = get_terms(query)
+        if not terms:
+            return []
+        match = self._match(terms)
+        if connection.vendor == "sqlite":
+            weights = ", ".join(str(weight) for weight in self.weights)
+            # bm25 тем меньше, чем релевантнее строка.
+            statement = (
+                f"SELECT rowid FROM {self.fts_table} WHERE {self.fts_table} MATCH %s "
+                f"ORDER BY bm25({self.fts_table}, {weights}), rowid DESC LIMIT %s OFFSET %s"
+            )
+            params = [match, limit, offset]
+        else:
+            statement = (
+                f"SELECT id FROM {self.table} WHERE search_vector @@ to_tsquery('simple', %s) "
+                f"ORDER BY ts_rank(search_vector, to_tsquery('simple', %s)) DESC, id DESC "
+                f"LIMIT %s OFFSET %s"
+            )
+            params = [match, match, limit, offset]
+        with connection.cursor() as cursor:
+            cursor.execute(statement, params)
+            return [row[0] for row in cursor.fetchall()]
+
+
+SEARCH_INDEXES = {
+    # Совпадение в заголовке поста важнее совпадения в тексте.
+    "post": SearchIndex("general_post", ("title", "body"), weights=(2.0, 1.0)),
+    "comment": SearchIndex("general_comment", ("body",), weights=(1.0,)),
+}
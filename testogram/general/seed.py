@@ -0,0 +1,366 @@
+import random
+from array import array
+from bisect import bisect_right
+from datetime import timedelta
+from itertools import accumulate
+
+from factory.random import reseed_random
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
+from django.db import connection, transaction
+from django.db.models import Count, DateTimeField, IntegerField, OuterRef, Subquery, Value, functions
+from django.db.models.fields import AutoFieldMixin
+
+from general.factories import UserFactory, PostFactory
+from general.models import User, Post, Comment, Reaction, Chat, Message
+
+
+# Генерация большого набора данных для нагрузочного тестования (команда seed).
+#
+# Фабрики из general/factories.py создают по одной строке на save(), а MessageFactory
+# еще и новый чат на каждое сообщение, поэтому миллионы строк ими не создать. Здесь фабрики
+# используются только для небольших наборов имен и текстов, а строки пишутся многострочными
+# INSERT (BulkWriter).
+#
+# Пользователи обрабатываются блоками по batch_size. Каждый блок создает свои строки
+# (друзей, посты, комментарии и т.д. своих пользователей) с собственным генератором случайных
+# чисел, зависящим только от seed, этапа и номера блока. Поэтому при тех же seed и batch_size
+# результат одинаков при любом количестве процессов, а блоки одного этапа можно выполнять
+# параллельно (на PostgreSQL; в SQLite одновременно пишет только одно соединение).
+#
+# Активность пользователей распределена по степенному закону (распределение Парето):
+# у большинства немного друзей, постов и чатов, у немногих - на порядки больше.
+# Дружба и чаты строятся по модели Чунга-Лу: пара (u, v) связана с вероятностью,
+# пропорциональной активности u и v, и поэтому у активных пользователей связей больше.
+# Каждую пару порождает блок пользователя с меньшим номером, так что блоки не создают
+# одинаковых пар.
+#
+# id пользователей и постов назначаются заранее (начиная с текущего максимума), чтобы блоки
+# могли ссылаться на чужих пользователей и посты, не читая их из БД.
+# Ленты друзей (TimelineEntry) не заполняются: посты остаются неразосланными
+# (Post.fanned_out = False) и подмешиваются в ленты при чтении.
+
+PARETO_ALPHA = 1.5
+# Среднее значение распределения Парето, на него делим, чтобы получить среднее 1.
+PARETO_MEAN = PARETO_ALPHA / (PARETO_ALPHA - 1)
+# Ограничение активности одного пользователя (во сколько раз больше типичной).
+MAX_ACTIVITY = 1000.0
+NAME_POOL_SIZE = 1000
+TEXT_POOL_SIZE = 1000
+
+REACTION_VALUES = list(Reaction.Values.values)
+# Чаще всего ставят "палец вверх" и "сердце".
+REACTION_WEIGHTS = [2, 5, 2, 1, 4]
+
+
+def _round(rnd, value):
+    # Случайное округление: в среднем дает ровно value.
+    whole = int(value)
+    return whole + (rnd.random() < value - whole)
+
+
+def _pareto(rnd):
+    return min(rnd.paretovariate(PARETO_ALPHA), MAX_ACTIVITY)
+
+
+class BulkWriter:
+    """
+    Копит строки и записывает их многострочными INSERT по batch_size строк.
+
+    Строка - кортеж значений полей fields (имена атрибутов, например author_id). Остальные
+    поля модели, кроме автоинкрементного id, получают значения по умолчанию. Объекты моделей
+    не создаются: на миллионах строк bulk_create тратит больше времени на конструкторы моделей
+    и подготовку значений, чем сама БД на вставку. По той же причине не вызывается pre_save,
+    и auto_now_add не подменяет сгенерированные даты created_at.
+    """
+
+    def __init__(self, model, fields, batch_size):
+        meta = model._meta
+        self.table = meta.db_table
+        self.fields = [meta.get_field(name) for name in fields]
+        self.defaults = [
+            field for field in meta.concrete_fields
+            if field.attname not in fields and not isinstance(field, AutoFieldMixin)
+        ]
+        self.default_values = tuple(
+            field.get_db_prep_save(field.get_default(), connection) for field in self.defaults
+        )
+        # Подготовка для БД нужна только датам, остальные значения передаются как есть.
+        self.datetime_positions = [
+            position for position, field in enumerate(self.fields)
+            if isinstance(field, DateTimeField)
+        ]
+        self.batch_size = min(
+            batch_size,
+            connection.ops.bulk_batch_size(self.fields + self.defaults, [None] * batch_size),
+        )
+        # connection - прокси к соединению текущего потока, обращение к нему на каждой строке заметно.
+        self.adapt_datetime = connection.ops.adapt_datetimefield_value
+        self.rows = []
+        self.count = 0
+
+    def add(self, *values):
+        if self.datetime_positions:
+            values = list(values)
+            for position in self.datetime_positions:
+                values[position] = self.adapt_datetime(values[position])
+        self.rows.append(tuple(values) + self.default_values)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        quote = connection.ops.quote_name
+        columns = ", ".join(quote(field.column) for field in self.fields + self.defaults)
+        placeholder = f"({', '.join(['%s'] * (len(self.fields) + len(self.defaults)))})"
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {quote(self.table)} ({columns}) VALUES {', '.join([placeholder] * len(self.rows))}",
+                [value for row in self.rows for value in row],
+            )
+        self.count += len(self.rows)
+        self.rows = []
+
+
+class SeedPlan:
+    """
+    Все, что блокам нужно знать о наборе данных целиком: активность пользователей,
+    количество и id постов каждого пользователя, наборы имен и текстов.
+    Вычисляется детерминированно из seed. Массивы хранятся в array, а не в списках,
+    чтобы миллионы пользователей занимали десятки мегабайт.
+    """
+    PHASES = ("users", "friends", "posts", "comments", "reactions", "chats", "counters")
+
+    def __init__(self, users, friends, posts, comments, reactions, chats, messages,
+                 seed, batch_size, until, days, user_base, post_base):
+        self.users = users
+        self.friends = friends
+        self.posts = posts
+        self.comments = comments
+        self.reactions = reactions
+        self.chats = chats
+        self.messages = messages
+        self.seed = seed
+        self.batch_size = batch_size
+        self.until = until
+        self.days = days
+        self.user_base = user_base
+        self.post_base = post_base
+
+        rnd = self.random("plan")
+        activity = array("d", (_pareto(rnd) for _ in range(users)))
+        mean = sum(activity) / users if users else 1.0
+        # Средняя активность равна 1, т.е. параметры задают средние значения на пользователя.
+        self.activity = array("d", (value / mean for value in activity))
+        self.cum_activity = array("d", accumulate(self.activity))
+
+        self.post_counts = array("q", (_round(rnd, posts * value) for value in self.activity))
+        # Посты пользователя i получают id post_base + post_starts[i] ... (не включая post_starts[i + 1]).
+        self.post_starts = array("q", accumulate(self.post_counts, initial=0))
+        # Популярность постов для комментариев и реакций: у активных авторов их больше.
+        self.cum_popularity = array(
+            "d", accumulate(count * value for count, value in zip(self.post_counts, self.activity))
+        )
+
+        reseed_random(seed)
+        people = UserFactory.build_batch(NAME_POOL_SIZE)
+        self.first_names = [person.first_name for person in people]
+        self.last_names = [person.last_name for person in people]
+        samples = PostFactory.build_batch(TEXT_POOL_SIZE, author=None)
+        self.titles = [post.title for post in samples]
+        self.texts = [post.body for post in samples]
+
+    @property
+    def chunk_count(self):
+        return (self.users + self.batch_size - 1) // self.batch_size
+
+    @property
+    def total_posts(self):
+        return self.post_starts[-1]
+
+    def chunk(self, index):
+        return range(index * self.batch_size, min((index + 1) * self.batch_size, self.users))
+
+    def random(self, *key):
+        return random.Random(":".join(str(part) for part in (self.seed, *key)))
+
+    def user_id(self, index):
+        return self.user_base + index
+
+    def username(self, index):
+        return f"seed{self.seed}_{index}"
+
+    def random_datetime(self, rnd):
+        return self.until - timedelta(seconds=rnd.random() * self.days * 86400)
+
+    def pairs_from(self, rnd, index, average):
+        """
+        Пары (index, v) с v > index по модели Чунга-Лу: ожидаемое количество связей
+        пользователя равно average * активность. Возвращает отсортированный список v.
+        """
+        total = self.cum_activity[-1]
+        above = total - self.cum_activity[index]
+        expected = average * self.activity[index] * above / total
+        count = min(_round(rnd, expected), self.users - index - 1)
+        targets = set()
+        for _ in range(count):
+            target = bisect_right(self.cum_activity, self.cum_activity[index] + rnd.random() * above)
+            targets.add(min(target, self.users - 1))
+        targets.discard(index)
+        return sorted(targets)
+
+    def random_post_id(self, rnd):
+        author = bisect_right(self.cum_popularity, rnd.random() * self.cum_popularity[-1])
+        author = min(author, self.users - 1)
+        return self.post_base + self.post_starts[author] + rnd.randrange(self.post_counts[author])
+
+    def run(self, phase, chunk):
+        rnd = self.random(phase, chunk)
+        with transaction.atomic():
+            return getattr(self, f"seed_{phase}")(rnd, self.chunk(chunk))
+
+    # Этапы. Каждый метод обрабатывает один блок пользователей и возвращает количество созданных
+    # (для counters - обновленных) строк.
+
+    def seed_users(self, rnd, indexes):
+        writer = BulkWriter(
+            User,
+            ["id", "username", "password", "first_name", "last_name", "email", "date_joined"],
+            self.batch_size,
+        )
+        for index in indexes:
+            username = self.username(index)
+            writer.add(
+                self.user_id(index),
+                username,
+                UNUSABLE_PASSWORD_PREFIX,
+                rnd.choice(self.first_names),
+                rnd.choice(self.last_names),
+                f"{username}@example.com",
+                self.random_datetime(rnd),
+            )
+        writer.flush()
+        return writer.count
+
+    def seed_friends(self, rnd, indexes):
+        Friendship = User.friends.through
+        writer = BulkWriter(Friendship, ["from_user_id", "to_user_id"], self.batch_size)
+        for index in indexes:
+            user_id = self.user_id(index)
+            for target in self.pairs_from(rnd, index, self.friends):
+                # Связь симметричная, поэтому в таблицу пишутся обе стороны.
+                writer.add(user_id, self.user_id(target))
+                writer.add(self.user_id(target), user_id)
+        writer.flush()
+        return writer.count // 2
+
+    def seed_posts(self, rnd, indexes):
+        writer = BulkWriter(Post, ["id", "author_id", "title", "body", "created_at"], self.batch_size)
+        for index in indexes:
+            for number in range(self.post_counts[index]):
+                writer.add(
+                    self.post_base + self.post_starts[index] + number,
+                    self.user_id(index),
+                    rnd.choice(self.titles),
+                    rnd.choice(self.texts),
+                    self.random_datetime(rnd),
+                )
+        writer.flush()
+        return writer.count
+
+    def seed_comments(self, rnd, indexes):
+        if not self.total_posts:
+            return 0
+        writer = BulkWriter(Comment, ["author_id", "post_id", "body", "created_at"], self.batch_size)
+        for index in indexes:
+            for _ in range(_round(rnd, self.comments * self.activity[index])):
+                writer.add(
+                    self.user_id(index),
+                    self.random_post_id(rnd),
+                    rnd.choice(self.texts),
+                    self.random_datetime(rnd),
+                )
+        writer.flush()
+        return writer.count
+
+    def seed_reactions(self, rnd, indexes):
+        if not self.total_posts:
+            return 0
+        writer = BulkWriter(Reaction, ["author_id", "post_id", "value"], self.batch_size)
+        for index in indexes:
+            # Один пользователь ставит посту не больше одной реакции (author_post_unique).
+            post_ids = {
+                self.random_post_id(rnd)
+                for _ in range(_round(rnd, self.reactions * self.activity[index]))
+            }
+            for post_id in sorted(post_ids):
+                writer.add(
+                    self.user_id(index),
+                    post_id,
+                    rnd.choices(REACTION_VALUES, REACTION_WEIGHTS)[0],
+                )
+        writer.flush()
+        return writer.count
+
+    def seed_chats(self, rnd, indexes):
+        writer = BulkWriter(Chat, ["user_1_id", "user_2_id", "created_at"], self.batch_size)
+        # Чаты созданы раньше всех своих сообщений.
+        created_at = self.until - timedelta(days=self.days)
+        for index in indexes:
+            for target in self.pairs_from(rnd, index, self.chats):
+                writer.add(self.user_id(index), self.user_id(target), created_at)
+        writer.flush()
+
+        # Чаты блока - это чаты, у которых user_1 из блока. id читаем по индексу chat_user_1.
+        chats = Chat.objects.filter(
+            user_1__gte=self.user_id(indexes.start),
+            user_1__lte=self.user_id(indexes.stop - 1),
+        ).order_by("id").values_list("id", "user_1_id", "user_2_id")
+        messages = BulkWriter(Message, ["chat_id", "author_id", "content", "created_at"], self.batch_size)
+        for chat_id, user_1_id, user_2_id in chats.iterator(chunk_size=self.batch_size):
+            # Активность чатов тоже распределена по степенному закону.
+            count = _round(rnd, self.messages * _pareto(rnd) / PARETO_MEAN)
+            times = sorted(self.random_datetime(rnd) for _ in range(count))
+            for created_at in times:
+                messages.add(
+                    chat_id,
+                    rnd.choice((user_1_id, user_2_id)),
+                    rnd.choice(self.texts),
+                    created_at,
+                )
+        messages.flush()
+        return writer.count + messages.count
+
+    def seed_counters(self, rnd, indexes):
+        # Денормализованные счетчики и последние сообщения чатов пересчитываются запросами
+        # к БД: связи и комментарии блока созданы и другими блоками.
+        first, last = self.user_id(indexes.start), self.user_id(indexes.stop - 1)
+        friend_count = User.friends.through.objects.filter(
+            from_user=OuterRef("pk"),
+        ).values("from_user").annotate(count=Count("*")).values("count")
+        updated = User.objects.filter(pk__range=(first, last)).update(
+            friend_count=functions.Coalesce(Subquery(friend_count), Value(0)),
+        )
+
+        first_post = self.post_base + self.post_starts[indexes.start]
+        last_post = self.post_base + self.post_starts[indexes.stop] - 1
+        counters = {
+            "comment_count": Comment.objects.filter(post=OuterRef("pk")),
+        }
+        for value in REACTION_VALUES:
+            counters[Post.reaction_count_field(value)] = Reaction.objects.filter(
+                post=OuterRef("pk"), value=value,
+            )
+        Post.objects.filter(pk__range=(first_post, last_post)).update(**{
+            field: functions.Coalesce(
+                Subquery(
+                    queryset.values("post").annotate(count=Count("*")).values("count"),
+                    output_field=IntegerField(),
+                ),
+                Value(0),
+            )
+            for field, queryset in counters.items()
+        })
+
+        Chat.refresh_last_messages(Chat.objects.filter(user_1__gte=first, user_1__lte=last))
+        return updated
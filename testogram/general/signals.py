@@ -0,0 +1,32 @@
+from django.db.models import F
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+
+from general.friends import friend_sets
+from general.models import User, Post, Comment, Reaction
+
+
+# Денормализованные счетчики при каскадных удалениях и удалениях из админки.
+# API меняет счетчики явно (User.remove_friend и т.д.) запросами, которые сигналов не вызывают,
+# а здесь обрабатываются удаления через Model.delete() и QuerySet.delete().
+
+
+@receiver(pre_delete, sender=User)
+def remove_deleted_user_from_friends(sender, instance, **kwargs):
+    # Связи друзей удалились бы каскадом, но счетчики друзей остались бы прежними.
+    # Удаляем их сами и уменьшаем счетчики только тех, связь с кем действительно удалена.
+    friend_ids = User.friends.through.objects.filter(from_user=instance).values_list("to_user_id", flat=True)
+    removed = instance._delete_friendships(list(friend_ids))
+    if removed:
+        User.objects.filter(pk__in=removed).update(friend_count=F("friend_count") - 1)
+        friend_sets.invalidate(instance.pk, *removed)
+
+
+@receiver(pre_delete, sender=User)
+def remove_deleted_user_from_post_counts(sender, instance, **kwargs):
+    # Комментарии и реакции пользователя удалятся каскадом. Вычитаем их из счетчиков постов
+    # одним UPDATE на модель, а не обработчиком на каждую строку: обработчики удаления
+    # Comment и Reaction отключили бы быстрое каскадное удаление при удалении постов.
+    # Посты самого пользователя удаляются вместе с ним, их счетчики не трогаем.
+    Post.subtract_comments(Comment.objects.filter(author=instance).exclude(post__author=instance))
+    Post.subtract_reactions(Reaction.objects.filter(author=instance).exclude(post__author=instance))
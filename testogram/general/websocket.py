@@ -0,0 +1,82 @@
+import asyncio
+import json
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+from general.authentication import CachedTokenUserAuthentication
+from general.realtime import get_broker
+
+
+# ASGI-приложение для WebSocket-соединений: ws://<host>/ws/messages/?token=<access token>.
+# Токен тот же, что и для API (SimpleJWT). Его также можно передать в заголовке Authorization.
+# После подключения клиент получает новые сообщения своих чатов в виде JSON.
+
+WEBSOCKET_PATH = "/ws/messages/"
+
+# Коды закрытия соединения (диапазон 4000-4999 отведен приложениям).
+CLOSE_NOT_FOUND = 4404
+CLOSE_UNAUTHORIZED = 4401
+
+
+def get_raw_token(scope):
+    query = parse_qs(scope.get("query_string", b"").decode())
+    if query.get("token"):
+        return query["token"][0].encode()
+    for name, value in scope.get("headers", []):
+        if name == b"authorization":
+            return CachedTokenUserAuthentication().get_raw_token(value)
+    return None
+
+
+@sync_to_async
+def authenticate(scope):
+    authentication = CachedTokenUserAuthentication()
+    try:
+        raw_token = get_raw_token(scope)
+        if raw_token is None:
+            return None
+        validated_token = authentication.get_validated_token(raw_token)
+        return authentication.get_user(validated_token)
+    except (InvalidToken, AuthenticationFailed):
+        return None
+
+
+async def websocket_application(scope, receive, send):
+    event = await receive()
+    if event["type"] != "websocket.connect":
+        return
+
+    if scope["path"] != WEBSOCKET_PATH:
+        await send({"type": "websocket.close", "code": CLOSE_NOT_FOUND})
+        return
+
+    user = await authenticate(scope)
+    if user is None:
+        await send({"type": "websocket.close", "code": CLOSE_UNAUTHORIZED})
+        return
+
+    await send({"type": "websocket.accept"})
+
+    subscription = get_broker().subscribe(user.pk)
+    receive_task = asyncio.ensure_future(receive())
+    event_task = asyncio.ensure_future(subscription.get())
+    try:
+        while True:
+            done, _ = await asyncio.wait(
+                {receive_task, event_task},
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if event_task in done:
+                await send({"type": "websocket.send", "text": json.dumps(event_task.result())})
+                event_task = asyncio.ensure_future(subscription.get())
+            if receive_task in done:
+                # Сообщения от клиента не обрабатываются, ждем только отключения.
+                if receive_task.result()["type"] == "websocket.disconnect":
+                    break
+                receive_task = asyncio.ensure_future(receive())
+    finally:
+        receive_task.cancel()
+        event_task.cancel()
+        subscription.close()